@@ -18,14 +18,101 @@ class Settings:
     DB_PASSWORD = os.getenv("DB_PASSWORD")
     DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
+    # Optional read replica (full SQLAlchemy URL). Read-only endpoints use it,
+    # except for a caller's own recent writes or when it lags too far behind.
+    READ_REPLICA_URL = os.getenv("READ_REPLICA_URL")
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+    READ_REPLICA_MAX_LAG_SECONDS = float(os.getenv("READ_REPLICA_MAX_LAG_SECONDS", 10))
+    READ_REPLICA_LAG_CHECK_SECONDS = float(os.getenv("READ_REPLICA_LAG_CHECK_SECONDS", 5))
+
     SMTP_HOST = os.getenv("SMTP_HOST")
     SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
     SMTP_USER = os.getenv("SMTP_USER")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
     SMTP_FROM = os.getenv("SMTP_FROM")
+    # "async": one dispatcher loop per worker (aiosmtplib), "sync": plain smtplib in the caller
+    MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "async")
+    SMTP_MAX_CONCURRENCY = int(os.getenv("SMTP_MAX_CONCURRENCY", 4))
+    # Senders kept for login codes only, and the cap on senders busy with reminders (0 = all but one)
+    SMTP_RESERVED_INTERACTIVE = int(os.getenv("SMTP_RESERVED_INTERACTIVE", 1))
+    SMTP_BULK_MAX_CONCURRENCY = int(os.getenv("SMTP_BULK_MAX_CONCURRENCY", 0))
+    SMTP_MAX_PER_SECOND = float(os.getenv("SMTP_MAX_PER_SECOND", 5))
+    SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+    # Transient SMTP failures (4xx, dropped connections) are retried with exponential backoff
+    SMTP_SEND_RETRIES = int(os.getenv("SMTP_SEND_RETRIES", 2))
+    SMTP_RETRY_BACKOFF_SECONDS = float(os.getenv("SMTP_RETRY_BACKOFF_SECONDS", 0.5))
 
     FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "https://deviation-price.azurewebsites.net")
     BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "https://deviation-back.azurewebsites.net")
     AUTH_SECRET = os.getenv("AUTH_SECRET", "local-dev-auth-secret-change-me")
+    ACCESS_TOKEN_TTL_HOURS = int(os.getenv("ACCESS_TOKEN_TTL_HOURS", 12))
+    ACCESS_TOKEN_CACHE_SIZE = int(os.getenv("ACCESS_TOKEN_CACHE_SIZE", 1024))
+
+    # Worker processes (uvicorn/gunicorn read the same variable); with more than one,
+    # per-process state would be split between workers, so the shared backends are the default
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+    # Verification code store: "postgres" (shared between workers) or "memory" (one worker only)
+    VERIFICATION_STORE_BACKEND = os.getenv("VERIFICATION_STORE_BACKEND", "postgres")
+    VERIFICATION_CODE_TTL_MINUTES = int(os.getenv("VERIFICATION_CODE_TTL_MINUTES", 10))
+    VERIFICATION_CODE_MAX_ATTEMPTS = int(os.getenv("VERIFICATION_CODE_MAX_ATTEMPTS", 5))
+    VERIFICATION_STORE_MAX_ENTRIES = int(os.getenv("VERIFICATION_STORE_MAX_ENTRIES", 10000))
+
+    # Notifications: monthly partitions created ahead, read notifications kept N months
+    NOTIFICATION_PARTITIONS_AHEAD = int(os.getenv("NOTIFICATION_PARTITIONS_AHEAD", 3))
+    NOTIFICATION_RETENTION_MONTHS = int(os.getenv("NOTIFICATION_RETENTION_MONTHS", 6))
+    NOTIFICATION_RETENTION_MODE = os.getenv("NOTIFICATION_RETENTION_MODE", "drop")  # drop | archive
+
+    # Proxies in front of the app that append to X-Forwarded-For (App Service front end: 1).
+    # The client IP is the address the outermost trusted proxy appended; 0 ignores the header.
+    FORWARDED_TRUSTED_HOPS = int(os.getenv("FORWARDED_TRUSTED_HOPS", 1))
+
+    # Rate limiting for /auth/send-verification-code: "memory" or "postgres" (shared between workers)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "postgres" if WEB_CONCURRENCY > 1 else "memory")
+    VERIFICATION_EMAIL_BURST = int(os.getenv("VERIFICATION_EMAIL_BURST", 3))
+    VERIFICATION_EMAIL_PER_HOUR = int(os.getenv("VERIFICATION_EMAIL_PER_HOUR", 10))
+    VERIFICATION_IP_BURST = int(os.getenv("VERIFICATION_IP_BURST", 20))
+    VERIFICATION_IP_PER_HOUR = int(os.getenv("VERIFICATION_IP_PER_HOUR", 100))
+
+    # Idempotency-Key responses are replayed for this long
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+    # Scheduler: jobs are kept in the database ("database") so a run that falls
+    # due during a restart still happens once the app is back, within the grace time
+    SCHEDULER_JOBSTORE = os.getenv("SCHEDULER_JOBSTORE", "database")  # database | memory
+    SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", 3600))
+    JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", 30))
+    # A run still "running" after this long lost its worker and is marked abandoned
+    JOB_RUN_MAX_SECONDS = int(os.getenv("JOB_RUN_MAX_SECONDS", 3600))
+
+    # Request detail cache (per worker, invalidated across workers with NOTIFY); 0 disables it
+    REQUEST_CACHE_SIZE = int(os.getenv("REQUEST_CACHE_SIZE", 1024))
+    REQUEST_CACHE_TTL_SECONDS = float(os.getenv("REQUEST_CACHE_TTL_SECONDS", 300))
+
+    # Shared cache for dropdowns and user lists: "memory" (per process), "redis"
+    # (shared between workers, needs the redis package) or "fakeredis" (embedded stand-in)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+    CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "deviation:cache:")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+    CACHE_LOCK_TIMEOUT_SECONDS = float(os.getenv("CACHE_LOCK_TIMEOUT_SECONDS", 10))
+    CACHE_SOCKET_TIMEOUT_SECONDS = float(os.getenv("CACHE_SOCKET_TIMEOUT_SECONDS", 0.5))
+    USERS_CACHE_TTL_SECONDS = int(os.getenv("USERS_CACHE_TTL_SECONDS", 3600))
+    DROPDOWNS_CACHE_TTL_SECONDS = int(os.getenv("DROPDOWNS_CACHE_TTL_SECONDS", 3600))
+
+    # Comma-separated emails allowed on /admin
+    ADMIN_EMAILS = [email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()]
+
+    # Email outbox: pending emails are retried by the scheduler up to N times
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+
+    # Reminder jobs hand emails to this many worker threads; the SMTP rate and
+    # concurrency limits above still apply (reminders use the bulk lane)
+    REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", 8))
+    # Due requests are streamed and sent this many at a time
+    REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+    # Reminder cadence tiers "after_days:every_days,...": a request waiting in
+    # UNDER_REVIEW_PL / ESCALATED_TO_VP is reminded from day 2 every 2 days, from day 7 daily
+    REMINDER_TIERS = os.getenv("REMINDER_TIERS", "2:2,7:1")
 
 settings = Settings()
\ No newline at end of file
@@ -43,4 +43,28 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Optional read replica for read-only endpoints (see app/core/read_routing.py)
+read_engine = None
+ReadSessionLocal = None
+if settings.READ_REPLICA_URL:
+    logger.info("Read replica configured")
+    read_engine = create_engine(
+        settings.READ_REPLICA_URL,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=False,
+        connect_args={
+            "connect_timeout": 10,
+            "keepalives": 1,
+            "keepalives_idle": 30,
+        }
+    )
+    ReadSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=read_engine
+    )
+
 Base = declarative_base()
@@ -1,9 +1,103 @@
+from typing import Optional
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from app.core import database
 from app.core.database import SessionLocal
+from app.core.metrics import metrics
+from app.core.read_routing import replica_router
+from app.core.lazy_session import LazySession, route_label
+from app.core.security import CurrentUser, InvalidTokenError, decode_access_token, is_access_token
 
+bearer_scheme = HTTPBearer(auto_error=False)
 
-def get_db():
-    db = SessionLocal()
+
+def get_db(http_request: Request):
+    """Primary session, created on first use (see app/core/lazy_session.py)"""
+    route = route_label(http_request)
+    db = LazySession(SessionLocal, route)
+    try:
+        yield db
+    finally:
+        db.close()
+        if not db.used:
+            metrics.increment("db_session_skipped", route=route)
+
+
+def get_read_db(http_request: Request):
+    """
+    Session for read-only endpoints: the read replica when one is configured,
+    unless the caller just wrote something or the replica lags too far behind.
+    Like get_db, nothing is set up until the endpoint first uses it.
+    """
+    route = route_label(http_request)
+    db = LazySession(lambda **kw: _choose_read_session(http_request, **kw), route)
     try:
         yield db
     finally:
         db.close()
+        if not db.used:
+            metrics.increment("db_session_skipped", route=route)
+
+
+def _choose_read_session(http_request: Request, **kw):
+    target, reason = replica_router.choose(http_request, database.read_engine)
+    if database.read_engine is not None:
+        metrics.increment("db_read_routing", target=target, reason=reason or "")
+    if target == "replica":
+        return database.ReadSessionLocal(**kw)
+    return SessionLocal(**kw)
+
+
+def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[CurrentUser]:
+    """
+    Resolve the user from the Bearer access token, if one is sent.
+    Legacy "email:role:timestamp" tokens are treated as anonymous.
+    """
+    if credentials is None:
+        return None
+
+    token = credentials.credentials
+    if not is_access_token(token):
+        return None
+
+    try:
+        return decode_access_token(token)
+    except InvalidTokenError:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def get_current_user(user: Optional[CurrentUser] = Depends(get_optional_user)) -> CurrentUser:
+    """Require a valid Bearer access token"""
+    if user is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Authentication required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+def resolve_user_email(user: Optional[CurrentUser], claimed_email: Optional[str]) -> str:
+    """
+    Identity for endpoints that historically took the user's email as a query
+    parameter: the token wins, a conflicting parameter is rejected, and the
+    parameter alone is still accepted from clients that do not send a token.
+    """
+    if user is not None:
+        if claimed_email and claimed_email.strip().lower() != user.email:
+            raise HTTPException(status_code=403, detail="Email does not match the authenticated user")
+        return user.email
+
+    if not claimed_email:
+        raise HTTPException(
+            status_code=401,
+            detail="Authentication required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claimed_email
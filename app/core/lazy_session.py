@@ -0,0 +1,68 @@
+"""
+Lazily created request sessions and connection hold-time metrics.
+
+Endpoints that answer from a cache, with a 304 or with a validation error
+often never touch the database, so the Session is only created when the
+endpoint first uses it. A connection is checked out when the session
+begins a transaction and goes back to the pool on commit, rollback or
+close; that hold time is recorded per route as db_connection_hold_seconds.
+"""
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.metrics import metrics
+
+HOLD_STARTED_AT = "connection_held_since"
+ROUTE = "route"
+
+
+class LazySession:
+    """
+    Stands in for a Session: the real one is created on first attribute
+    access, so requests that never query the database skip it entirely.
+    """
+
+    __slots__ = ("_factory", "_route", "_session")
+
+    def __init__(self, factory, route: str):
+        self._factory = factory
+        self._route = route
+        self._session = None
+
+    @property
+    def used(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory(info={ROUTE: self._route})
+        return getattr(self._session, name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+def route_label(http_request) -> str:
+    """Route template (e.g. /pricing-requests/{request_id}) to keep labels low-cardinality"""
+    route = http_request.scope.get("route")
+    return getattr(route, "path", None) or "unknown"
+
+
+@event.listens_for(Session, "after_begin")
+def _connection_checked_out(session, transaction, connection):
+    session.info.setdefault(HOLD_STARTED_AT, time.perf_counter())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _connection_released(session, transaction):
+    # Only the outermost transaction holds the connection
+    if transaction.parent is not None:
+        return
+    started_at = session.info.pop(HOLD_STARTED_AT, None)
+    if started_at is not None:
+        metrics.observe(
+            "db_connection_hold_seconds",
+            time.perf_counter() - started_at,
+            route=session.info.get(ROUTE, "background"),
+        )
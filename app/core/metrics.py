@@ -0,0 +1,57 @@
+"""
+Lightweight in-process metrics (counters and timings), exposed at /api/metrics
+"""
+import threading
+from collections import defaultdict
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._timings = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a timing/size observation (count, sum and max are kept)"""
+        key = self._key(name, labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                self._timings[key] = {"count": 1, "sum": value, "max": value}
+            else:
+                timing["count"] += 1
+                timing["sum"] += value
+                timing["max"] = max(timing["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "timings": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": timing["count"],
+                        "sum": timing["sum"],
+                        "avg": timing["sum"] / timing["count"],
+                        "max": timing["max"],
+                    }
+                    for (name, labels), timing in sorted(self._timings.items())
+                ],
+            }
+
+
+metrics = MetricsRegistry()
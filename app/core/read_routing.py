@@ -0,0 +1,121 @@
+"""
+Routing of read-only endpoints between the primary and the read replica.
+
+A read goes to the replica unless:
+- no replica is configured
+- the caller wrote something in the last READ_YOUR_WRITES_SECONDS, so they
+  see their own change (read-your-writes)
+- the replica is more than READ_REPLICA_MAX_LAG_SECONDS behind (checked at
+  most every READ_REPLICA_LAG_CHECK_SECONDS)
+
+Recent writers are kept in the shared cache (app/services/cache.py) so the
+window holds whichever worker serves the next read. With several workers
+that needs CACHE_BACKEND=redis; the in-process cache only covers reads that
+land on the worker that took the write.
+"""
+import threading
+import time
+import logging
+from typing import Optional
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from app.core import database
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import InvalidTokenError, decode_access_token, is_access_token
+from app.services.cache import get_cache
+from app.utils.client_ip import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind; 0 when it has replayed everything it received.
+# Both LSN functions return NULL on a primary, which also reads as 0.
+REPLICA_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def caller_key(http_request: Request) -> str:
+    """The authenticated user when a valid access token is sent, the client IP otherwise"""
+    authorization = http_request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and is_access_token(token):
+        try:
+            return f"user:{decode_access_token(token).email}"
+        except InvalidTokenError:
+            pass
+    return f"ip:{get_client_ip(http_request)}"
+
+
+class ReplicaRouter:
+    def __init__(self, cache=None):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._lag = 0.0
+        self._lag_checked_at = None
+        self._warned = False
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            cache = get_cache()
+            if settings.WEB_CONCURRENCY > 1 and cache.backend == "memory" and not self._warned:
+                self._warned = True
+                logger.warning(
+                    "Read-your-writes uses the in-process cache with several workers; "
+                    "set CACHE_BACKEND=redis to share it"
+                )
+            return cache
+        return self._cache
+
+    def mark_write(self, key: str):
+        self.cache.set(f"ryw:{key}", 1, ttl=settings.READ_YOUR_WRITES_SECONDS)
+
+    def wrote_recently(self, key: str) -> bool:
+        return self.cache.get(f"ryw:{key}") is not None
+
+    def replica_lag(self, read_engine) -> float:
+        """Replica lag in seconds, refreshed at most every READ_REPLICA_LAG_CHECK_SECONDS"""
+        now = time.monotonic()
+        with self._lock:
+            if self._lag_checked_at is not None and now - self._lag_checked_at < settings.READ_REPLICA_LAG_CHECK_SECONDS:
+                return self._lag
+            # Claim the check so concurrent readers keep using the cached value
+            self._lag_checked_at = now
+
+        try:
+            with read_engine.connect() as conn:
+                lag = float(conn.execute(text(REPLICA_LAG_SQL)).scalar() or 0)
+            metrics.observe("db_replica_lag_seconds", lag)
+        except Exception as e:
+            logger.warning(f"Replica lag check failed, using the primary: {e}")
+            lag = float("inf")
+
+        with self._lock:
+            self._lag = lag
+        return lag
+
+    def choose(self, http_request: Request, read_engine) -> tuple[str, Optional[str]]:
+        """Return ("replica" | "primary", reason for using the primary)"""
+        if read_engine is None:
+            return "primary", None
+        if self.wrote_recently(caller_key(http_request)):
+            return "primary", "read_your_writes"
+        if self.replica_lag(read_engine) > settings.READ_REPLICA_MAX_LAG_SECONDS:
+            return "primary", "replica_lag"
+        return "replica", None
+
+
+replica_router = ReplicaRouter()
+
+
+async def mark_caller_write(http_request: Request, status_code: int):
+    """Called for every response: successful mutations open the read-your-writes window"""
+    if database.read_engine is None or http_request.method in SAFE_METHODS or status_code >= 400:
+        return
+    # The shared cache may be a network call
+    await run_in_threadpool(replica_router.mark_write, caller_key(http_request))
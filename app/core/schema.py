@@ -0,0 +1,181 @@
+"""
+Schema management: create missing tables and apply additive upgrades.
+
+`Base.metadata.create_all` only creates tables that do not exist yet, so
+columns and indexes added to existing tables are applied here with
+idempotent DDL statements.
+
+Startup only calls `ensure_schema`, which compares a fingerprint of the
+models and upgrade statements with the one stored in schema_version and
+runs the (slow) upgrade only when they differ.
+"""
+import hashlib
+import logging
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app.core.database import Base
+from app.models.pricing_request import PRICING_REQUEST_SEARCH_DOCUMENT, PENDING_STATUSES_SQL
+from app.models.comment import COMMENT_SEARCH_DOCUMENT
+from app.services.notification_partitions import (
+    partition_existing_notifications,
+    ensure_notification_partitions,
+)
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_UPGRADES = [
+    # Full-text search (GET /search)
+    (
+        "ALTER TABLE pricing_requests ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({PRICING_REQUEST_SEARCH_DOCUMENT}) STORED"
+    ),
+    "CREATE INDEX IF NOT EXISTS ix_pricing_requests_search_vector ON pricing_requests USING gin (search_vector)",
+    (
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({COMMENT_SEARCH_DOCUMENT}) STORED"
+    ),
+    "CREATE INDEX IF NOT EXISTS ix_comments_search_vector ON comments USING gin (search_vector)",
+    # Optimistic concurrency for decisions
+    "ALTER TABLE pricing_requests ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    # Comment thread pagination
+    "CREATE INDEX IF NOT EXISTS ix_comments_request_created_id ON comments (request_id, created_at, id)",
+    # Reminder bookkeeping: existing rows entered their status at their last decision
+    "ALTER TABLE pricing_requests ADD COLUMN IF NOT EXISTS status_entered_at timestamptz",
+    (
+        "UPDATE pricing_requests SET status_entered_at = CASE "
+        "WHEN status IN ('ESCALATED_TO_VP', 'APPROVED_BY_PL', 'REJECTED_BY_PL') THEN coalesce(pl_decision_date, created_at) "
+        "WHEN status IN ('APPROVED_BY_VP', 'REJECTED_BY_VP') THEN coalesce(vp_decision_date, pl_decision_date, created_at) "
+        "ELSE created_at END "
+        "WHERE status_entered_at IS NULL"
+    ),
+    "UPDATE pricing_requests SET status_entered_at = now() WHERE status_entered_at IS NULL",
+    "ALTER TABLE pricing_requests ALTER COLUMN status_entered_at SET DEFAULT now(), ALTER COLUMN status_entered_at SET NOT NULL",
+    "ALTER TABLE pricing_requests ADD COLUMN IF NOT EXISTS last_reminded_at timestamptz",
+    "ALTER TABLE pricing_requests ADD COLUMN IF NOT EXISTS reminder_count integer NOT NULL DEFAULT 0",
+    (
+        "CREATE INDEX IF NOT EXISTS ix_pricing_requests_pending_status_entered "
+        f"ON pricing_requests (status, status_entered_at) WHERE {PENDING_STATUSES_SQL}"
+    ),
+    # Status history: backfill requests that have no events yet from their decision dates
+    (
+        "INSERT INTO request_status_events "
+        "(request_id, from_status, to_status, actor_email, actor_name, comments, created_at) "
+        "SELECT h.* FROM pricing_requests p CROSS JOIN LATERAL (VALUES "
+        "(p.id, NULL, 'UNDER_REVIEW_PL', p.requester_email, p.requester_name, NULL, p.created_at), "
+        "(p.id, 'UNDER_REVIEW_PL', CASE WHEN p.status IN ('ESCALATED_TO_VP', 'APPROVED_BY_VP', 'REJECTED_BY_VP') "
+        "THEN 'ESCALATED_TO_VP' ELSE p.status END, p.product_line_responsible_email, "
+        "p.product_line_responsible_name, p.pl_comments, p.pl_decision_date), "
+        "(p.id, 'ESCALATED_TO_VP', p.status, p.vp_email, p.vp_name, p.vp_comments, p.vp_decision_date)"
+        ") AS h(request_id, from_status, to_status, actor_email, actor_name, comments, created_at) "
+        "WHERE h.created_at IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM request_status_events e WHERE e.request_id = p.id)"
+    ),
+]
+
+
+SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1), "
+    "fingerprint varchar(64) NOT NULL, "
+    "applied_at timestamptz NOT NULL DEFAULT now())"
+)
+
+# Serializes schema upgrades between workers booting at the same time
+SCHEMA_LOCK_KEY = 7263401
+
+
+def _register_models():
+    """Import models so they are registered on Base.metadata"""
+    import app.models.pricing_request  # noqa: F401
+    import app.models.comment  # noqa: F401
+    import app.models.notification  # noqa: F401
+    import app.models.verification_code  # noqa: F401
+    import app.models.rate_limit_bucket  # noqa: F401
+    import app.models.idempotency_key  # noqa: F401
+    import app.models.email_outbox  # noqa: F401
+    import app.models.reminder_delivery  # noqa: F401
+    import app.models.job_run  # noqa: F401
+    import app.models.request_status_event  # noqa: F401
+
+
+def schema_fingerprint() -> str:
+    """Hash of the DDL the models and SCHEMA_UPGRADES would produce"""
+    _register_models()
+    dialect = postgresql.dialect()
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    for statement in SCHEMA_UPGRADES:
+        digest.update(statement.encode())
+    return digest.hexdigest()
+
+
+def _stored_fingerprint(conn):
+    try:
+        return conn.execute(text("SELECT fingerprint FROM schema_version")).scalar()
+    except ProgrammingError:
+        # schema_version does not exist yet
+        conn.rollback()
+        return None
+
+
+def ensure_schema(bind) -> bool:
+    """
+    Fast startup check: one query when the schema is current.
+    Otherwise run upgrade_schema (once, under an advisory lock) and record
+    the new fingerprint. Returns True when an upgrade ran.
+    """
+    fingerprint = schema_fingerprint()
+    with bind.connect() as conn:
+        if _stored_fingerprint(conn) == fingerprint:
+            return False
+
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        try:
+            # Another worker may have upgraded while we waited for the lock
+            if _stored_fingerprint(conn) == fingerprint:
+                return False
+            conn.commit()
+
+            upgrade_schema(bind)
+            conn.execute(text(SCHEMA_VERSION_DDL))
+            conn.execute(
+                text(
+                    "INSERT INTO schema_version (id, fingerprint) VALUES (1, :fingerprint) "
+                    "ON CONFLICT (id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, applied_at = now()"
+                ),
+                {"fingerprint": fingerprint},
+            )
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            conn.commit()
+
+    logger.info(f"Schema upgraded to {fingerprint[:12]}")
+    return True
+
+
+def upgrade_schema(bind):
+    """
+    Create missing tables, then apply the additive upgrades in order
+    """
+    _register_models()
+
+    # Must run before create_all, which would otherwise skip the plain table
+    with bind.begin() as conn:
+        partition_existing_notifications(conn)
+
+    Base.metadata.create_all(bind=bind)
+
+    with bind.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+        ensure_notification_partitions(conn)
+
+    logger.info(f"Applied {len(SCHEMA_UPGRADES)} schema upgrade statements")
@@ -0,0 +1,114 @@
+"""
+Signed access tokens (JWT, HS256 with AUTH_SECRET) and cached verification.
+
+Access tokens are only issued once a verification code has been checked
+(/auth/verify-code) and carry a "verified" claim; tokens without it are
+rejected. /auth/login still returns the legacy "email:role:timestamp"
+token, which identifies nobody.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from pydantic import BaseModel
+from app.core.config import settings
+
+ACCESS_TOKEN_ALGORITHM = "HS256"
+ACCESS_TOKEN_TYPE = "access"
+
+
+class CurrentUser(BaseModel):
+    email: str
+    role: str
+    name: Optional[str] = None
+    # Proved ownership of the email with a verification code
+    verified: bool = False
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+def is_access_token(token: str) -> bool:
+    """JWT shape (three base64url parts); legacy "email:role:timestamp" tokens always contain a colon"""
+    return ":" not in token and token.count(".") == 2
+
+
+def create_access_token(email: str, role: str, name: Optional[str] = None) -> str:
+    """
+    Issue a signed access token. Only call this once the user has proved
+    they own the email (verification code). The email must already be normalized.
+    """
+    from jose import jwt  # deferred: python-jose is slow to import
+
+    now = datetime.now(timezone.utc)
+    payload = {
+        "sub": email,
+        "role": role,
+        "name": name,
+        "type": ACCESS_TOKEN_TYPE,
+        "verified": True,
+        "iat": int(now.timestamp()),
+        "exp": int((now + timedelta(hours=settings.ACCESS_TOKEN_TTL_HOURS)).timestamp()),
+    }
+    return jwt.encode(payload, settings.AUTH_SECRET, algorithm=ACCESS_TOKEN_ALGORITHM)
+
+
+class _ClaimsCache:
+    """
+    Small LRU of token -> (user, exp) so repeated requests with the same token
+    skip signature verification. Expiry is still checked on every hit.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= datetime.now(timezone.utc).timestamp():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: CurrentUser, expires_at: int):
+        with self._lock:
+            self._entries[token] = (user, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_claims_cache = _ClaimsCache(settings.ACCESS_TOKEN_CACHE_SIZE)
+
+
+def decode_access_token(token: str) -> CurrentUser:
+    """
+    Validate an access token and return the user it was issued to.
+    Raises InvalidTokenError when the token is malformed, tampered or expired.
+    """
+    user = _claims_cache.get(token)
+    if user is not None:
+        return user
+
+    from jose import jwt, JWTError  # deferred: python-jose is slow to import
+
+    try:
+        payload = jwt.decode(token, settings.AUTH_SECRET, algorithms=[ACCESS_TOKEN_ALGORITHM])
+    except JWTError as e:
+        raise InvalidTokenError(str(e))
+
+    if payload.get("type") != ACCESS_TOKEN_TYPE or not payload.get("sub"):
+        raise InvalidTokenError("Not an access token")
+    if payload.get("verified") is not True:
+        raise InvalidTokenError("Token was not issued by code verification")
+
+    user = CurrentUser(email=payload["sub"], role=payload.get("role", ""), name=payload.get("name"), verified=True)
+    _claims_cache.put(token, user, payload["exp"])
+    return user
@@ -0,0 +1,63 @@
+"""
+Boot latency report: import time per router module, startup phases and
+time to first request, exposed at /api/startup and logged once the first
+request has been served
+"""
+import importlib
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.imports = {}
+        self.phases = {}
+        self.first_request_seconds: Optional[float] = None
+        self.first_request_path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def import_module(self, name: str):
+        """Import a module and record how long it took (including its not yet loaded dependencies)"""
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - started
+        return module
+
+    def mark(self, name: str):
+        """Record the time elapsed since the report was created"""
+        self.phases[name] = time.perf_counter() - self.started_at
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def mark_first_request(self, path: str):
+        with self._lock:
+            if self.first_request_seconds is not None:
+                return
+            self.first_request_seconds = time.perf_counter() - self.started_at
+            self.first_request_path = path
+        logger.info(f"Startup report: {self.snapshot()}")
+
+    def snapshot(self) -> dict:
+        return {
+            "imports": {name: round(seconds, 4) for name, seconds in self.imports.items()},
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "first_request_seconds": (
+                round(self.first_request_seconds, 4) if self.first_request_seconds is not None else None
+            ),
+            "first_request_path": self.first_request_path,
+        }
+
+
+startup_report = StartupReport()
@@ -1,91 +1,63 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import logging
 
 from app.core.config import settings
+from app.emails.transport import (
+    LANE_INTERACTIVE,
+    LANE_NOTIFICATION,
+    build_message,
+    send_message,
+    send_message_async,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def send_email(to_email: str, subject: str, html_body: str, cc_emails: list = None):
+def send_email(to_email: str, subject: str, html_body: str, cc_emails: list = None, lane: str = LANE_NOTIFICATION):
     """
     Send email using SMTP (Outlook or standard SMTP server)
-    Supports both authenticated and unauthenticated SMTP
+    Supports both authenticated and unauthenticated SMTP.
+    Goes through the mail dispatcher (app/emails/transport.py) and only
+    blocks the calling thread; use send_email_async from async code.
+    `lane` is the dispatch priority (LANE_INTERACTIVE, LANE_NOTIFICATION, LANE_BULK).
     """
     try:
         logger.info(f"Attempting to send email to {to_email}")
         logger.debug(f"SMTP Config - Host: {settings.SMTP_HOST}, Port: {settings.SMTP_PORT}, From: {settings.SMTP_FROM}")
-        
-        msg = MIMEMultipart("alternative")
-        msg["From"] = settings.SMTP_FROM
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        
-        if cc_emails:
-            msg["Cc"] = ", ".join(cc_emails)
-        
-        msg.attach(MIMEText(html_body, "html"))
-
-        recipients = [to_email]
-        if cc_emails:
-            recipients.extend(cc_emails)
-
-        # Try to use SMTP with TLS (for Outlook/Office 365)
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30) as server:
-            logger.debug(f"Connected to SMTP server {settings.SMTP_HOST}:{settings.SMTP_PORT}")
-            
-            # Try STARTTLS for encrypted connection if on port 587
-            try:
-                if settings.SMTP_PORT == 587:
-                    server.starttls()
-                    logger.debug("STARTTLS connection established")
-            except Exception as e:
-                logger.warning(f"STARTTLS not available: {str(e)}")
-            
-            # Try to authenticate if credentials are provided
-            try:
-                if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                    logger.debug(f"Attempting authentication as {settings.SMTP_USER}")
-                    server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    logger.info(f"Successfully authenticated as {settings.SMTP_USER}")
-                else:
-                    logger.warning("No SMTP credentials provided, attempting unauthenticated send")
-            except smtplib.SMTPAuthenticationError as e:
-                logger.error(f"SMTP Authentication failed: {str(e)}")
-                raise
-            except smtplib.SMTPNotSupportedError:
-                logger.debug("SMTP AUTH extension not supported by server, continuing without authentication")
-            
-            # Send email
-            server.sendmail(
-                settings.SMTP_FROM,
-                recipients,
-                msg.as_string(),
-            )
-            logger.info(f"Email sent successfully to {to_email}")
-        
+        msg, recipients = build_message(to_email, subject, html_body, cc_emails)
+        send_message(msg, recipients, lane)
+        logger.info(f"Email sent successfully to {to_email}")
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {type(e).__name__} - {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
         # Log but don't re-raise - we want the request to succeed even if email fails
         return False
-    
+
     return True
 
 
-def send_pricing_request_email(
-    to_email: str,
+async def send_email_async(to_email: str, subject: str, html_body: str, cc_emails: list = None,
+                           lane: str = LANE_NOTIFICATION):
+    """send_email for async code: waits for delivery without blocking the event loop"""
+    try:
+        logger.info(f"Attempting to send email to {to_email}")
+        msg, recipients = build_message(to_email, subject, html_body, cc_emails)
+        await send_message_async(msg, recipients, lane)
+        logger.info(f"Email sent successfully to {to_email}")
+    except Exception as e:
+        logger.error(f"Failed to send email to {to_email}: {type(e).__name__} - {str(e)}")
+        return False
+
+    return True
+
+
+def render_pricing_request_email(
     project_name: str,
     customer: str,
     initial_price: float,
     target_price: float,
     request_id: int,
     costing_number: str = "",
-    cc_emails: list = None,
-):
-    """Send pricing request notification to PL Responsible"""
+) -> tuple[str, str]:
+    """Build (subject, html_body) of the pricing request email to the PL Responsible"""
     subject = f"Action required – Pricing deviation request ({costing_number})"
 
     request_link = (
@@ -191,19 +163,39 @@ def send_pricing_request_email(
     </html>
     """
 
-    send_email(to_email, subject, html_body, cc_emails)
+    return subject, html_body
 
 
-def send_pl_decision_to_commercial(
+def send_pricing_request_email(
     to_email: str,
+    project_name: str,
+    customer: str,
+    initial_price: float,
+    target_price: float,
+    request_id: int,
+    costing_number: str = "",
+    cc_emails: list = None,
+):
+    """Send pricing request notification to PL Responsible"""
+    subject, html_body = render_pricing_request_email(
+        project_name=project_name,
+        customer=customer,
+        initial_price=initial_price,
+        target_price=target_price,
+        request_id=request_id,
+        costing_number=costing_number,
+    )
+    return send_email(to_email, subject, html_body, cc_emails)
+
+
+def render_pl_decision_email(
     project_name: str,
     decision: str,
     comments: str = None,
     suggested_price: float = None,
     costing_number: str = "",
-    cc_emails: list = None,
-):
-    """Send PL decision back to commercial"""
+) -> tuple[str, str]:
+    """Build (subject, html_body) of the PL decision email to the commercial"""
     
     decision_icon = {
         "APPROVED_BY_PL": "✅",
@@ -315,20 +307,38 @@ def send_pl_decision_to_commercial(
     </html>
     """
 
-    send_email(to_email, subject, html_body, cc_emails)
+    return subject, html_body
 
 
-def send_escalation_to_vp(
+def send_pl_decision_to_commercial(
     to_email: str,
+    project_name: str,
+    decision: str,
+    comments: str = None,
+    suggested_price: float = None,
+    costing_number: str = "",
+    cc_emails: list = None,
+):
+    """Send PL decision back to commercial"""
+    subject, html_body = render_pl_decision_email(
+        project_name=project_name,
+        decision=decision,
+        comments=comments,
+        suggested_price=suggested_price,
+        costing_number=costing_number,
+    )
+    return send_email(to_email, subject, html_body, cc_emails)
+
+
+def render_escalation_email(
     project_name: str,
     target_price: float,
     comments: str,
     initial_price: float = None,
     pl_name: str = "",
     costing_number: str = "",
-    cc_emails: list = None,
-):
-    """Send escalation notice to VP"""
+) -> tuple[str, str]:
+    """Build (subject, html_body) of the escalation email to the VP"""
     subject = f"Action required – Pricing deviation escalation ({costing_number})"
 
     price_block = ""
@@ -437,19 +447,39 @@ def send_escalation_to_vp(
     </html>
     """
 
-    send_email(to_email, subject, html_body, cc_emails)
+    return subject, html_body
 
 
-def send_vp_decision_to_commercial(
+def send_escalation_to_vp(
     to_email: str,
     project_name: str,
-    decision: str,
+    target_price: float,
     comments: str,
-    final_price: float = None,
+    initial_price: float = None,
+    pl_name: str = "",
     costing_number: str = "",
     cc_emails: list = None,
 ):
-    """Send VP final decision to commercial"""
+    """Send escalation notice to VP"""
+    subject, html_body = render_escalation_email(
+        project_name=project_name,
+        target_price=target_price,
+        comments=comments,
+        initial_price=initial_price,
+        pl_name=pl_name,
+        costing_number=costing_number,
+    )
+    return send_email(to_email, subject, html_body, cc_emails)
+
+
+def render_vp_decision_email(
+    project_name: str,
+    decision: str,
+    comments: str,
+    final_price: float = None,
+    costing_number: str = "",
+) -> tuple[str, str]:
+    """Build (subject, html_body) of the VP decision email to the commercial"""
     
     decision_icon = {
         "APPROVED_BY_VP": "✅",
@@ -556,7 +586,27 @@ def send_vp_decision_to_commercial(
     </html>
     """
 
-    send_email(to_email, subject, html_body, cc_emails)
+    return subject, html_body
+
+
+def send_vp_decision_to_commercial(
+    to_email: str,
+    project_name: str,
+    decision: str,
+    comments: str,
+    final_price: float = None,
+    costing_number: str = "",
+    cc_emails: list = None,
+):
+    """Send VP final decision to commercial"""
+    subject, html_body = render_vp_decision_email(
+        project_name=project_name,
+        decision=decision,
+        comments=comments,
+        final_price=final_price,
+        costing_number=costing_number,
+    )
+    return send_email(to_email, subject, html_body, cc_emails)
 
 
 async def send_verification_email(to_email: str, code: str):
@@ -606,4 +656,13 @@ async def send_verification_email(to_email: str, code: str):
     </html>
     """
     
-    send_email(to_email, subject, html_body)
+    return await send_email_async(to_email, subject, html_body, lane=LANE_INTERACTIVE)
+
+
+# Outbox templates: name -> renderer returning (subject, html_body)
+EMAIL_RENDERERS = {
+    "pricing_request": render_pricing_request_email,
+    "pl_decision": render_pl_decision_email,
+    "escalation": render_escalation_email,
+    "vp_decision": render_vp_decision_email,
+}
@@ -0,0 +1,362 @@
+"""
+SMTP transport.
+
+All mail of a worker goes through one MailDispatcher: a daemon thread
+running its own asyncio loop that talks SMTP with aiosmtplib. At most
+SMTP_MAX_CONCURRENCY messages are in flight and each server gets a
+minimum interval between sends (SMTP_MAX_PER_SECOND), so a slow or
+throttling mail server only ever delays mail, never the request handlers
+or scheduler jobs that queued it.
+
+Mail is queued on a priority lane (interactive > notification > bulk)
+with capacity reserved for interactive mail, so login codes go out while
+a reminder batch drains.
+
+The dispatcher is started with the app; otherwise the first send starts
+it (off the event loop for async callers).
+
+- async code: `await send_message_async(...)`
+- threads (sync routes, background tasks, scheduler): `send_message(...)`,
+  which blocks only the calling thread
+
+Without aiosmtplib (or with MAIL_TRANSPORT=sync) messages are sent with
+smtplib; in dispatcher mode that happens in the dispatcher's executor,
+still bounded by the same limits.
+"""
+import asyncio
+import smtplib
+import threading
+import time
+import logging
+from collections import deque
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(to_email: str, subject: str, html_body: str, cc_emails: list = None):
+    """Return (MIME message, envelope recipients)"""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = settings.SMTP_FROM
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    if cc_emails:
+        msg["Cc"] = ", ".join(cc_emails)
+
+    msg.attach(MIMEText(html_body, "html"))
+
+    recipients = [to_email]
+    if cc_emails:
+        recipients.extend(cc_emails)
+    return msg, recipients
+
+
+def send_smtp_blocking(msg, recipients: list):
+    """Send one message with smtplib (STARTTLS on 587, AUTH when credentials are set)"""
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS) as server:
+        logger.debug(f"Connected to SMTP server {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+
+        # Try STARTTLS for encrypted connection if on port 587
+        try:
+            if settings.SMTP_PORT == 587:
+                server.starttls()
+                logger.debug("STARTTLS connection established")
+        except Exception as e:
+            logger.warning(f"STARTTLS not available: {str(e)}")
+
+        # Try to authenticate if credentials are provided
+        try:
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                logger.debug(f"Attempting authentication as {settings.SMTP_USER}")
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+                logger.info(f"Successfully authenticated as {settings.SMTP_USER}")
+            else:
+                logger.warning("No SMTP credentials provided, attempting unauthenticated send")
+        except smtplib.SMTPAuthenticationError as e:
+            logger.error(f"SMTP Authentication failed: {str(e)}")
+            raise
+        except smtplib.SMTPNotSupportedError:
+            logger.debug("SMTP AUTH extension not supported by server, continuing without authentication")
+
+        server.sendmail(settings.SMTP_FROM, recipients, msg.as_string())
+
+
+# Priority lanes, highest first
+LANE_INTERACTIVE = "interactive"  # one-time login codes: someone is waiting
+LANE_NOTIFICATION = "notification"  # decision and submission emails
+LANE_BULK = "bulk"  # reminders and digests
+LANES = (LANE_INTERACTIVE, LANE_NOTIFICATION, LANE_BULK)
+
+
+def is_transient_smtp_error(error: Exception) -> bool:
+    """4xx replies and dropped or refused connections are worth retrying; 5xx replies are not"""
+    code = getattr(error, "code", None) or getattr(error, "smtp_code", None)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    # aiosmtplib's connect/disconnect/timeout errors subclass ConnectionError and TimeoutError
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError, smtplib.SMTPServerDisconnected))
+
+
+class _ServerRateLimit:
+    """Minimum spacing between sends to one server (runs on the dispatcher loop only)"""
+
+    def __init__(self, per_second: float):
+        self.interval = 1 / per_second if per_second > 0 else 0
+        self._next_slot = 0.0
+
+    async def wait(self, lane: str):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        # Interactive mail takes its slot now and pushes the other lanes back
+        if slot > now and lane != LANE_INTERACTIVE:
+            await asyncio.sleep(slot - now)
+
+
+class DispatcherStopped(Exception):
+    """The dispatcher was stopped before the message was sent"""
+
+
+class MailDispatcher:
+    """
+    One queue per lane, served by max_concurrency sender tasks:
+    - reserved_interactive of them only ever send interactive mail, so a
+      login code never waits behind a reminder batch
+    - the others take the highest-priority lane with mail queued, with at
+      most bulk_max_concurrency of them on bulk mail at any time
+    """
+
+    def __init__(self, max_concurrency: int, per_second: float, reserved_interactive: int = 1,
+                 bulk_max_concurrency: int = None):
+        self.max_concurrency = max(max_concurrency, reserved_interactive + 1)
+        self.per_second = per_second
+        self.reserved_interactive = reserved_interactive
+        self.bulk_max_concurrency = bulk_max_concurrency or max(1, self.max_concurrency - reserved_interactive - 1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues = {lane: deque() for lane in LANES}
+        self._senders = []
+        self._ready: Optional[asyncio.Condition] = None
+        self._bulk_active = 0
+        self._rate_limits = {}
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queues = {lane: deque() for lane in LANES}
+        self._bulk_active = 0
+        self._ready = asyncio.Condition()
+        self._senders = [
+            loop.create_task(self._sender((LANE_INTERACTIVE,) if index < self.reserved_interactive else LANES))
+            for index in range(self.max_concurrency)
+        ]
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            # Whatever is left (callers' enqueue tasks) ends here instead of being destroyed pending
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._started.is_set()
+
+    def start(self):
+        """Start the dispatcher thread if needed; blocks until its loop is ready"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._started.clear()
+                self._thread = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+                self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        """
+        Cancel the senders, fail every queued message (its caller gets
+        DispatcherStopped instead of waiting forever) and close the loop.
+        A later submit starts a fresh loop with empty queues.
+        """
+        with self._start_lock:
+            if self._thread is None or self._loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Mail dispatcher shutdown incomplete: {type(e).__name__} - {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._loop = None
+
+    async def _shutdown(self):
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        self._senders = []
+
+        dropped = 0
+        for lane, queue in self._queues.items():
+            while queue:
+                _, _, result, _ = queue.popleft()
+                if not result.done():
+                    result.set_exception(DispatcherStopped("Mail dispatcher stopped before sending"))
+                    dropped += 1
+        if dropped:
+            logger.warning(f"Mail dispatcher stopped with {dropped} unsent messages")
+
+    def _next_lane(self, lanes) -> Optional[str]:
+        for lane in lanes:
+            if not self._queues[lane]:
+                continue
+            if lane == LANE_BULK and self._bulk_active >= self.bulk_max_concurrency:
+                continue
+            return lane
+        return None
+
+    async def _sender(self, lanes):
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: self._next_lane(lanes) is not None)
+                lane = self._next_lane(lanes)
+                job = self._queues[lane].popleft()
+                if lane == LANE_BULK:
+                    self._bulk_active += 1
+            try:
+                await self._deliver(lane, *job)
+            finally:
+                if lane == LANE_BULK:
+                    async with self._ready:
+                        self._bulk_active -= 1
+                        self._ready.notify_all()
+
+    async def _deliver(self, lane: str, msg, recipients: list, result: asyncio.Future, queued_at: float):
+        server = (settings.SMTP_HOST, settings.SMTP_PORT)
+        rate_limit = self._rate_limits.setdefault(server, _ServerRateLimit(self.per_second))
+        await rate_limit.wait(lane)
+        metrics.observe("smtp_queue_seconds", time.perf_counter() - queued_at, lane=lane)
+
+        started = time.perf_counter()
+        try:
+            for attempt in range(settings.SMTP_SEND_RETRIES + 1):
+                try:
+                    await self._send_once(msg, recipients)
+                    break
+                except Exception as e:
+                    if attempt >= settings.SMTP_SEND_RETRIES or not is_transient_smtp_error(e):
+                        raise
+                    metrics.increment("smtp_retries", lane=lane)
+                    logger.warning(f"Transient SMTP error, retrying: {type(e).__name__} - {e}")
+                    await asyncio.sleep(settings.SMTP_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        except asyncio.CancelledError:
+            if not result.done():
+                result.set_exception(DispatcherStopped("Mail dispatcher stopped while sending"))
+            raise
+        except Exception as e:
+            metrics.increment("smtp_failures", lane=lane)
+            if not result.done():
+                result.set_exception(e)
+        else:
+            if not result.done():
+                result.set_result(None)
+        finally:
+            metrics.observe("smtp_send_seconds", time.perf_counter() - started, lane=lane)
+
+    async def _send_once(self, msg, recipients: list):
+        aiosmtplib = _aiosmtplib()
+        if aiosmtplib is None:
+            await self._loop.run_in_executor(None, send_smtp_blocking, msg, recipients)
+            return
+        await aiosmtplib.send(
+            msg,
+            sender=settings.SMTP_FROM,
+            recipients=recipients,
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USER or None,
+            password=settings.SMTP_PASSWORD or None,
+            start_tls=True if settings.SMTP_PORT == 587 else False,
+            timeout=settings.SMTP_TIMEOUT_SECONDS,
+        )
+
+    async def _enqueue(self, lane: str, msg, recipients: list):
+        result = self._loop.create_future()
+        async with self._ready:
+            self._queues[lane].append((msg, recipients, result, time.perf_counter()))
+            self._ready.notify_all()
+        return await result
+
+    def submit(self, msg, recipients: list, lane: str = LANE_NOTIFICATION):
+        """Queue a message on a lane; returns a concurrent.futures.Future"""
+        if lane not in self._queues:
+            raise ValueError(f"Unknown mail lane: {lane}")
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._enqueue(lane, msg, recipients), self._loop)
+
+    def queue_sizes(self) -> dict:
+        return {lane: len(queue) for lane, queue in self._queues.items()}
+
+
+def _aiosmtplib():
+    try:
+        import aiosmtplib
+    except ImportError:
+        return None
+    return aiosmtplib
+
+
+_dispatcher = None
+
+
+def get_mail_dispatcher() -> MailDispatcher:
+    """Return this worker's dispatcher (created on first use)"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = MailDispatcher(
+            settings.SMTP_MAX_CONCURRENCY,
+            settings.SMTP_MAX_PER_SECOND,
+            reserved_interactive=settings.SMTP_RESERVED_INTERACTIVE,
+            bulk_max_concurrency=settings.SMTP_BULK_MAX_CONCURRENCY or None,
+        )
+    return _dispatcher
+
+
+def start_mail_dispatcher():
+    """Start this worker's dispatcher at boot, so no request waits for its thread"""
+    if settings.MAIL_TRANSPORT.lower() != "sync":
+        get_mail_dispatcher().start()
+
+
+def send_message(msg, recipients: list, lane: str = LANE_NOTIFICATION):
+    """Send from a thread; raises on failure"""
+    if settings.MAIL_TRANSPORT.lower() == "sync":
+        send_smtp_blocking(msg, recipients)
+        return
+    # No timeout here: each send is bounded by SMTP_TIMEOUT_SECONDS, and giving up
+    # while the message is still queued would only lead to a duplicate on retry
+    get_mail_dispatcher().submit(msg, recipients, lane).result()
+
+
+async def send_message_async(msg, recipients: list, lane: str = LANE_NOTIFICATION):
+    """Send from async code without blocking the caller's event loop; raises on failure"""
+    if settings.MAIL_TRANSPORT.lower() == "sync":
+        await asyncio.to_thread(send_smtp_blocking, msg, recipients)
+        return
+    dispatcher = get_mail_dispatcher()
+    if not dispatcher.running:
+        # Waiting for the dispatcher thread to come up would block the loop
+        await asyncio.to_thread(dispatcher.start)
+    await asyncio.wrap_future(dispatcher.submit(msg, recipients, lane))
@@ -1,17 +1,35 @@
+from app.core.startup_timing import startup_report  # first: starts the boot clock
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
-from app.core.database import engine, Base
+from app.core.database import engine
+from app.core.read_routing import mark_caller_write
+from app.core.schema import ensure_schema
+from app.core.metrics import metrics
 from app.models.pricing_request import PricingRequest
 from app.models.comment import Comment
 from app.models.notification import Notification
-from app.routers import pricing_request, pl_decisions, vp_decisions, auth, dropdowns, comments, notifications
-from app.utils.scheduler import start_scheduler, stop_scheduler
 import logging
 
+startup_report.mark("core_imports")
+
+ROUTER_MODULES = [
+    "app.routers.pricing_request",
+    "app.routers.pl_decisions",
+    "app.routers.vp_decisions",
+    "app.routers.auth",
+    "app.routers.dropdowns",
+    "app.routers.comments",
+    "app.routers.notifications",
+    "app.routers.search",
+    "app.routers.analytics",
+    "app.routers.admin",
+]
+
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Avocarbon Deviation Pricing API")
@@ -31,9 +49,29 @@ class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
                     response.headers["location"] = location
         return response
 
+# Opens the read-your-writes window after a caller's successful mutation
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        await mark_caller_write(request, response.status_code)
+        return response
+
+# Records time to first request for the startup report
+class StartupTimingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if startup_report.first_request_seconds is None:
+            startup_report.mark_first_request(request.url.path)
+        return response
+
 # Add HTTPS redirect middleware first
 app.add_middleware(HTTPSRedirectMiddleware)
 
+# No-op unless a read replica is configured
+app.add_middleware(ReadYourWritesMiddleware)
+
+app.add_middleware(StartupTimingMiddleware)
+
 # Add CORS middleware - allow all origins for now
 app.add_middleware(
     CORSMiddleware,
@@ -41,24 +79,59 @@ app.add_middleware(
     allow_credentials=False,  # Fixed: wildcard origins cannot be used with credentials=True
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Retry-After", "Idempotent-Replayed"],
 )
 
 
+def start_background_services():
+    """Start the scheduler off the boot path (APScheduler is imported here)"""
+    try:
+        with startup_report.phase("notification_partitions"):
+            from app.services.notification_partitions import ensure_upcoming_partitions
+            ensure_upcoming_partitions()
+    except Exception as partition_error:
+        logger.warning(f"Notification partition check failed (non-critical): {str(partition_error)}")
+
+    try:
+        with startup_report.phase("stale_job_runs"):
+            from app.services.job_runs import abandon_stale_runs
+            abandon_stale_runs()
+    except Exception as job_run_error:
+        logger.warning(f"Stale job run check failed (non-critical): {str(job_run_error)}")
+
+    try:
+        with startup_report.phase("scheduler_start"):
+            from app.utils.scheduler import start_scheduler
+            start_scheduler()
+        logger.info("Scheduler started successfully")
+    except Exception as scheduler_error:
+        logger.warning(f"Scheduler startup warning (non-critical): {str(scheduler_error)}")
+
+
 @app.on_event("startup")
 def startup():
+    # Fails the boot (unlike the steps below) when the verification store
+    # would be split between workers
+    from app.services.verification_codes import get_verification_store
+    get_verification_store()
+
     try:
         logger.info("Starting up application...")
-        logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
-        
+        logger.info("Checking database schema...")
+        with startup_report.phase("schema_check"):
+            upgraded = ensure_schema(engine)
+        logger.info("Database schema upgraded" if upgraded else "Database schema is up to date")
+
         logger.info("Starting scheduler...")
-        try:
-            start_scheduler()
-            logger.info("Scheduler started successfully")
-        except Exception as scheduler_error:
-            logger.warning(f"Scheduler startup warning (non-critical): {str(scheduler_error)}")
-        
+        threading.Thread(target=start_background_services, name="start-scheduler", daemon=True).start()
+
+        from app.services.request_cache import start_invalidation_listener
+        start_invalidation_listener()
+
+        from app.emails.transport import start_mail_dispatcher
+        start_mail_dispatcher()
+
+        startup_report.mark("startup_complete")
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Critical startup error: {str(e)}", exc_info=True)
@@ -70,8 +143,13 @@ def startup():
 def shutdown():
     try:
         logger.info("Shutting down application...")
+        from app.utils.scheduler import stop_scheduler
         stop_scheduler()
         logger.info("Scheduler stopped successfully")
+        from app.emails.transport import get_mail_dispatcher
+        get_mail_dispatcher().stop()
+        from app.services.request_cache import stop_invalidation_listener
+        stop_invalidation_listener()
     except Exception as e:
         logger.error(f"Shutdown error: {str(e)}", exc_info=True)
 
@@ -81,12 +159,6 @@ def health():
     """Health check endpoint"""
     try:
         logger.info("Health check requested")
-        # Ensure database tables exist
-        try:
-            Base.metadata.create_all(bind=engine)
-        except Exception as db_err:
-            logger.warning(f"Could not create tables: {db_err}")
-        
         return {
             "status": "API is running",
             "message": "Backend service is healthy and operational",
@@ -120,16 +192,19 @@ def api_health():
         }
 
 
-app.include_router(pricing_request.router)
-
-app.include_router(pl_decisions.router)
+@app.get("/api/metrics")
+def api_metrics():
+    """In-process counters and timings for this worker"""
+    return metrics.snapshot()
 
-app.include_router(vp_decisions.router)
 
-app.include_router(auth.router)
+@app.get("/api/startup")
+def api_startup():
+    """Boot latency of this worker: imports, startup phases, time to first request"""
+    return startup_report.snapshot()
 
-app.include_router(dropdowns.router)
 
-app.include_router(comments.router)
+for module_name in ROUTER_MODULES:
+    app.include_router(startup_report.import_module(module_name).router)
 
-app.include_router(notifications.router)
+startup_report.mark("app_ready")
@@ -1,9 +1,15 @@
 """
 Comment/Notes model for discussion threads on pricing requests
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.core.database import Base
+from app.models.pricing_request import SEARCH_CONFIG
+
+
+COMMENT_SEARCH_DOCUMENT = f"to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))"
 
 
 class Comment(Base):
@@ -26,3 +32,14 @@ class Comment(Base):
         server_default=func.now(),
         onupdate=func.now()
     )
+
+    # Generated full-text document, deferred so regular loads never fetch it
+    search_vector = deferred(
+        Column(TSVECTOR, Computed(COMMENT_SEARCH_DOCUMENT, persisted=True))
+    )
+
+    __table_args__ = (
+        Index("ix_comments_search_vector", "search_vector", postgresql_using="gin"),
+        # Thread pagination: WHERE request_id = ? AND (created_at, id) > cursor
+        Index("ix_comments_request_created_id", "request_id", "created_at", "id"),
+    )
@@ -0,0 +1,34 @@
+"""
+Transactional outbox for emails: rows are written in the same transaction
+as the change they announce and delivered after commit
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Renderer name in app.emails.mailer.EMAIL_RENDERERS and its keyword arguments
+    template = Column(String(100), nullable=False)
+    params = Column(JSONB, nullable=False)
+    to_email = Column(String(255), nullable=False)
+    cc_emails = Column(JSONB, nullable=True)
+
+    request_id = Column(Integer, nullable=True, index=True)
+
+    status = Column(String(20), nullable=False, default="pending")  # pending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # The delivery job only ever looks at pending rows
+        Index("ix_email_outbox_pending", "id", postgresql_where=text("status = 'pending'")),
+    )
@@ -0,0 +1,22 @@
+"""
+Stored responses for requests sent with an Idempotency-Key header
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Keys are scoped per endpoint, so the same client key can be reused elsewhere
+    scope = Column(String(100), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(JSONB, nullable=False)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
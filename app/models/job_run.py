@@ -0,0 +1,31 @@
+"""
+History of scheduler job runs (scheduled and triggered from /admin)
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(100), nullable=False)
+    trigger = Column(String(20), nullable=False)  # schedule, manual
+
+    status = Column(String(20), nullable=False, default="running")  # running, success, failed, skipped, abandoned
+    started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    rows_processed = Column(Integer, nullable=True)
+    emails_sent = Column(Integer, nullable=True)
+    # Whatever the job function returned
+    details = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Run history per job, newest first
+        Index("ix_job_runs_job_started", "job_id", "started_at"),
+        Index("ix_job_runs_started_at", "started_at"),
+    )
@@ -1,7 +1,7 @@
 """
 Notification model for tracking user notifications across the app
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -22,7 +22,8 @@ class NotificationType(str, enum.Enum):
 class Notification(Base):
     __tablename__ = "notifications"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Composite key: a partitioned table's primary key must include created_at
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     
     # Recipient info
     recipient_email = Column(String(255), nullable=False, index=True)
@@ -46,10 +47,18 @@ class Notification(Base):
     is_read = Column(Boolean, default=False, nullable=False, index=True)
     action_url = Column(String(500), nullable=True)  # URL to navigate to
     
-    # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Timestamps (created_at is the monthly partition key)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
     updated_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
         onupdate=func.now()
     )
+
+    # Partitioned by month, see app/services/notification_partitions.py.
+    # Indexes are created on every partition, so the newest-N query per
+    # recipient only walks the most recent partitions.
+    __table_args__ = (
+        Index("ix_notifications_recipient_created", "recipient_email", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
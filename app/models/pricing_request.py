@@ -6,12 +6,39 @@ from sqlalchemy import (
     Text,
     DateTime,
     Float,
-    Boolean
+    Boolean,
+    Computed,
+    Index,
+    event,
+    text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 
+# Text search configuration of the stored documents and of the /search queries
+SEARCH_CONFIG = "english"
+
+# Weighted document used by GET /search: titles rank above free text,
+# decision comments rank lowest.
+PRICING_REQUEST_SEARCH_DOCUMENT = " || ".join(
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+    for column, weight in (
+        ("project_name", "A"),
+        ("customer", "A"),
+        ("problem_to_solve", "B"),
+        ("pl_comments", "C"),
+        ("vp_comments", "C"),
+    )
+)
+
+# Statuses that wait on someone and get reminders (partial index below)
+PENDING_STATUSES = ("UNDER_REVIEW_PL", "ESCALATED_TO_VP")
+PENDING_STATUSES_SQL = "status IN ({})".format(", ".join(f"'{status}'" for status in PENDING_STATUSES))
+
+
 class PricingRequest(Base):
     __tablename__ = "pricing_requests"
 
@@ -52,6 +79,15 @@ class PricingRequest(Base):
     final_approved_price = Column(Numeric, nullable=True)
     
     status = Column(String(50), nullable=False, index=True)
+    # Set on every status change, so "pending for N days" counts from escalation, not creation
+    status_entered_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Reminder bookkeeping, reset on every status change
+    last_reminded_at = Column(DateTime(timezone=True), nullable=True)
+    reminder_count = Column(Integer, nullable=False, server_default="0")
+
+    # Optimistic concurrency: every ORM update runs "... WHERE version = :old"
+    version = Column(Integer, nullable=False, server_default="1")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(
@@ -60,3 +96,31 @@ class PricingRequest(Base):
         onupdate=func.now(),
         index=True
     )
+
+    # Generated full-text document, deferred so regular loads never fetch it
+    search_vector = deferred(
+        Column(TSVECTOR, Computed(PRICING_REQUEST_SEARCH_DOCUMENT, persisted=True))
+    )
+
+    __table_args__ = (
+        Index("ix_pricing_requests_search_vector", "search_vector", postgresql_using="gin"),
+        # Reminder jobs only read pending requests, oldest status change first
+        Index(
+            "ix_pricing_requests_pending_status_entered",
+            "status",
+            "status_entered_at",
+            postgresql_where=text(PENDING_STATUSES_SQL),
+        ),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+@event.listens_for(PricingRequest.status, "set")
+def _status_changed(target, value, oldvalue, initiator):
+    """Restart the reminder clock whenever a request moves to another status"""
+    if value == oldvalue:
+        return
+    target.status_entered_at = func.now()
+    target.last_reminded_at = None
+    target.reminder_count = 0
@@ -0,0 +1,16 @@
+"""
+Token bucket state used by the shared (Postgres) rate limiter
+"""
+from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    # Throttling state is disposable: skip WAL writes
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String(320), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
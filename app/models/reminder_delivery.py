@@ -0,0 +1,22 @@
+"""
+Ledger of reminder emails per run, so a reminder job that is restarted
+after a crash only sends what did not go out yet
+"""
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ReminderDelivery(Base):
+    __tablename__ = "reminder_deliveries"
+
+    # "pl" or "vp"; one reminder per request and kind per run date
+    kind = Column(String(20), primary_key=True)
+    request_id = Column(Integer, primary_key=True)
+    run_date = Column(Date, primary_key=True, index=True)
+
+    status = Column(String(20), nullable=False)  # sent, failed
+    attempts = Column(Integer, nullable=False, default=1)
+    last_error = Column(Text, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
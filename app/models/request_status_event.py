@@ -0,0 +1,32 @@
+"""
+Append-only history of pricing request status changes, written in the same
+transaction as the change (time-in-status, SLA reports, request timeline)
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class RequestStatusEvent(Base):
+    __tablename__ = "request_status_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    request_id = Column(Integer, ForeignKey("pricing_requests.id"), nullable=False)
+
+    from_status = Column(String(50), nullable=True)  # None for the submission
+    to_status = Column(String(50), nullable=False)
+
+    actor_email = Column(String(255), nullable=True)
+    actor_name = Column(String(255), nullable=True)
+    comments = Column(Text, nullable=True)
+
+    # Transaction time, like status_entered_at on the request
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Timeline of one request
+        Index("ix_request_status_events_request_created", "request_id", "created_at"),
+        # SLA reports: events in a period, and decisions (by target status) in a period
+        Index("ix_request_status_events_created_at", "created_at"),
+        Index("ix_request_status_events_to_status_created", "to_status", "created_at"),
+    )
@@ -0,0 +1,20 @@
+"""
+Verification code model used by the shared (Postgres) verification store
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class VerificationCode(Base):
+    __tablename__ = "verification_codes"
+    # Short-lived data: skip WAL writes, losing it on crash only forces a new code
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    email = Column(String(255), primary_key=True)
+    code = Column(String(20), nullable=False)
+    role = Column(String(50), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
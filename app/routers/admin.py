@@ -0,0 +1,119 @@
+"""
+Admin routes: scheduler jobs, their run history and on-demand runs, and
+shared cache invalidation.
+Only users listed in ADMIN_EMAILS, signed in through code verification,
+are allowed.
+"""
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.core.config import settings
+from app.core.deps import get_current_user, get_db
+from app.core.security import CurrentUser
+from app.models.job_run import JobRun
+from app.services.job_runs import abandon_stale_runs
+
+
+def require_admin(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if not user.verified:
+        raise HTTPException(status_code=403, detail="Admin access requires a verified sign-in")
+    if user.email.lower() not in settings.ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _serialize_run(run: JobRun) -> dict:
+    return {
+        "id": run.id,
+        "job_id": run.job_id,
+        "trigger": run.trigger,
+        "status": run.status,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "duration_seconds": (
+            (run.finished_at - run.started_at).total_seconds() if run.finished_at and run.started_at else None
+        ),
+        "rows_processed": run.rows_processed,
+        "emails_sent": run.emails_sent,
+        "details": run.details,
+        "error": run.error,
+    }
+
+
+@router.get("/jobs")
+def list_jobs(db: Session = Depends(get_db)):
+    """Scheduled jobs with their next run time and latest run (per-process jobs keep no run history)"""
+    from app.utils.scheduler import JOBS, LOCAL_JOBS, scheduler
+
+    abandon_stale_runs()
+    latest = {
+        run.job_id: run
+        for run in db.query(JobRun)
+        .distinct(JobRun.job_id)
+        .order_by(JobRun.job_id, JobRun.started_at.desc())
+    }
+
+    jobs = []
+    for job_id, job in JOBS.items():
+        scheduled = scheduler.get_job(job_id) if scheduler.running else None
+        jobs.append({
+            "id": job_id,
+            "name": job.name,
+            "trigger": str(job.trigger),
+            "per_process": False,
+            "next_run_time": scheduled.next_run_time if scheduled else None,
+            "last_run": _serialize_run(latest[job_id]) if job_id in latest else None,
+        })
+    for job_id, job in LOCAL_JOBS.items():
+        scheduled = scheduler.get_job(job_id, jobstore="local") if scheduler.running else None
+        jobs.append({
+            "id": job_id,
+            "name": job.name,
+            "trigger": str(job.trigger),
+            "per_process": True,
+            "next_run_time": scheduled.next_run_time if scheduled else None,
+            "last_run": None,
+        })
+    return {"scheduler_running": scheduler.running, "jobs": jobs}
+
+
+@router.get("/job-runs")
+def list_job_runs(
+    job_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(running|success|failed|skipped|abandoned)$"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Run history, newest first"""
+    abandon_stale_runs()
+    query = db.query(JobRun)
+    if job_id:
+        query = query.filter(JobRun.job_id == job_id)
+    if status:
+        query = query.filter(JobRun.status == status)
+    runs = query.order_by(JobRun.started_at.desc(), JobRun.id.desc()).limit(limit).all()
+    return [_serialize_run(run) for run in runs]
+
+
+@router.post("/jobs/{job_id}/run", status_code=202)
+def run_job_now(job_id: str, background_tasks: BackgroundTasks, admin: CurrentUser = Depends(require_admin)):
+    """Start a job now; follow it in /admin/job-runs (a run already in progress is not doubled)"""
+    from app.utils.scheduler import JOBS, trigger_job
+
+    if job_id not in JOBS:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    background_tasks.add_task(trigger_job, job_id)
+    return {"message": "Job started", "job_id": job_id, "requested_by": admin.email}
+
+
+@router.post("/cache/invalidate/{tag}")
+def invalidate_cache_tag(tag: str, admin: CurrentUser = Depends(require_admin)):
+    """Drop every cache entry tagged `tag` (users, dropdowns); all workers with a shared backend"""
+    from app.services.cache import get_cache
+
+    get_cache().invalidate_tag(tag)
+    return {"message": "Cache invalidated", "tag": tag, "requested_by": admin.email}
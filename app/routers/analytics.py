@@ -0,0 +1,171 @@
+"""
+API routes for SLA reporting: time spent per stage and submission-to-decision
+turnaround by product line, computed from request_status_events.
+Covers requests submitted in [since, until).
+"""
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.core.deps import get_read_db
+from app.models.enums import RequestStatus
+from app.models.pricing_request import PricingRequest
+from app.models.request_status_event import RequestStatusEvent
+from app.schemas.analytics import StageDurationsResponse, TurnaroundResponse
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+DEFAULT_PERIOD_DAYS = 90
+
+FINAL_STATUSES = (
+    RequestStatus.APPROVED_BY_PL.value,
+    RequestStatus.REJECTED_BY_PL.value,
+    RequestStatus.APPROVED_BY_VP.value,
+    RequestStatus.REJECTED_BY_VP.value,
+)
+# Statuses nobody is expected to act on, left out of the stage report
+TERMINAL_STATUSES = FINAL_STATUSES + (RequestStatus.CLOSED.value,)
+
+
+def _period(since: Optional[datetime], until: Optional[datetime]) -> tuple[datetime, datetime]:
+    until = until or datetime.now(timezone.utc)
+    return since or until - timedelta(days=DEFAULT_PERIOD_DAYS), until
+
+
+def _hours(interval):
+    return func.extract("epoch", interval) / 3600
+
+
+def _stats(hours) -> list:
+    """avg / p50 / p90 of a duration in hours (NULL durations are ignored)"""
+    return [
+        func.avg(hours).label("avg_hours"),
+        func.percentile_cont(0.5).within_group(hours).label("p50_hours"),
+        func.percentile_cont(0.9).within_group(hours).label("p90_hours"),
+    ]
+
+
+def _submitted_in(since: datetime, until: datetime, product_line: Optional[str]):
+    conditions = [PricingRequest.created_at >= since, PricingRequest.created_at < until]
+    if product_line:
+        conditions.append(PricingRequest.product_line == product_line)
+    return and_(*conditions)
+
+
+def _round(value) -> Optional[float]:
+    return round(float(value), 2) if value is not None else None
+
+
+@router.get("/stage-durations", response_model=StageDurationsResponse)
+def get_stage_durations(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    product_line: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """
+    How long requests wait in each status, per product line. A stage ends
+    with the next event of the same request; open stages are only counted.
+    """
+    since, until = _period(since, until)
+
+    events = (
+        select(
+            PricingRequest.product_line,
+            RequestStatusEvent.to_status.label("stage"),
+            (
+                func.lead(RequestStatusEvent.created_at).over(
+                    partition_by=RequestStatusEvent.request_id,
+                    order_by=(RequestStatusEvent.created_at, RequestStatusEvent.id),
+                ) - RequestStatusEvent.created_at
+            ).label("duration"),
+        )
+        .join(PricingRequest, PricingRequest.id == RequestStatusEvent.request_id)
+        .where(_submitted_in(since, until, product_line))
+        .subquery()
+    )
+
+    hours = _hours(events.c.duration)
+    rows = db.execute(
+        select(
+            events.c.product_line,
+            events.c.stage,
+            func.count(events.c.duration).label("completed"),
+            func.count().filter(events.c.duration.is_(None)).label("open"),
+            *_stats(hours),
+        )
+        .where(events.c.stage.not_in(TERMINAL_STATUSES))
+        .group_by(events.c.product_line, events.c.stage)
+        .order_by(events.c.product_line, events.c.stage)
+    ).all()
+
+    return {
+        "since": since,
+        "until": until,
+        "stages": [
+            {
+                "product_line": row.product_line,
+                "stage": row.stage,
+                "completed": row.completed,
+                "open": row.open,
+                "avg_hours": _round(row.avg_hours),
+                "p50_hours": _round(row.p50_hours),
+                "p90_hours": _round(row.p90_hours),
+            }
+            for row in rows
+        ],
+    }
+
+
+@router.get("/turnaround", response_model=TurnaroundResponse)
+def get_turnaround(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    product_line: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Time from submission to the final PL or VP decision, per product line"""
+    since, until = _period(since, until)
+
+    decided_at = (
+        select(
+            RequestStatusEvent.request_id,
+            func.min(RequestStatusEvent.created_at).label("decided_at"),
+        )
+        # A decision never precedes the submission, so the period bounds the index scan
+        .where(RequestStatusEvent.to_status.in_(FINAL_STATUSES), RequestStatusEvent.created_at >= since)
+        .group_by(RequestStatusEvent.request_id)
+        .subquery()
+    )
+
+    hours = _hours(decided_at.c.decided_at - PricingRequest.created_at)
+    rows = db.execute(
+        select(
+            PricingRequest.product_line,
+            func.count().label("submitted"),
+            func.count(decided_at.c.decided_at).label("decided"),
+            *_stats(hours),
+        )
+        .select_from(PricingRequest)
+        .outerjoin(decided_at, decided_at.c.request_id == PricingRequest.id)
+        .where(_submitted_in(since, until, product_line))
+        .group_by(PricingRequest.product_line)
+        .order_by(PricingRequest.product_line)
+    ).all()
+
+    return {
+        "since": since,
+        "until": until,
+        "product_lines": [
+            {
+                "product_line": row.product_line,
+                "submitted": row.submitted,
+                "decided": row.decided,
+                "avg_hours": _round(row.avg_hours),
+                "p50_hours": _round(row.p50_hours),
+                "p90_hours": _round(row.p90_hours),
+            }
+            for row in rows
+        ],
+    }
@@ -1,24 +1,28 @@
-import random
+import hashlib
+import hmac
+import secrets
 import string
 import logging
 from datetime import datetime, timedelta, timezone
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from jose import jwt, JWTError
 from app.emails.mailer import send_verification_email
 from app.utils.users import get_users_by_role as fetch_users_by_role
+from app.services.verification_codes import get_verification_store
+from app.services.rate_limiter import get_rate_limiter, retry_after_header
+from app.services.cache import get_cache
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import create_access_token
+from app.utils.client_ip import get_client_ip
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# In-memory storage for verification codes (email -> {code, role, expires_at})
-verification_codes = {}
-
-# Cache for user lists by role (role -> list of users)
-_users_cache = {}
+USERS_CACHE_TAG = "users"
 
 
 class SendVerificationRequest(BaseModel):
@@ -51,26 +55,81 @@ class UserOption(BaseModel):
 
 def generate_verification_code():
     """Generate a 6-digit verification code"""
-    return ''.join(random.choices(string.digits, k=6))
+    return ''.join(secrets.choice(string.digits) for _ in range(6))
+
+
+def users_by_role(role: str) -> list[dict]:
+    """Users of a role ({name, email}), from the shared cache"""
+    role_upper = role.upper()
+    return get_cache().get_or_set(
+        f"users:{role_upper}",
+        lambda: fetch_users_by_role(role_upper),
+        ttl=settings.USERS_CACHE_TTL_SECONDS,
+        tags=(USERS_CACHE_TAG,),
+    )
+
+
+def lookup_user_name(email: str, role: str) -> Optional[str]:
+    """Display name of a known user for the role, if any"""
+    for user in users_by_role(role):
+        if user["email"].lower() == email:
+            return user["name"]
+    return None
+
+
+def verification_code_digest(email: str, code: str) -> str:
+    """Keyed hash of a code: the verification token is readable by the client, the code must not be"""
+    return hmac.new(settings.AUTH_SECRET.encode(), f"{email}:{code}".encode(), hashlib.sha256).hexdigest()
 
 
 def create_verification_token(email: str, role: str, code: str, expires_at: datetime) -> str:
     payload = {
         "email": email,
         "role": role,
-        "code": code,
+        "code_digest": verification_code_digest(email, code),
         "exp": int(expires_at.timestamp()),
     }
+    from jose import jwt  # deferred: python-jose is slow to import
+
     return jwt.encode(payload, settings.AUTH_SECRET, algorithm="HS256")
 
+def enforce_verification_rate_limit(email: str, client_ip: str):
+    """
+    Token buckets per client IP and per email address.
+    Raises 429 with Retry-After when either bucket is empty; a rejected
+    request spends no token from either bucket.
+    """
+    checks = [
+        ("ip", client_ip, settings.VERIFICATION_IP_BURST, settings.VERIFICATION_IP_PER_HOUR),
+        ("email", email, settings.VERIFICATION_EMAIL_BURST, settings.VERIFICATION_EMAIL_PER_HOUR),
+    ]
+    allowed, retry_after, rejected = get_rate_limiter().acquire_all(
+        [(f"send-code:{scope}:{value}", burst, per_hour / 3600) for scope, value, burst, per_hour in checks]
+    )
+    if not allowed:
+        scope, value = checks[rejected][:2]
+        metrics.increment("auth_send_code_rate_limited_total", scope=scope)
+        logger.warning(f"Rate limited verification code request ({scope}={value}), retry after {retry_after:.0f}s")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many verification code requests. Please try again later.",
+            headers={"Retry-After": retry_after_header(retry_after)},
+        )
+    metrics.increment("auth_send_code_allowed_total")
+
+
 @router.post("/send-verification-code")
-async def send_verification_code(request: SendVerificationRequest):
+async def send_verification_code(request: SendVerificationRequest, http_request: Request):
     """
     Send verification code to email address.
+    Rate limited per email and per client IP.
     """
     email = str(request.email).strip().lower()
     role = request.role.strip().upper()
 
+    # Both may block on Postgres: keep them off the event loop
+    await run_in_threadpool(enforce_verification_rate_limit, email, get_client_ip(http_request))
+
     # Validate role
     valid_roles = ["COMMERCIAL", "PL", "VP"]
     if role not in valid_roles:
@@ -78,14 +137,10 @@ async def send_verification_code(request: SendVerificationRequest):
 
     # Generate verification code
     code = generate_verification_code()
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)  # Code valid for 10 minutes
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.VERIFICATION_CODE_TTL_MINUTES)
 
-    # Store verification code
-    verification_codes[email] = {
-        "code": code,
-        "role": role,
-        "expires_at": expires_at
-    }
+    # Store verification code (also resets the failed attempt counter)
+    await run_in_threadpool(get_verification_store().save, email, code, role, expires_at)
 
     verification_token = create_verification_token(email, role, code, expires_at)
     
@@ -116,16 +171,32 @@ def verify_code(request: VerifyCodeRequest) -> UserInfo:
     code = request.code.strip()
     role = request.role.strip().upper()
     
-    logger.info(f"Attempting to verify code for {email} (role: {role}), code: {code}")
-    logger.debug(f"Current verification_codes keys: {list(verification_codes.keys())}")
+    logger.info(f"Attempting to verify code for {email} (role: {role})")
+
+    # Every attempt is counted before the code is compared, in one atomic
+    # step, so parallel guesses cannot get past the cap. Codes are single-use
+    # and only valid while stored, also with a verification token.
+    store = get_verification_store()
+    stored_data = store.register_attempt(email)
+
+    if not stored_data:
+        logger.warning(f"No valid verification code found for {email}")
+        raise HTTPException(status_code=400, detail="No verification code sent to this email or it has expired")
 
-    # Primary flow: stateless signed verification token
+    attempts = stored_data["attempts"]
+    if attempts > settings.VERIFICATION_CODE_MAX_ATTEMPTS:
+        logger.warning(f"Too many verification attempts for {email}")
+        raise HTTPException(status_code=429, detail="Too many attempts. Please request a new code.")
+
+    # Primary flow: signed verification token
     if request.verification_token:
+        from jose import jwt, JWTError  # deferred: python-jose is slow to import
+
         try:
             payload = jwt.decode(request.verification_token, settings.AUTH_SECRET, algorithms=["HS256"])
             token_email = str(payload.get("email", "")).strip().lower()
             token_role = str(payload.get("role", "")).strip().upper()
-            token_code = str(payload.get("code", "")).strip()
+            token_digest = str(payload.get("code_digest", ""))
 
             if token_email != email:
                 raise HTTPException(status_code=400, detail="Verification token does not match email")
@@ -133,52 +204,32 @@ def verify_code(request: VerifyCodeRequest) -> UserInfo:
             if token_role != role:
                 raise HTTPException(status_code=400, detail=f"Role mismatch: expected {token_role}, got {role}")
 
-            if token_code != code:
+            if not hmac.compare_digest(token_digest, verification_code_digest(email, code)):
+                logger.warning(f"Invalid code for {email} (attempt {attempts}/{settings.VERIFICATION_CODE_MAX_ATTEMPTS})")
                 raise HTTPException(status_code=400, detail="Invalid verification code")
 
         except JWTError:
             raise HTTPException(status_code=400, detail="Verification session expired. Please request a new code.")
-    else:
-        # Backward-compatible fallback: in-memory verification store
-        if email not in verification_codes:
-            logger.warning(f"No verification code found for {email}. Available emails: {list(verification_codes.keys())}")
-            raise HTTPException(status_code=400, detail="No verification code sent to this email")
-
-        stored_data = verification_codes[email]
-        logger.debug(f"Stored data for {email}: code={stored_data['code']}, role={stored_data['role']}, expires_at={stored_data['expires_at']}")
-
-        # Check if code has expired
-        current_time = datetime.now(timezone.utc)
-        stored_expires_at = stored_data["expires_at"]
-        if stored_expires_at.tzinfo is None:
-            stored_expires_at = stored_expires_at.replace(tzinfo=timezone.utc)
-
-        if current_time > stored_expires_at:
-            time_diff = (current_time - stored_expires_at).total_seconds()
-            del verification_codes[email]
-            logger.warning(f"Verification code expired for {email} by {time_diff} seconds")
-            raise HTTPException(status_code=400, detail="Verification code has expired. Please request a new one.")
-
-        # Check if code matches
-        if code != stored_data["code"]:
-            logger.warning(f"Invalid code for {email}: got '{code}' (len={len(code)}), expected '{stored_data['code']}' (len={len(stored_data['code'])})")
-            raise HTTPException(status_code=400, detail="Invalid verification code")
-
-        # Check if role matches (case-insensitive)
-        stored_role = stored_data["role"].upper()
-        if role.upper() != stored_role:
-            logger.warning(f"Role mismatch for {email}: got {role}, expected {stored_role}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Role mismatch: expected {stored_role}, got {role}"
-            )
-
-    # Code is valid, create token (simple token: email:role:timestamp)
-    token = f"{email}:{role}:{datetime.utcnow().isoformat()}"
-
-    # Clean up used verification code if present in fallback in-memory store
-    if email in verification_codes:
-        del verification_codes[email]
+
+    # The stored code must match in both flows (the token may belong to an older code)
+    if not hmac.compare_digest(code, stored_data["code"]):
+        logger.warning(f"Invalid code for {email} (attempt {attempts}/{settings.VERIFICATION_CODE_MAX_ATTEMPTS})")
+        raise HTTPException(status_code=400, detail="Invalid verification code")
+
+    # Check if role matches (case-insensitive)
+    stored_role = stored_data["role"].upper()
+    if role.upper() != stored_role:
+        logger.warning(f"Role mismatch for {email}: got {role}, expected {stored_role}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Role mismatch: expected {stored_role}, got {role}"
+        )
+
+    # Code is valid, issue a signed access token
+    token = create_access_token(email, role, lookup_user_name(email, role))
+
+    # Clean up used verification code (codes are single-use)
+    store.delete(email)
     
     logger.info(f"Successfully verified {email} as {role}")
 
@@ -191,12 +242,7 @@ def get_users_for_role(role: str):
     Get list of users for a specific role
     """
     role_upper = role.upper()
-    
-    # Check in-memory cache first
-    if role_upper not in _users_cache:
-        _users_cache[role_upper] = fetch_users_by_role(role_upper)
-    
-    users = _users_cache[role_upper]
+    users = users_by_role(role_upper)
     
     # Add cache headers to improve performance on repeated requests
     return JSONResponse(
@@ -208,42 +254,24 @@ def get_users_for_role(role: str):
     )
 
 
-@router.get("/debug/codes")
-def debug_codes():
-    """
-    Debug endpoint to check verification codes (remove in production)
-    """
-    return {
-        "codes_count": len(verification_codes),
-        "emails": list(verification_codes.keys()),
-        "details": {
-            email: {
-                "code": data["code"],
-                "role": data["role"],
-                "expires_at": data["expires_at"].isoformat(),
-                "expired": datetime.utcnow() > data["expires_at"]
-            }
-            for email, data in verification_codes.items()
-        }
-    }
-
-
 @router.post("/login")
 def login(user: UserLogin) -> UserInfo:
     """
     Email-based login with user-selected role.
     Users can choose their role during login (COMMERCIAL, PL, or VP).
+    Nothing is verified here, so the returned token is the legacy
+    "email:role:timestamp" one and authenticates nobody; signed access
+    tokens come from /auth/verify-code only.
     """
-    email = user.email.lower()
-    role = user.role.upper()
+    email = str(user.email).strip().lower()
+    role = user.role.strip().upper()
 
     # Validate role
     valid_roles = ["COMMERCIAL", "PL", "VP"]
     if role not in valid_roles:
         role = "COMMERCIAL"  # Default to COMMERCIAL if invalid
 
-    # Create token (simple token: email:role:timestamp)
-    token = f"{email}:{role}:{datetime.utcnow().isoformat()}"
+    token = f"{email}:{role}:{datetime.now(timezone.utc).isoformat()}"
 
     return UserInfo(email=email, role=role, token=token)
 
@@ -1,28 +1,78 @@
 """
 API routes for comments on pricing requests
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import base64
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from app.core.deps import get_db
+from sqlalchemy import and_, tuple_
+from typing import Optional
+from app.core.deps import get_db, get_optional_user, resolve_user_email
+from app.core.security import CurrentUser
 from app.models.comment import Comment
 from app.models.pricing_request import PricingRequest
 from app.schemas.comment import CommentCreate, CommentResponse
 from app.utils.notifications import create_comment_notification
+from app.utils.etag import row_version
+from app.services.request_cache import get_request_detail, invalidate_request
 
 router = APIRouter(prefix="/api/comments", tags=["comments"])
 
 
+def encode_comment_cursor(comment: Comment) -> str:
+    raw = f"{comment.created_at.isoformat()}|{comment.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_comment_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, comment_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
 @router.get("/request/{request_id}", response_model=list[CommentResponse])
-def get_comments(request_id: int, db: Session = Depends(get_db)):
+def get_comments(
+    request_id: int,
+    response: Response,
+    since: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
     """
-    Get all comments for a pricing request
+    Get comments for a pricing request, oldest first.
+    - since: only comments created after this timestamp (incremental refresh)
+    - cursor/limit: page through long threads; the next cursor is returned
+      in the X-Next-Cursor header when more comments are available
     """
-    # Verify request exists
-    request = db.query(PricingRequest).filter(PricingRequest.id == request_id).first()
-    if not request:
+    # Single query: the outer join yields one row with no comment when the
+    # request exists but nothing matches, and no row at all when it does not
+    conditions = [Comment.request_id == PricingRequest.id]
+    if since is not None:
+        conditions.append(Comment.created_at > since)
+    if cursor:
+        conditions.append(tuple_(Comment.created_at, Comment.id) > tuple_(*decode_comment_cursor(cursor)))
+
+    query = db.query(PricingRequest.id, Comment).outerjoin(
+        Comment, and_(*conditions)
+    ).filter(
+        PricingRequest.id == request_id
+    ).order_by(Comment.created_at, Comment.id)
+
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    if not rows:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-    
-    comments = db.query(Comment).filter(Comment.request_id == request_id).order_by(Comment.created_at).all()
+
+    comments = [comment for _, comment in rows if comment is not None]
+    if limit and len(comments) > limit:
+        comments = comments[:limit]
+        response.headers["X-Next-Cursor"] = encode_comment_cursor(comments[-1])
+
     return comments
 
 
@@ -32,8 +82,7 @@ def get_archived_comments(request_id: int, db: Session = Depends(get_db)):
     Get archived comments for a pricing request
     """
     # Verify request exists
-    request = db.query(PricingRequest).filter(PricingRequest.id == request_id).first()
-    if not request:
+    if not row_version(db, PricingRequest, request_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
     
     comments = db.query(Comment).filter(
@@ -47,26 +96,32 @@ def get_archived_comments(request_id: int, db: Session = Depends(get_db)):
 def create_comment(
     request_id: int,
     comment: CommentCreate,
-    author_email: str = Query(...),
-    author_name: str = Query(...),
+    author_email: Optional[str] = Query(None),
+    author_name: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     """
-    Add a comment to a pricing request
+    Add a comment to a pricing request.
+    The author is taken from the access token when one is sent.
     """
-    # Verify request exists
-    request = db.query(PricingRequest).filter(PricingRequest.id == request_id).first()
+    author_email = resolve_user_email(user, author_email)
+
+    # Verify request exists (cached detail, see app/services/request_cache.py)
+    request = get_request_detail(db, request_id)
     if not request:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
 
     normalized_author_email = author_email.strip().lower()
+    if user is not None and user.name:
+        author_name = user.name
     normalized_author_name = (author_name or "").strip() or normalized_author_email.split("@")[0]
     
     # Determine role based on email
     role = "COMMERCIAL"  # default
-    if normalized_author_email == (request.product_line_responsible_email or "").strip().lower():
+    if normalized_author_email == (request["product_line_responsible_email"] or "").strip().lower():
         role = "PL"
-    elif normalized_author_email == (request.vp_email or "").strip().lower():
+    elif normalized_author_email == (request["vp_email"] or "").strip().lower():
         role = "VP"
     
     new_comment = Comment(
@@ -78,6 +133,7 @@ def create_comment(
     )
     
     db.add(new_comment)
+    invalidate_request(db, request_id)
     db.commit()
     db.refresh(new_comment)
 
@@ -86,9 +142,9 @@ def create_comment(
 
     recipients: dict[str, str] = {}
 
-    pl_email = (request.product_line_responsible_email or "").strip().lower()
-    vp_email = (request.vp_email or "").strip().lower()
-    commercial_email = (request.requester_email or "").strip().lower()
+    pl_email = (request["product_line_responsible_email"] or "").strip().lower()
+    vp_email = (request["vp_email"] or "").strip().lower()
+    commercial_email = (request["requester_email"] or "").strip().lower()
     vp_visible_statuses = {
         RequestStatus.ESCALATED_TO_VP.value,
         RequestStatus.APPROVED_BY_VP.value,
@@ -98,12 +154,12 @@ def create_comment(
     if role == "COMMERCIAL":
         if pl_email:
             recipients[pl_email] = "PL"
-        if vp_email and request.status in vp_visible_statuses:
+        if vp_email and request["status"] in vp_visible_statuses:
             recipients[vp_email] = "VP"
     elif role == "PL":
         if commercial_email:
             recipients[commercial_email] = "COMMERCIAL"
-        if vp_email and request.status in vp_visible_statuses:
+        if vp_email and request["status"] in vp_visible_statuses:
             recipients[vp_email] = "VP"
     elif role == "VP":
         if commercial_email:
@@ -128,28 +184,34 @@ def create_comment(
 @router.patch("/{comment_id}/archive", response_model=CommentResponse)
 def archive_comment(
     comment_id: int,
-    author_email: str = Query(...),
+    author_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     """
     Archive a discussion thread (only author or PL/VP can archive)
     """
+    author_email = resolve_user_email(user, author_email)
+
     comment = db.query(Comment).filter(Comment.id == comment_id).first()
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     
     # Get request details to verify permissions
-    request = db.query(PricingRequest).filter(PricingRequest.id == comment.request_id).first()
+    request = get_request_detail(db, comment.request_id)
+    if not request:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
     
     # Allow author, PL responsible, or VP to archive
     is_author = comment.author_email == author_email
-    is_pl = author_email == request.product_line_responsible_email
-    is_vp = author_email == request.vp_email
+    is_pl = author_email == request["product_line_responsible_email"]
+    is_vp = author_email == request["vp_email"]
     
     if not (is_author or is_pl or is_vp):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to archive this comment")
     
     comment.is_archived = True
+    invalidate_request(db, comment.request_id)
     db.commit()
     db.refresh(comment)
     
@@ -159,28 +221,34 @@ def archive_comment(
 @router.patch("/{comment_id}/unarchive", response_model=CommentResponse)
 def unarchive_comment(
     comment_id: int,
-    author_email: str = Query(...),
+    author_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     """
     Unarchive a discussion thread (only author or PL/VP can unarchive)
     """
+    author_email = resolve_user_email(user, author_email)
+
     comment = db.query(Comment).filter(Comment.id == comment_id).first()
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     
     # Get request details to verify permissions
-    request = db.query(PricingRequest).filter(PricingRequest.id == comment.request_id).first()
+    request = get_request_detail(db, comment.request_id)
+    if not request:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
     
     # Allow author, PL responsible, or VP to unarchive
     is_author = comment.author_email == author_email
-    is_pl = author_email == request.product_line_responsible_email
-    is_vp = author_email == request.vp_email
+    is_pl = author_email == request["product_line_responsible_email"]
+    is_vp = author_email == request["vp_email"]
     
     if not (is_author or is_pl or is_vp):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to unarchive this comment")
     
     comment.is_archived = False
+    invalidate_request(db, comment.request_id)
     db.commit()
     db.refresh(comment)
     
@@ -190,12 +258,15 @@ def unarchive_comment(
 @router.delete("/{comment_id}")
 def delete_comment(
     comment_id: int,
-    author_email: str = Query(...),
+    author_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     """
     Delete a comment (only author can delete)
     """
+    author_email = resolve_user_email(user, author_email)
+
     comment = db.query(Comment).filter(Comment.id == comment_id).first()
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
@@ -205,6 +276,7 @@ def delete_comment(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the author can delete this comment")
     
     db.delete(comment)
+    invalidate_request(db, comment.request_id)
     db.commit()
     
     return {"message": "Comment deleted successfully"}
@@ -1,9 +1,13 @@
 from fastapi import APIRouter
+from app.core.config import settings
+from app.services.cache import get_cache
 from app.utils.constants import PRODUCT_LINES, PLANTS, CUSTOMERS
 from app.utils.excel_loader import get_customers as get_customers_from_file
 
 router = APIRouter(prefix="/dropdowns", tags=["Dropdowns"])
 
+DROPDOWNS_CACHE_TAG = "dropdowns"
+
 
 @router.get("/product-lines")
 def get_product_lines():
@@ -20,7 +24,12 @@ def get_plants():
 @router.get("/customers")
 def get_customers_list():
     """Get list of customers from Excel file, database, or fallback to constants"""
-    customers_from_file = get_customers_from_file()
+    customers_from_file = get_cache().get_or_set(
+        "dropdowns:customers",
+        get_customers_from_file,
+        ttl=settings.DROPDOWNS_CACHE_TTL_SECONDS,
+        tags=(DROPDOWNS_CACHE_TAG,),
+    )
     return {
         "customers": customers_from_file if customers_from_file else CUSTOMERS
     }
@@ -4,7 +4,7 @@ API routes for notifications
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from app.core.deps import get_db
+from app.core.deps import get_db, get_read_db
 from app.models.notification import Notification
 from app.schemas.notification import NotificationResponse
 
@@ -14,7 +14,7 @@ router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 @router.get("/user/{user_email}", response_model=list[NotificationResponse])
 def get_user_notifications(
     user_email: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all notifications for a user (paginated, ordered by newest first)
@@ -32,7 +32,7 @@ def get_user_notifications(
 @router.get("/user/{user_email}/unread", response_model=dict)
 def get_unread_count(
     user_email: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get count of unread notifications for a user
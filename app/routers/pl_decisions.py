@@ -1,44 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
-from app.core.deps import get_db
+from app.core.deps import get_db, get_read_db, get_optional_user, resolve_user_email
+from app.core.security import CurrentUser
 from app.models.pricing_request import PricingRequest
 from app.models.enums import RequestStatus
-from app.schemas.pl_decision import PLDecision, PLActionEnum
-from app.emails.mailer import (
-    send_pl_decision_to_commercial,
-    send_escalation_to_vp,
-)
+from app.schemas.pl_decision import PLDecision, PLActionEnum, PLBulkDecisionRequest
+from app.models.email_outbox import EmailOutbox
+from app.services.outbox import enqueue_email, deliver_outbox_email
 from app.utils.notifications import create_pl_decision_notification
+from app.utils.status_events import add_status_event
+from app.services.request_cache import get_request_detail, invalidate_request
+from app.utils.concurrency import lock_pricing_request, commit_or_conflict, flush_or_conflict, CONFLICT_DETAIL
+from app.utils.etag import make_etag, etag_matches, not_modified, set_etag, row_version, list_version
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields of the PL review page, taken from the cached request detail
+PL_DETAIL_FIELDS = (
+    "id",
+    "costing_number",
+    "project_name",
+    "customer",
+    "product_line",
+    "plant",
+    "yearly_sales",
+    "initial_price",
+    "target_price",
+    "problem_to_solve",
+    "attachment_path",
+    "requester_email",
+    "requester_name",
+    "status",
+    "created_at",
+)
+
 router = APIRouter(prefix="/pl-decisions", tags=["PL Decisions"])
 
 
 @router.get("/inbox")
 def get_pl_inbox(
-    pl_email: str = Query(...),
+    http_request: Request,
+    response: Response,
+    pl_email: Optional[str] = Query(None),
     archived: bool = Query(False),
-    db: Session = Depends(get_db)
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get pricing requests for a PL responsible.
     If archived=false: Get pending requests (UNDER_REVIEW_PL status)
     If archived=true: Get completed requests (APPROVED_BY_PL or REJECTED_BY_PL status)
+    Supports conditional GET via ETag / If-None-Match.
     """
+    pl_email = resolve_user_email(user, pl_email)
+
     if not archived:
         # Pending requests - only those under review by this PL
-        requests = db.query(PricingRequest).filter(
+        filters = [
             PricingRequest.product_line_responsible_email == pl_email,
             PricingRequest.status == RequestStatus.UNDER_REVIEW_PL.value
-        ).order_by(PricingRequest.created_at.desc()).all()
+        ]
     else:
         # Archived/completed requests - those this PL has already decided on
-        requests = db.query(PricingRequest).filter(
+        filters = [
             PricingRequest.product_line_responsible_email == pl_email,
             PricingRequest.status.in_([
                 RequestStatus.APPROVED_BY_PL.value,
@@ -48,8 +76,18 @@ def get_pl_inbox(
                 RequestStatus.REJECTED_BY_VP.value,
                 RequestStatus.CLOSED.value
             ])
-        ).order_by(PricingRequest.created_at.desc()).all()
-    
+        ]
+
+    count, last_updated = list_version(db, PricingRequest, *filters)
+    etag = make_etag("pl-inbox", pl_email, archived, count, last_updated)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
+    requests = db.query(PricingRequest).filter(
+        *filters
+    ).order_by(PricingRequest.created_at.desc()).all()
+
+    set_etag(response, etag)
     return [
         {
             "id": r.id,
@@ -72,100 +110,216 @@ def get_pl_inbox(
     ]
 
 
+def _apply_pl_decision(db: Session, request: PricingRequest, decision: PLDecision):
+    """
+    Validate and apply a PL decision to a loaded request, add its status
+    event and invalidate its cached detail (no commit).
+    Raises HTTPException when the transition is not allowed.
+    """
+    if request.status != RequestStatus.UNDER_REVIEW_PL.value:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Request is not under Product Line review (current status: {request.status})"
+        )
+
+    action = decision.action
+
+    if action == PLActionEnum.APPROVE:
+        request.status = RequestStatus.APPROVED_BY_PL.value
+        request.final_approved_price = decision.suggested_price or request.target_price
+
+    elif action == PLActionEnum.REJECT:
+        request.status = RequestStatus.REJECTED_BY_PL.value
+        request.final_approved_price = None  # Clear any previous approved price
+
+    elif action == PLActionEnum.ESCALATE:
+        if not request.vp_email:
+            raise HTTPException(
+                status_code=400,
+                detail="VP email not defined for this request. Cannot escalate."
+            )
+        request.status = RequestStatus.ESCALATED_TO_VP.value
+
+    request.pl_suggested_price = decision.suggested_price
+    request.pl_comments = decision.comments
+    request.pl_decision_date = datetime.utcnow()
+
+    add_status_event(
+        db,
+        request,
+        from_status=RequestStatus.UNDER_REVIEW_PL.value,
+        actor_email=request.product_line_responsible_email,
+        actor_name=request.product_line_responsible_name,
+        comments=decision.comments,
+    )
+    invalidate_request(db, request.id)
+
+
+def _add_pl_decision_notification(db: Session, request: PricingRequest, action: PLActionEnum):
+    """Add the in-app notification for an approve/reject to the current transaction"""
+    if action not in [PLActionEnum.APPROVE, PLActionEnum.REJECT]:
+        return
+    create_pl_decision_notification(
+        db=db,
+        recipient_email=request.requester_email,
+        recipient_role="COMMERCIAL",
+        request_id=request.id,
+        pl_name=request.product_line_responsible_name or request.product_line_responsible_email,
+        pl_email=request.product_line_responsible_email,
+        action=action.value,
+        suggested_price=request.pl_suggested_price,
+        commit=False,
+    )
+
+
+def _queue_pl_decision_email(db: Session, request: PricingRequest, action: PLActionEnum) -> EmailOutbox:
+    """Add the decision email to the outbox in the current transaction"""
+    if action in [PLActionEnum.APPROVE, PLActionEnum.REJECT]:
+        return enqueue_email(db, "pl_decision", request.requester_email, dict(
+            project_name=request.project_name,
+            decision=request.status,
+            comments=request.pl_comments,
+            suggested_price=float(request.pl_suggested_price) if request.pl_suggested_price else None,
+            costing_number=request.costing_number,
+        ), request_id=request.id)
+    return enqueue_email(db, "escalation", request.vp_email, dict(
+        project_name=request.project_name,
+        target_price=float(request.target_price),
+        comments=request.pl_comments,
+        initial_price=float(request.initial_price),
+        pl_name=request.product_line_responsible_name or request.product_line_responsible_email,
+        costing_number=request.costing_number,
+    ), request_id=request.id)
+
+
+@router.post("/bulk")
+def pl_decide_bulk(
+    payload: PLBulkDecisionRequest,
+    background_tasks: BackgroundTasks,
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Apply many PL decisions at once.
+    All target rows are locked with one SELECT ... FOR UPDATE SKIP LOCKED and
+    the valid transitions are committed in a single transaction. Rows locked
+    by a concurrent decision are reported as 409 instead of waiting.
+    Returns one result per item; the decision emails are queued in the
+    outbox in the same transaction and sent after the commit.
+    """
+    request_ids = set(item.request_id for item in payload.decisions)
+
+    requests = {
+        r.id: r
+        for r in db.query(PricingRequest).filter(
+            PricingRequest.id.in_(request_ids)
+        ).order_by(PricingRequest.id).with_for_update(skip_locked=True).all()
+    }
+
+    # Tell rows that do not exist apart from rows locked by someone else
+    skipped = request_ids - requests.keys()
+    locked = set()
+    if skipped:
+        locked = {
+            row.id for row in db.query(PricingRequest.id).filter(PricingRequest.id.in_(skipped))
+        }
+
+    results = []
+    applied = 0
+    emails = []
+    seen = set()
+    for item in payload.decisions:
+        request = requests.get(item.request_id)
+        error = None
+        if item.request_id in seen:
+            error = (400, "Duplicate request in batch")
+        elif item.request_id in locked:
+            error = (409, CONFLICT_DETAIL)
+        elif request is None:
+            error = (404, "Request not found")
+        elif user is not None and (request.product_line_responsible_email or "").strip().lower() != user.email:
+            error = (403, "Not the Product Line responsible for this request")
+        seen.add(item.request_id)
+
+        if error is None:
+            try:
+                _apply_pl_decision(db, request, item)
+            except HTTPException as e:
+                error = (e.status_code, e.detail)
+
+        if error is not None:
+            results.append({
+                "request_id": item.request_id,
+                "success": False,
+                "status_code": error[0],
+                "detail": error[1],
+            })
+            continue
+
+        _add_pl_decision_notification(db, request, item.action)
+        emails.append(_queue_pl_decision_email(db, request, item.action))
+        applied += 1
+        results.append({
+            "request_id": item.request_id,
+            "success": True,
+            "status_code": 200,
+            "status": request.status,
+        })
+
+    try:
+        flush_or_conflict(db)
+        email_ids = [email.id for email in emails]
+        commit_or_conflict(db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error processing bulk PL decisions: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing decisions: {str(e)}")
+
+    # Sent right after the response; the scheduler retries failures
+    for email_id in email_ids:
+        background_tasks.add_task(deliver_outbox_email, email_id)
+
+    return {
+        "processed": applied,
+        "failed": len(results) - applied,
+        "results": results,
+    }
+
+
 @router.post("/{request_id}")
 def pl_decide(
     request_id: int,
     decision: PLDecision,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """
     PL responsible makes a decision on a pricing request
     Options: APPROVE, REJECT, ESCALATE
+    A concurrent decision on the same request fails fast with 409.
+    The notification and the outbox email are written in the decision's
+    transaction; the email is sent after the commit.
     """
-    request = db.query(PricingRequest).filter(
-        PricingRequest.id == request_id
-    ).first()
+    request = lock_pricing_request(db, request_id)
 
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
-    if request.status != RequestStatus.UNDER_REVIEW_PL.value:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Request is not under Product Line review (current status: {request.status})"
-        )
-
     action = decision.action
+    _apply_pl_decision(db, request, decision)
 
     try:
-        if action == PLActionEnum.APPROVE:
-            request.status = RequestStatus.APPROVED_BY_PL.value
-            request.final_approved_price = decision.suggested_price or request.target_price
-
-        elif action == PLActionEnum.REJECT:
-            request.status = RequestStatus.REJECTED_BY_PL.value
-            request.final_approved_price = None  # Clear any previous approved price
-
-        elif action == PLActionEnum.ESCALATE:
-            if not request.vp_email:
-                raise HTTPException(
-                    status_code=400,
-                    detail="VP email not defined for this request. Cannot escalate."
-                )
-            request.status = RequestStatus.ESCALATED_TO_VP.value
-
-        request.pl_suggested_price = decision.suggested_price
-        request.pl_comments = decision.comments
-        request.pl_decision_date = datetime.utcnow()
-
-        db.commit()
+        _add_pl_decision_notification(db, request, action)
+        email = _queue_pl_decision_email(db, request, action)
+        flush_or_conflict(db)
+        email_id = email.id
+        commit_or_conflict(db)
         db.refresh(request)
 
-        # Send appropriate email notifications
-        if action in [PLActionEnum.APPROVE, PLActionEnum.REJECT]:
-            try:
-                send_pl_decision_to_commercial(
-                    to_email=request.requester_email,
-                    project_name=request.project_name,
-                    decision=request.status,
-                    comments=request.pl_comments,
-                    suggested_price=request.pl_suggested_price,
-                    costing_number=request.costing_number,
-                )
-            except Exception as email_error:
-                logger.warning(f"Email notification failed (non-critical): {str(email_error)}")
-                # Continue even if email fails - decision is already saved
-            
-            # Create in-app notification
-            try:
-                create_pl_decision_notification(
-                    db=db,
-                    recipient_email=request.requester_email,
-                    recipient_role="COMMERCIAL",
-                    request_id=request.id,
-                    pl_name=request.product_line_responsible_name or request.product_line_responsible_email,
-                    pl_email=request.product_line_responsible_email,
-                    action=action.value,
-                    suggested_price=request.pl_suggested_price,
-                )
-            except Exception as notification_error:
-                logger.warning(f"In-app notification failed (non-critical): {str(notification_error)}")
-                # Continue even if notification fails
-
-        elif action == PLActionEnum.ESCALATE:
-            try:
-                send_escalation_to_vp(
-                    to_email=request.vp_email,
-                    project_name=request.project_name,
-                    target_price=float(request.target_price),
-                    comments=request.pl_comments,
-                    initial_price=float(request.initial_price),
-                    pl_name=request.product_line_responsible_name or request.product_line_responsible_email,
-                    costing_number=request.costing_number,
-                )
-            except Exception as email_error:
-                logger.warning(f"Escalation email failed (non-critical): {str(email_error)}")
-                # Continue even if email fails - decision is already saved
+        # Sent right after the response; the scheduler retries failures
+        background_tasks.add_task(deliver_outbox_email, email_id)
 
         return {
             "message": f"Product Line decision processed: {action.value}",
@@ -173,6 +327,8 @@ def pl_decide(
             "status": request.status
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing PL decision: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing decision: {str(e)}")
@@ -181,32 +337,25 @@ def pl_decide(
 @router.get("/{request_id}")
 def get_pl_request_detail(
     request_id: int,
+    http_request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
     """
-    Get full details of a pricing request for PL review
+    Get full details of a pricing request for PL review.
+    Supports conditional GET via ETag / If-None-Match.
     """
-    request = db.query(PricingRequest).filter(
-        PricingRequest.id == request_id
-    ).first()
+    version = row_version(db, PricingRequest, request_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Request not found")
 
-    if not request:
+    etag = make_etag("pl-request", request_id, version.updated_at)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
+    detail = get_request_detail(db, request_id, version.updated_at)
+    if not detail:
         raise HTTPException(status_code=404, detail="Request not found")
 
-    return {
-        "id": request.id,
-        "costing_number": request.costing_number,
-        "project_name": request.project_name,
-        "customer": request.customer,
-        "product_line": request.product_line,
-        "plant": request.plant,
-        "yearly_sales": float(request.yearly_sales),
-        "initial_price": float(request.initial_price),
-        "target_price": float(request.target_price),
-        "problem_to_solve": request.problem_to_solve,
-        "attachment_path": request.attachment_path,
-        "requester_email": request.requester_email,
-        "requester_name": request.requester_name,
-        "status": request.status,
-        "created_at": request.created_at,
-    }
+    set_etag(response, etag)
+    return {field: detail[field] for field in PL_DETAIL_FIELDS}
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, BackgroundTasks, Request, Response, Header
+from sqlalchemy import func, literal, select, true
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
 import os
 import uuid
 
@@ -10,11 +11,27 @@ from app.schemas.pricing_request import (
     PricingRequestResponse,
     PricingRequestDetailResponse,
 )
+from app.schemas.workspace import RequestWorkspaceResponse
 from app.models.pricing_request import PricingRequest
+from app.models.comment import Comment
+from app.models.notification import Notification
+from app.models.email_outbox import EmailOutbox
+from app.models.request_status_event import RequestStatusEvent
 from app.models.enums import RequestStatus
-from app.core.deps import get_db
-from app.emails.mailer import send_pricing_request_email
-from app.utils.notifications import create_request_submitted_notification
+from app.core.deps import get_db, get_read_db, get_optional_user, resolve_user_email
+from app.core.security import CurrentUser
+from app.services.outbox import deliver_outbox_email
+from app.services.request_cache import get_request_detail
+from app.utils.notifications import request_submitted_notification_from
+from app.utils.status_events import submission_event_from
+from app.utils.etag import make_etag, etag_matches, not_modified, set_etag, row_version, list_version
+from app.services.idempotency import (
+    IDEMPOTENCY_HEADER,
+    validate_idempotency_key,
+    request_fingerprint,
+    get_stored_response,
+    store_response_from,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,15 +42,30 @@ router = APIRouter(
 )
 
 
+SUBMIT_SCOPE = "pricing-requests:submit"
+SUBMIT_MESSAGE = "Pricing request submitted successfully"
+
+
 @router.post("/", response_model=dict)
 def submit_pricing_request(
     payload: PricingRequestCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
 ):
     """
-    Submit a new pricing request (Commercial role)
+    Submit a new pricing request (Commercial role).
+    With an Idempotency-Key header, a retry returns the original response
+    without creating the request, notification or email again.
     """
+    idempotency_key = validate_idempotency_key(idempotency_key)
+    fingerprint = None
+    if idempotency_key:
+        fingerprint = request_fingerprint(payload)
+        stored = get_stored_response(db, SUBMIT_SCOPE, idempotency_key, fingerprint)
+        if stored is not None:
+            return stored
+
     requester_email = payload.requester_email.strip().lower()
     pl_email = payload.product_line_responsible_email.strip().lower()
     vp_email = payload.vp_email.strip().lower() if payload.vp_email else None
@@ -51,17 +83,6 @@ def submit_pricing_request(
             detail="Product line responsible email must end with @avocarbon.com"
         )
     
-    # Check if costing number already exists
-    existing = db.query(PricingRequest).filter(
-        PricingRequest.costing_number == payload.costing_number
-    ).first()
-    
-    if existing:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Costing number {payload.costing_number} already exists"
-        )
-    
     # Validate price logic
     if payload.target_price > payload.initial_price:
         raise HTTPException(
@@ -69,71 +90,120 @@ def submit_pricing_request(
             detail="Target price cannot be higher than initial price"
         )
 
-    try:
-        request = PricingRequest(
-            costing_number=payload.costing_number,
-            project_name=payload.project_name,
-            customer=payload.customer,
-            product_line=payload.product_line,
-            plant=payload.plant,
-            yearly_sales=payload.yearly_sales,
-            initial_price=payload.initial_price,
-            target_price=payload.target_price,
-            problem_to_solve=payload.problem_to_solve,
-            attachment_path=payload.attachment_path,
-            requester_email=requester_email,
-            requester_name=payload.requester_name,
-            product_line_responsible_email=pl_email,
-            product_line_responsible_name=payload.product_line_responsible_name,
-            vp_email=vp_email,
-            vp_name=payload.vp_name,
-            status=RequestStatus.UNDER_REVIEW_PL.value
+    # One statement: the request, its notification, the outbox email, its first
+    # status event and the stored idempotent response are inserted together, or not at all when the
+    # costing number already exists (ON CONFLICT DO NOTHING).
+    new_request = insert(PricingRequest).values(
+        costing_number=payload.costing_number,
+        project_name=payload.project_name,
+        customer=payload.customer,
+        product_line=payload.product_line,
+        plant=payload.plant,
+        yearly_sales=payload.yearly_sales,
+        initial_price=payload.initial_price,
+        target_price=payload.target_price,
+        problem_to_solve=payload.problem_to_solve,
+        attachment_path=payload.attachment_path,
+        requester_email=requester_email,
+        requester_name=payload.requester_name,
+        product_line_responsible_email=pl_email,
+        product_line_responsible_name=payload.product_line_responsible_name,
+        vp_email=vp_email,
+        vp_name=payload.vp_name,
+        status=RequestStatus.UNDER_REVIEW_PL.value,
+    ).on_conflict_do_nothing(
+        index_elements=[PricingRequest.costing_number]
+    ).returning(PricingRequest.id, PricingRequest.status).cte("new_request")
+
+    # Email to the PL responsible, rendered and sent after commit
+    email_params = {
+        "project_name": payload.project_name,
+        "customer": payload.customer,
+        "initial_price": payload.initial_price,
+        "target_price": payload.target_price,
+        "costing_number": payload.costing_number,
+    }
+    new_email = insert(EmailOutbox).from_select(
+        ["template", "params", "to_email", "request_id"],
+        select(
+            literal("pricing_request"),
+            literal(email_params, JSONB).op("||", return_type=JSONB)(
+                func.jsonb_build_object("request_id", new_request.c.id)
+            ),
+            literal(pl_email),
+            new_request.c.id,
+        ),
+    ).returning(EmailOutbox.id).cte("new_email")
+
+    statement = select(
+        new_request.c.id,
+        new_request.c.status,
+        new_email.c.id.label("email_id"),
+    ).join_from(new_request, new_email, true())
+
+    # In-app notification for PL inbox
+    notification = request_submitted_notification_from(
+        request_id=new_request.c.id,
+        recipient_email=pl_email,
+        recipient_role="PL",
+        requester_name=payload.requester_name,
+        requester_email=requester_email,
+        costing_number=payload.costing_number,
+    )
+    if notification is not None:
+        statement = statement.add_cte(notification.cte("new_notification"))
+
+    # First status event, for the timeline and SLA reports
+    statement = statement.add_cte(submission_event_from(
+        new_request.c.id, new_request.c.status, requester_email, payload.requester_name
+    ).cte("new_status_event"))
+
+    if idempotency_key:
+        response_body = func.jsonb_build_object(
+            "message", SUBMIT_MESSAGE,
+            "request_id", new_request.c.id,
+            "status", new_request.c.status,
+            "costing_number", payload.costing_number,
         )
+        statement = statement.add_cte(store_response_from(
+            new_request, SUBMIT_SCOPE, idempotency_key, fingerprint, response_body
+        ).cte("stored_response"))
 
-        db.add(request)
-        db.commit()
-        db.refresh(request)
-
-        # Create in-app notification for PL inbox
-        try:
-            create_request_submitted_notification(
-                db=db,
-                request_id=request.id,
-                recipient_email=request.product_line_responsible_email,
-                recipient_role="PL",
-                requester_name=request.requester_name,
-                requester_email=request.requester_email,
-                costing_number=request.costing_number,
+    try:
+        created = db.execute(statement).first()
+        if created is None:
+            db.rollback()
+            # Same costing number: a concurrent retry with this key may have won
+            if idempotency_key:
+                stored = get_stored_response(db, SUBMIT_SCOPE, idempotency_key, fingerprint)
+                if stored is not None:
+                    return stored
+            raise HTTPException(
+                status_code=400,
+                detail=f"Costing number {payload.costing_number} already exists"
             )
-        except Exception as notification_error:
-            logger.warning(f"In-app notification failed for request {request.id}: {notification_error}")
-
-        # Send email to PL responsible immediately after submit (async background task)
-        background_tasks.add_task(
-            send_pricing_request_email,
-            to_email=request.product_line_responsible_email,
-            project_name=request.project_name,
-            customer=request.customer,
-            initial_price=float(request.initial_price),
-            target_price=float(request.target_price),
-            request_id=request.id,
-            costing_number=request.costing_number,
-        )
+        db.commit()
+
+        # Send email to PL responsible right after commit; the scheduler retries failures
+        background_tasks.add_task(deliver_outbox_email, created.email_id)
 
         return {
-            "message": "Pricing request submitted successfully",
-            "request_id": request.id,
-            "status": request.status,
-            "costing_number": request.costing_number,
+            "message": SUBMIT_MESSAGE,
+            "request_id": created.id,
+            "status": created.status,
+            "costing_number": payload.costing_number,
         }
-    
+
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Error creating pricing request: {str(e)}")
         raise HTTPException(status_code=500, detail="Error creating pricing request")
 
 @router.get("/", response_model=List[PricingRequestResponse])
 def get_pricing_requests(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     status: Optional[str] = Query(None),
     product_line: Optional[str] = Query(None),
     requester_email: Optional[str] = Query(None),
@@ -161,10 +231,62 @@ def get_pricing_requests(
 @router.get("/{request_id}", response_model=PricingRequestDetailResponse)
 def get_pricing_request(
     request_id: int,
+    http_request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
     """
-    Get a single pricing request with full details
+    Get a single pricing request with full details.
+    Supports conditional GET via ETag / If-None-Match.
+    """
+    version = row_version(db, PricingRequest, request_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    etag = make_etag("pricing-request", request_id, version.updated_at)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
+    detail = get_request_detail(db, request_id, version.updated_at)
+    if not detail:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    set_etag(response, etag)
+    return detail
+
+
+def _status_timeline(db: Session, request_id: int) -> list:
+    """Status flow of a request from request_status_events"""
+    events = db.query(RequestStatusEvent).filter(
+        RequestStatusEvent.request_id == request_id
+    ).order_by(RequestStatusEvent.created_at, RequestStatusEvent.id).all()
+
+    return [
+        {
+            "status": event.to_status,
+            "from_status": event.from_status,
+            "at": event.created_at,
+            "actor_email": event.actor_email,
+            "actor_name": event.actor_name,
+            "comments": event.comments,
+        }
+        for event in events
+    ]
+
+
+@router.get("/{request_id}/workspace", response_model=RequestWorkspaceResponse)
+def get_request_workspace(
+    request_id: int,
+    viewer_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Everything the request page needs in one call: the request, its active
+    and archived comments, the status timeline and the viewer's unread
+    notifications for this request. Uses one session and four queries:
+    the request, the comment thread, the status events and the viewer's
+    unread notifications (skipped when there is no viewer).
     """
     request = db.query(PricingRequest).filter(
         PricingRequest.id == request_id
@@ -173,21 +295,52 @@ def get_pricing_request(
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
-    return request
+    # One query for the whole thread, split by archive flag in memory
+    thread = db.query(Comment).filter(
+        Comment.request_id == request_id
+    ).order_by(Comment.created_at, Comment.id).all()
+
+    viewer = user.email if user else (viewer_email or "").strip().lower()
+    unread_notifications = []
+    if viewer:
+        unread_notifications = db.query(Notification).filter(
+            Notification.recipient_email == viewer,
+            Notification.request_id == request_id,
+            Notification.is_read == False
+        ).order_by(Notification.created_at.desc()).all()
+
+    return {
+        "request": request,
+        "comments": [c for c in thread if not c.is_archived],
+        "archived_comments": [c for c in thread if c.is_archived],
+        "timeline": _status_timeline(db, request_id),
+        "unread_notifications": unread_notifications,
+    }
 
 
 @router.get("/user/{requester_email}", response_model=List[PricingRequestResponse])
 def get_user_pricing_requests(
     requester_email: str,
-    db: Session = Depends(get_db),
+    http_request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
 ):
     """
-    Get all pricing requests for a specific commercial user
+    Get all pricing requests for a specific commercial user.
+    Supports conditional GET via ETag / If-None-Match.
     """
+    filters = [PricingRequest.requester_email == requester_email]
+
+    count, last_updated = list_version(db, PricingRequest, *filters)
+    etag = make_etag("user-requests", requester_email, count, last_updated)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
     requests = db.query(PricingRequest).filter(
-        PricingRequest.requester_email == requester_email
+        *filters
     ).order_by(PricingRequest.created_at.desc()).all()
 
+    set_etag(response, etag)
     return requests
 
 
@@ -234,12 +387,15 @@ async def upload_attachment(file: UploadFile = File(...)):
 
 @router.get("/pl/archived")
 def get_pl_archived_requests(
-    pl_email: str = Query(...),
-    db: Session = Depends(get_db)
+    pl_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get archived requests for a PL responsible (approved or rejected by PL)
     """
+    pl_email = resolve_user_email(user, pl_email)
+
     requests = db.query(PricingRequest).filter(
         PricingRequest.product_line_responsible_email == pl_email,
         PricingRequest.status.in_([
@@ -275,12 +431,15 @@ def get_pl_archived_requests(
 
 @router.get("/vp/archived")
 def get_vp_archived_requests(
-    vp_email: str = Query(...),
-    db: Session = Depends(get_db)
+    vp_email: Optional[str] = Query(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get archived requests for a VP (approved or rejected by VP)
     """
+    vp_email = resolve_user_email(user, vp_email)
+
     requests = db.query(PricingRequest).filter(
         PricingRequest.vp_email == vp_email,
         PricingRequest.status.in_([
@@ -0,0 +1,160 @@
+"""
+API routes for full-text search across pricing requests and comments
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import cast, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from typing import Optional
+from app.core.deps import get_read_db
+from app.models.comment import Comment
+from app.models.pricing_request import PricingRequest, SEARCH_CONFIG
+from app.schemas.search import SearchResponse
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+# Counting stops here so a broad query never has to visit every match
+TOTAL_COUNT_LIMIT = 1000
+
+
+@router.get("", response_model=SearchResponse)
+def search(
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(request|comment)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = Query(False),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search requests (project, customer, problem, PL/VP comments) and discussion
+    comments. Results are ranked, highlighted and paginated.
+
+    `has_more` tells whether another page exists. The total is only counted
+    when `include_total` is set, and stops at TOTAL_COUNT_LIMIT.
+    """
+    config = cast(SEARCH_CONFIG, REGCONFIG)
+    tsquery = func.websearch_to_tsquery(config, q)
+
+    # Matching and ranking only touch the GIN-indexed generated columns
+    branches = []
+    if kind in (None, "request"):
+        branches.append(
+            select(
+                literal("request").label("kind"),
+                PricingRequest.id.label("id"),
+                PricingRequest.id.label("request_id"),
+                func.ts_rank_cd(PricingRequest.search_vector, tsquery).label("rank"),
+                PricingRequest.created_at.label("created_at"),
+            ).where(PricingRequest.search_vector.op("@@")(tsquery))
+        )
+    if kind in (None, "comment"):
+        branches.append(
+            select(
+                literal("comment").label("kind"),
+                Comment.id.label("id"),
+                Comment.request_id.label("request_id"),
+                func.ts_rank_cd(Comment.search_vector, tsquery).label("rank"),
+                Comment.created_at.label("created_at"),
+            ).where(Comment.search_vector.op("@@")(tsquery))
+        )
+
+    hits = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery("hits")
+    # One extra row tells whether there is a next page without counting the rest
+    page_rows = db.execute(
+        select(hits)
+        .order_by(hits.c.rank.desc(), hits.c.created_at.desc(), hits.c.id.desc())
+        .limit(page_size + 1)
+        .offset((page - 1) * page_size)
+    ).all()
+    has_more = len(page_rows) > page_size
+    page_rows = page_rows[:page_size]
+
+    total = None
+    total_capped = False
+    if include_total:
+        capped_hits = select(hits.c.id).limit(TOTAL_COUNT_LIMIT + 1).subquery()
+        total = db.execute(select(func.count()).select_from(capped_hits)).scalar()
+        if total > TOTAL_COUNT_LIMIT:
+            total, total_capped = TOTAL_COUNT_LIMIT, True
+
+    # Headlines are expensive, so they are only computed for the current page
+    request_ids = [row.id for row in page_rows if row.kind == "request"]
+    comment_ids = [row.id for row in page_rows if row.kind == "comment"]
+    details = {}
+
+    if request_ids:
+        document = func.concat_ws(
+            " … ",
+            PricingRequest.project_name,
+            PricingRequest.customer,
+            PricingRequest.problem_to_solve,
+            PricingRequest.pl_comments,
+            PricingRequest.vp_comments,
+        )
+        rows = db.execute(
+            select(
+                PricingRequest.id,
+                PricingRequest.costing_number,
+                PricingRequest.project_name,
+                PricingRequest.customer,
+                PricingRequest.status,
+                func.ts_headline(config, document, tsquery, HEADLINE_OPTIONS).label("highlight"),
+            ).where(PricingRequest.id.in_(request_ids))
+        ).all()
+        for row in rows:
+            details[("request", row.id)] = {
+                "costing_number": row.costing_number,
+                "project_name": row.project_name,
+                "customer": row.customer,
+                "status": row.status,
+                "highlight": row.highlight,
+            }
+
+    if comment_ids:
+        rows = db.execute(
+            select(
+                Comment.id,
+                Comment.author_name,
+                PricingRequest.costing_number,
+                PricingRequest.project_name,
+                PricingRequest.customer,
+                PricingRequest.status,
+                func.ts_headline(config, Comment.content, tsquery, HEADLINE_OPTIONS).label("highlight"),
+            )
+            .join(PricingRequest, PricingRequest.id == Comment.request_id)
+            .where(Comment.id.in_(comment_ids))
+        ).all()
+        for row in rows:
+            details[("comment", row.id)] = {
+                "costing_number": row.costing_number,
+                "project_name": row.project_name,
+                "customer": row.customer,
+                "status": row.status,
+                "author_name": row.author_name,
+                "highlight": row.highlight,
+            }
+
+    results = [
+        {
+            "kind": row.kind,
+            "id": row.id,
+            "request_id": row.request_id,
+            "rank": row.rank,
+            "created_at": row.created_at,
+            **details[(row.kind, row.id)],
+        }
+        for row in page_rows
+        if (row.kind, row.id) in details
+    ]
+
+    return {
+        "query": q,
+        "total": total,
+        "total_capped": total_capped,
+        "page": page,
+        "page_size": page_size,
+        "has_more": has_more,
+        "results": results,
+    }
@@ -1,49 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
-from app.core.deps import get_db
+from app.core.deps import get_db, get_read_db, get_optional_user, resolve_user_email
+from app.core.security import CurrentUser
 from app.models.pricing_request import PricingRequest
 from app.models.enums import RequestStatus
 from app.schemas.vp_decision import VPDecision, VPActionEnum
-from app.emails.mailer import send_vp_decision_to_commercial
+from app.services.outbox import enqueue_email, deliver_outbox_email
 from app.utils.notifications import create_vp_decision_notification
+from app.utils.status_events import add_status_event
+from app.services.request_cache import get_request_detail, invalidate_request
+from app.utils.concurrency import lock_pricing_request, commit_or_conflict, flush_or_conflict
+from app.utils.etag import make_etag, etag_matches, not_modified, set_etag, row_version, list_version
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields of the VP review page, taken from the cached request detail
+VP_DETAIL_FIELDS = (
+    "id",
+    "costing_number",
+    "project_name",
+    "customer",
+    "product_line",
+    "plant",
+    "yearly_sales",
+    "initial_price",
+    "target_price",
+    "problem_to_solve",
+    "attachment_path",
+    "requester_email",
+    "requester_name",
+    "product_line_responsible_email",
+    "product_line_responsible_name",
+    "pl_suggested_price",
+    "pl_comments",
+    "pl_decision_date",
+    "status",
+    "created_at",
+)
+
 router = APIRouter(prefix="/vp-decisions", tags=["VP Decisions"])
 
 
 @router.get("/inbox")
 def get_vp_inbox(
-    vp_email: str = Query(...),
+    http_request: Request,
+    response: Response,
+    vp_email: Optional[str] = Query(None),
     archived: bool = Query(False),
-    db: Session = Depends(get_db)
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get pricing requests for a VP.
     If archived=false: Get escalated requests (ESCALATED_TO_VP status)
     If archived=true: Get completed requests (APPROVED_BY_VP or REJECTED_BY_VP status)
+    Supports conditional GET via ETag / If-None-Match.
     """
+    vp_email = resolve_user_email(user, vp_email)
+
     if not archived:
         # Escalated/pending requests - those awaiting VP decision
-        requests = db.query(PricingRequest).filter(
+        filters = [
             PricingRequest.vp_email == vp_email,
             PricingRequest.status == RequestStatus.ESCALATED_TO_VP.value
-        ).order_by(PricingRequest.created_at.desc()).all()
+        ]
     else:
         # Archived/completed requests - those VP has already decided on
-        requests = db.query(PricingRequest).filter(
+        filters = [
             PricingRequest.vp_email == vp_email,
             PricingRequest.status.in_([
                 RequestStatus.APPROVED_BY_VP.value,
                 RequestStatus.REJECTED_BY_VP.value,
                 RequestStatus.CLOSED.value
             ])
-        ).order_by(PricingRequest.created_at.desc()).all()
-    
+        ]
+
+    count, last_updated = list_version(db, PricingRequest, *filters)
+    etag = make_etag("vp-inbox", vp_email, archived, count, last_updated)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
+    requests = db.query(PricingRequest).filter(
+        *filters
+    ).order_by(PricingRequest.created_at.desc()).all()
+
+    set_etag(response, etag)
     return [
         {
             "id": r.id,
@@ -71,15 +116,17 @@ def get_vp_inbox(
 def vp_decide(
     request_id: int,
     decision: VPDecision,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     """
     VP makes a final decision on an escalated pricing request
     Options: APPROVE, REJECT
+    A concurrent decision on the same request fails fast with 409.
+    The notification and the outbox email are written in the decision's
+    transaction; the email is sent after the commit.
     """
-    request = db.query(PricingRequest).filter(
-        PricingRequest.id == request_id
-    ).first()
+    request = lock_pricing_request(db, request_id)
 
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -104,39 +151,43 @@ def vp_decide(
         request.vp_suggested_price = decision.suggested_price
         request.vp_comments = decision.comments
         request.vp_decision_date = datetime.utcnow()
-
-        db.commit()
+        add_status_event(
+            db,
+            request,
+            from_status=RequestStatus.ESCALATED_TO_VP.value,
+            actor_email=request.vp_email,
+            actor_name=request.vp_name,
+            comments=decision.comments,
+        )
+        invalidate_request(db, request.id)
+
+        final_price = float(request.final_approved_price) if request.final_approved_price else None
+        create_vp_decision_notification(
+            db=db,
+            recipient_email=request.requester_email,
+            recipient_role="COMMERCIAL",
+            request_id=request.id,
+            vp_name=request.vp_name or request.vp_email,
+            vp_email=request.vp_email,
+            action=action.value,
+            final_price=final_price,
+            commit=False,
+        )
+        email = enqueue_email(db, "vp_decision", request.requester_email, dict(
+            project_name=request.project_name,
+            decision=request.status,
+            comments=request.vp_comments,
+            final_price=final_price,
+            costing_number=request.costing_number,
+        ), request_id=request.id)
+
+        flush_or_conflict(db)
+        email_id = email.id
+        commit_or_conflict(db)
         db.refresh(request)
 
-        # Send decision notification to commercial
-        try:
-            send_vp_decision_to_commercial(
-                to_email=request.requester_email,
-                project_name=request.project_name,
-                decision=request.status,
-                comments=request.vp_comments,
-                final_price=request.final_approved_price,
-                costing_number=request.costing_number,
-            )
-        except Exception as email_error:
-            logger.warning(f"Email notification failed (non-critical): {str(email_error)}")
-            # Continue even if email fails - decision is already saved
-
-        # Create in-app notification
-        try:
-            create_vp_decision_notification(
-                db=db,
-                recipient_email=request.requester_email,
-                recipient_role="COMMERCIAL",
-                request_id=request.id,
-                vp_name=request.vp_name or request.vp_email,
-                vp_email=request.vp_email,
-                action=action.value,
-                final_price=request.final_approved_price,
-            )
-        except Exception as notification_error:
-            logger.warning(f"In-app notification failed (non-critical): {str(notification_error)}")
-            # Continue even if notification fails
+        # Sent right after the response; the scheduler retries failures
+        background_tasks.add_task(deliver_outbox_email, email_id)
 
         return {
             "message": f"VP decision processed: {action.value}",
@@ -145,6 +196,8 @@ def vp_decide(
             "final_price": float(request.final_approved_price) if request.final_approved_price else None,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing VP decision: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing VP decision: {str(e)}")
@@ -153,37 +206,25 @@ def vp_decide(
 @router.get("/{request_id}")
 def get_vp_request_detail(
     request_id: int,
+    http_request: Request,
+    response: Response,
     db: Session = Depends(get_db),
 ):
     """
-    Get full details of an escalated pricing request for VP review
+    Get full details of an escalated pricing request for VP review.
+    Supports conditional GET via ETag / If-None-Match.
     """
-    request = db.query(PricingRequest).filter(
-        PricingRequest.id == request_id
-    ).first()
+    version = row_version(db, PricingRequest, request_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Request not found")
 
-    if not request:
+    etag = make_etag("vp-request", request_id, version.updated_at)
+    if etag_matches(http_request, etag):
+        return not_modified(etag)
+
+    detail = get_request_detail(db, request_id, version.updated_at)
+    if not detail:
         raise HTTPException(status_code=404, detail="Request not found")
 
-    return {
-        "id": request.id,
-        "costing_number": request.costing_number,
-        "project_name": request.project_name,
-        "customer": request.customer,
-        "product_line": request.product_line,
-        "plant": request.plant,
-        "yearly_sales": float(request.yearly_sales),
-        "initial_price": float(request.initial_price),
-        "target_price": float(request.target_price),
-        "problem_to_solve": request.problem_to_solve,
-        "attachment_path": request.attachment_path,
-        "requester_email": request.requester_email,
-        "requester_name": request.requester_name,
-        "product_line_responsible_email": request.product_line_responsible_email,
-        "product_line_responsible_name": request.product_line_responsible_name,
-        "pl_suggested_price": float(request.pl_suggested_price) if request.pl_suggested_price else None,
-        "pl_comments": request.pl_comments,
-        "pl_decision_date": request.pl_decision_date,
-        "status": request.status,
-        "created_at": request.created_at,
-    }
+    set_etag(response, etag)
+    return {field: detail[field] for field in VP_DETAIL_FIELDS}
@@ -0,0 +1,37 @@
+"""
+Schemas for SLA / turnaround analytics
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class StageDuration(BaseModel):
+    product_line: str
+    stage: str  # status the request waited in
+    completed: int  # requests that left the stage
+    open: int  # requests still in it
+    avg_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+
+
+class StageDurationsResponse(BaseModel):
+    since: datetime
+    until: datetime
+    stages: list[StageDuration]
+
+
+class Turnaround(BaseModel):
+    product_line: str
+    submitted: int
+    decided: int
+    avg_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+
+
+class TurnaroundResponse(BaseModel):
+    since: datetime
+    until: datetime
+    product_lines: list[Turnaround]
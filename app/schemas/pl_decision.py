@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator, Field
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 
@@ -22,3 +22,13 @@ class PLDecision(BaseModel):
             if not v or not v.strip():
                 raise ValueError("Comments are mandatory for rejection or escalation")
         return v
+
+
+class PLBulkDecisionItem(PLDecision):
+    """One decision in a bulk PL decision call"""
+    request_id: int
+
+
+class PLBulkDecisionRequest(BaseModel):
+    """Schema for bulk PL decisions"""
+    decisions: List[PLBulkDecisionItem] = Field(..., min_length=1, max_length=200)
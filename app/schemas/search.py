@@ -0,0 +1,30 @@
+"""
+Schemas for full-text search responses
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class SearchHit(BaseModel):
+    kind: str  # request, comment
+    id: int
+    request_id: int
+    rank: float
+    costing_number: str
+    project_name: str
+    customer: str
+    status: str
+    author_name: Optional[str] = None
+    highlight: str
+    created_at: datetime
+
+
+class SearchResponse(BaseModel):
+    query: str
+    total: Optional[int] = None  # only when include_total is set
+    total_capped: bool = False  # total stopped at the count limit
+    page: int
+    page_size: int
+    has_more: bool
+    results: list[SearchHit]
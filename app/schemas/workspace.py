@@ -0,0 +1,26 @@
+"""
+Schema for the request workspace (everything the request page needs in one call)
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+from app.schemas.pricing_request import PricingRequestDetailResponse
+from app.schemas.comment import CommentResponse
+from app.schemas.notification import NotificationResponse
+
+
+class TimelineEvent(BaseModel):
+    status: str
+    from_status: Optional[str] = None
+    at: datetime
+    actor_email: Optional[str] = None
+    actor_name: Optional[str] = None
+    comments: Optional[str] = None
+
+
+class RequestWorkspaceResponse(BaseModel):
+    request: PricingRequestDetailResponse
+    comments: list[CommentResponse]
+    archived_comments: list[CommentResponse]
+    timeline: list[TimelineEvent]
+    unread_notifications: list[NotificationResponse]
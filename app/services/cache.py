@@ -0,0 +1,374 @@
+"""
+Shared cache for data that is expensive to load and cheap to serve stale
+for a while (dropdowns, user lists).
+
+Two backends share the same interface:
+- MemoryCache: per-process, bounded LRU, used by default
+- RedisCache: any Redis-protocol server, shared by all workers
+  (CACHE_BACKEND=redis, CACHE_URL). CACHE_BACKEND=fakeredis runs the same
+  code against an embedded fakeredis server, and
+  `python -m app.services.cache --port 6390` starts a local fake server to
+  point CACHE_URL at (fakeredis is in requirements-dev.txt).
+
+Values must be JSON-serializable; every read returns a fresh copy. Entries
+can carry tags, and invalidate_tag drops every entry carrying the tag. A value
+loaded while one of its tags was invalidated is returned but not stored.
+get_or_set loads a missing value once: concurrent callers in the worker wait
+for the loading thread, and with Redis a short lock key makes the other
+workers wait too.
+"""
+import abc
+import json
+import threading
+import time
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _namespace(key: str) -> str:
+    """Metrics label for a key: the part before the first colon"""
+    return key.split(":", 1)[0]
+
+
+class _Cache(abc.ABC):
+    """get_or_set with single-flight on top of the backend's get/set"""
+
+    backend = "base"
+
+    def __init__(self):
+        self._loading = {}
+        self._loading_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def get(self, key: str, default=None):
+        """Stored value of key, or default when missing, expired or invalidated"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        """Store a JSON-serializable value for ttl seconds"""
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        """Drop one key"""
+
+    @abc.abstractmethod
+    def invalidate_tag(self, tag: str):
+        """Drop every entry stored with tag"""
+
+    @abc.abstractmethod
+    def sweep(self) -> int:
+        """Remove expired entries the backend does not expire itself; returns the number removed"""
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: float, tags: Iterable[str] = ()):
+        """Cached value of key, calling loader (once across concurrent callers) on a miss"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            metrics.increment("cache", backend=self.backend, namespace=_namespace(key), result="hit")
+            return value
+
+        with self._loading_lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                # Another thread may have loaded it while we waited
+                value = self.get(key, _MISSING)
+                if value is not _MISSING:
+                    metrics.increment("cache", backend=self.backend, namespace=_namespace(key), result="hit")
+                    return value
+                metrics.increment("cache", backend=self.backend, namespace=_namespace(key), result="miss")
+                return self._load(key, loader, ttl, tags)
+            finally:
+                with self._loading_lock:
+                    self._loading.pop(key, None)
+
+    def _load(self, key: str, loader: Callable[[], Any], ttl: float, tags: Iterable[str]):
+        value = loader()
+        self.set(key, value, ttl, tags)
+        return value
+
+
+class MemoryCache(_Cache):
+    """
+    Per-process cache: key -> (serialized value, expires at, tags). At most
+    max_entries are kept; the least recently used entry is dropped first.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        # Bumped by invalidate_tag, so a load that overlapped an invalidation is not stored
+        self._tag_generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            payload, expires_at, tags = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        payload = json.dumps(value)
+        tags = frozenset(tags)
+        with self._lock:
+            self._store(key, payload, ttl, tags)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock:
+            self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+        return len(expired)
+
+    def _load(self, key: str, loader: Callable[[], Any], ttl: float, tags: Iterable[str]):
+        tags = frozenset(tags)
+        with self._lock:
+            generations = {tag: self._tag_generations.get(tag, 0) for tag in tags}
+        value = loader()
+        payload = json.dumps(value)
+        with self._lock:
+            if all(self._tag_generations.get(tag, 0) == generation for tag, generation in generations.items()):
+                self._store(key, payload, ttl, tags)
+        return value
+
+    def _store(self, key: str, payload: str, ttl: float, tags: frozenset):
+        """Insert an entry, evicting the least recently used ones (caller holds the lock)"""
+        self._remove(key)
+        self._entries[key] = (payload, time.monotonic() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        """Drop an entry and its tag references (caller holds the lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache(_Cache):
+    """
+    Cache on a Redis-protocol server. Each tag has a version counter; an
+    entry records the versions of its tags when stored and is treated as
+    missing once any of them has moved on, so invalidating a tag is a single
+    INCR however many entries carry it.
+
+    Server errors are logged and treated as misses: the cache never fails a
+    request that could be served from the source.
+    """
+
+    backend = "redis"
+
+    # Delete the lock key only while it still holds our token: once it has
+    # expired and another worker took it, the lock is theirs
+    RELEASE_LOCK = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client, prefix: str = "cache:", lock_timeout: float = 10.0):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self._release_lock = client.register_script(self.RELEASE_LOCK)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+            if raw is None:
+                return default
+            entry = json.loads(raw)
+            tags = entry["t"]
+            if tags:
+                current = self.client.mget([self._tag_key(tag) for tag in tags])
+                if any(int(version or 0) != tags[tag] for tag, version in zip(tags, current)):
+                    return default
+            return entry["v"]
+        except Exception as e:
+            self._error("get", e)
+            return default
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        try:
+            self._store(key, value, ttl, self._tag_versions(tags))
+        except Exception as e:
+            self._error("set", e)
+
+    def _tag_versions(self, tags: Iterable[str]) -> dict:
+        tags = sorted(set(tags))
+        versions = self.client.mget([self._tag_key(tag) for tag in tags]) if tags else []
+        return {tag: int(version or 0) for tag, version in zip(tags, versions)}
+
+    def _store(self, key: str, value: Any, ttl: float, versions: dict):
+        entry = {"v": value, "t": versions}
+        self.client.set(self._key(key), json.dumps(entry), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._error("delete", e)
+
+    def invalidate_tag(self, tag: str) -> Optional[int]:
+        """Returns the tag's new version"""
+        try:
+            return self.client.incr(self._tag_key(tag))
+        except Exception as e:
+            self._error("invalidate", e)
+            return None
+
+    def sweep(self) -> int:
+        # Entries expire on the server
+        return 0
+
+    def _load(self, key: str, loader: Callable[[], Any], ttl: float, tags: Iterable[str]):
+        """Load under a lock key so only one worker hits the source; the others wait for its value"""
+        lock_key = self._key(f"lock:{key}")
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            self._error("lock", e)
+            acquired = True
+
+        if not acquired:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+                try:
+                    if not self.client.exists(lock_key):
+                        break
+                except Exception as e:
+                    self._error("lock", e)
+                    break
+            metrics.increment("cache_lock_waits_expired", backend=self.backend, namespace=_namespace(key))
+
+        try:
+            # Versions from before the load: a tag invalidated while the loader
+            # runs leaves the stored value stale instead of stamping it fresh
+            try:
+                versions = self._tag_versions(tags)
+            except Exception as e:
+                self._error("set", e)
+                return loader()
+            value = loader()
+            try:
+                self._store(key, value, ttl, versions)
+            except Exception as e:
+                self._error("set", e)
+            return value
+        finally:
+            if acquired:
+                try:
+                    self._release_lock(keys=[lock_key], args=[token])
+                except Exception as e:
+                    self._error("unlock", e)
+
+    def _error(self, operation: str, error: Exception):
+        metrics.increment("cache_errors", backend=self.backend, operation=operation)
+        logger.warning(f"Cache {operation} failed: {type(error).__name__} - {error}")
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the configured cache (created on first use)"""
+    global _cache
+    if _cache is None:
+        backend = settings.CACHE_BACKEND.lower()
+        if backend == "redis":
+            import redis
+
+            client = redis.Redis.from_url(
+                settings.CACHE_URL, socket_timeout=settings.CACHE_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=settings.CACHE_SOCKET_TIMEOUT_SECONDS,
+            )
+            _cache = RedisCache(client, settings.CACHE_KEY_PREFIX, settings.CACHE_LOCK_TIMEOUT_SECONDS)
+        elif backend == "fakeredis":
+            import fakeredis
+
+            _cache = RedisCache(fakeredis.FakeRedis(), settings.CACHE_KEY_PREFIX, settings.CACHE_LOCK_TIMEOUT_SECONDS)
+        else:
+            _cache = MemoryCache(max_entries=settings.CACHE_MAX_ENTRIES)
+        logger.info(f"Using {type(_cache).__name__} ({backend}) for the shared cache")
+    return _cache
+
+
+def sweep_cache():
+    """Scheduler job: drop expired in-process entries"""
+    removed = get_cache().sweep()
+    if removed:
+        logger.info(f"Swept {removed} expired cache entries")
+    return removed
+
+
+def main():
+    """Run a local Redis-protocol stand-in (fakeredis) for CACHE_URL"""
+    import argparse
+    from fakeredis import TcpFakeServer
+
+    parser = argparse.ArgumentParser(description="Local fake Redis server for CACHE_BACKEND=redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = TcpFakeServer((args.host, args.port))
+    print(f"Fake Redis listening on redis://{args.host}:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Idempotency keys for non-idempotent POST endpoints.
+
+The response of the first successful request is stored by the same
+statement as the write it describes, so a retry with the same key gets
+the original result back without redoing the insert, the notification or
+the email. Reusing a key with a different payload is rejected with 422.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import DateTime, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def validate_idempotency_key(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters",
+        )
+    return key
+
+
+def request_fingerprint(payload) -> str:
+    """Stable hash of a request body (a pydantic model)"""
+    body = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def get_stored_response(db: Session, scope: str, key: str, fingerprint: str) -> Optional[JSONResponse]:
+    """
+    Return the stored response for this key, or None when the key is new
+    (or expired). Raises 422 when the key was used with another payload.
+    """
+    stored = db.get(IdempotencyKey, (scope, key))
+    if stored is None or stored.expires_at <= datetime.now(timezone.utc):
+        return None
+
+    if stored.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{IDEMPOTENCY_HEADER} was already used with a different request body",
+        )
+
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.response_body,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def store_response_from(source, scope: str, key: str, fingerprint: str, body, status_code: int = 200):
+    """
+    INSERT ... SELECT that stores `body` (a JSONB expression over `source`)
+    for the key, one row per row of `source`. Meant to run as a CTE of the
+    write it describes; an expired row left for the same key is replaced.
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    statement = insert(IdempotencyKey).from_select(
+        ["scope", "key", "request_hash", "status_code", "response_body", "expires_at"],
+        select(
+            literal(scope),
+            literal(key),
+            literal(fingerprint),
+            literal(status_code),
+            body,
+            literal(expires_at, DateTime(timezone=True)),
+        ).select_from(source),
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+        set_={
+            "request_hash": statement.excluded.request_hash,
+            "status_code": statement.excluded.status_code,
+            "response_body": statement.excluded.response_body,
+            "expires_at": statement.excluded.expires_at,
+        },
+        where=IdempotencyKey.expires_at <= func.now(),
+    )
+
+
+def sweep_idempotency_keys() -> int:
+    """Scheduler job: delete expired idempotency keys"""
+    from app.core.database import engine
+
+    with engine.begin() as conn:
+        result = conn.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+        )
+    if result.rowcount:
+        logger.info(f"Swept {result.rowcount} expired idempotency keys")
+    return result.rowcount
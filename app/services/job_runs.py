@@ -0,0 +1,135 @@
+"""
+Scheduler job runs.
+
+Every run goes through run_job, which
+- takes a Postgres advisory lock per job, so with several workers sharing
+  the job store a job never runs twice at the same time
+- records the run in job_runs: start, end, status, rows processed, emails
+  sent, the job's return value and the error, if any
+
+A worker that dies mid-run leaves its row "running"; abandon_stale_runs marks
+runs older than JOB_RUN_MAX_SECONDS as abandoned (at startup and whenever the
+history is read).
+"""
+import json
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import delete, text, update
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.job_run import JobRun
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock namespace for job runs (the schema upgrade lock is 7263401)
+JOB_LOCK_KEY = 7263402
+
+
+def _summarize(result) -> tuple[Optional[int], Optional[int]]:
+    """(rows_processed, emails_sent) from a job's return value (a count or a stats dict)"""
+    if isinstance(result, bool) or result is None:
+        return None, None
+    if isinstance(result, int):
+        return result, None
+    if isinstance(result, dict):
+        emails_sent = result.get("sent")
+        rows = result.get("due", result.get("deleted_rows"))
+        if rows is None and "sent" in result:
+            rows = result["sent"] + result.get("failed", 0)
+        return rows, emails_sent
+    return None, None
+
+
+def _finish(db, run: JobRun, status: str, result=None, error: str = None):
+    run.status = status
+    run.finished_at = datetime.now(timezone.utc)
+    run.rows_processed, run.emails_sent = _summarize(result)
+    run.details = json.loads(json.dumps(result, default=str)) if result is not None else None
+    run.error = error
+    db.commit()
+
+
+def run_job(job_id: str, func: Callable, trigger: str = "schedule") -> Optional[int]:
+    """Run a job under its lock and record it; returns the job_runs id (None when skipped)"""
+    from app.core.database import engine, SessionLocal
+
+    db = SessionLocal()
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:namespace, hashtext(:job_id))"),
+            {"namespace": JOB_LOCK_KEY, "job_id": job_id},
+        ).scalar()
+        lock_conn.commit()
+        try:
+            if not locked:
+                metrics.increment("job_runs", job=job_id, status="skipped")
+                logger.info(f"Job {job_id} is already running elsewhere, skipping")
+                # Scheduled runs of other workers are expected; only record skipped manual runs
+                if trigger != "manual":
+                    return None
+                run = JobRun(job_id=job_id, trigger=trigger, status="running")
+                db.add(run)
+                db.flush()
+                _finish(db, run, "skipped", error="Job is already running")
+                return run.id
+
+            run = JobRun(job_id=job_id, trigger=trigger, status="running")
+            db.add(run)
+            db.commit()
+
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Job {job_id} failed")
+                _finish(db, run, "failed", error=f"{type(e).__name__}: {e}")
+            else:
+                _finish(db, run, "success", result)
+            metrics.observe("job_run_seconds", time.perf_counter() - started, job=job_id)
+            metrics.increment("job_runs", job=job_id, status=run.status)
+            return run.id
+        finally:
+            db.close()
+            if locked:
+                lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:namespace, hashtext(:job_id))"),
+                    {"namespace": JOB_LOCK_KEY, "job_id": job_id},
+                )
+                lock_conn.commit()
+
+
+def abandon_stale_runs() -> int:
+    """Mark runs left "running" past JOB_RUN_MAX_SECONDS as abandoned; returns how many"""
+    from app.core.database import engine
+
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=settings.JOB_RUN_MAX_SECONDS)
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(JobRun)
+            .where(JobRun.status == "running", JobRun.started_at < cutoff)
+            .values(
+                status="abandoned",
+                finished_at=now,
+                error=f"No result after {settings.JOB_RUN_MAX_SECONDS}s; the worker running it stopped",
+            )
+        )
+    if result.rowcount:
+        metrics.increment("job_runs_abandoned", result.rowcount)
+        logger.warning(f"Marked {result.rowcount} stale job runs as abandoned")
+    return result.rowcount
+
+
+def sweep_job_runs() -> int:
+    """Scheduler job: delete run history older than JOB_RUN_RETENTION_DAYS"""
+    from app.core.database import engine
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.JOB_RUN_RETENTION_DAYS)
+    with engine.begin() as conn:
+        result = conn.execute(delete(JobRun).where(JobRun.started_at < cutoff))
+    if result.rowcount:
+        logger.info(f"Swept {result.rowcount} old job runs")
+    return result.rowcount
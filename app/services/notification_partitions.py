@@ -0,0 +1,211 @@
+"""
+Monthly partitions and retention for the notifications table.
+
+notifications is range-partitioned on created_at with one partition per
+month (notifications_pYYYYMM). Partitions are created ahead of time, at
+every startup and daily. The DEFAULT partition (notifications_default)
+catches rows no monthly partition covers, so inserts keep working if the
+daily job stops for longer than the months created ahead; when the
+missing month is created later, its rows are moved out of the default.
+Once a month is older than the retention window its read notifications are
+removed, and the whole partition is dropped (or detached for archiving)
+when nothing unread is left.
+"""
+import re
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.core.config import settings
+from app.models.notification import Notification
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^notifications_p(\d{4})(\d{2})$")
+DEFAULT_PARTITION = "notifications_default"
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"notifications_p{month.year:04d}{month.month:02d}"
+
+
+def _is_partitioned(conn) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('notifications')")
+    ).scalar()
+    return relkind == "p"
+
+
+def _list_partitions(conn) -> dict:
+    """Monthly partitions as {month start: partition name}"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'notifications'::regclass"
+    )).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+def ensure_notification_partitions(conn, start: datetime = None, months_ahead: int = None):
+    """
+    Create monthly partitions from `start` (default: current month)
+    up to `months_ahead` months in the future.
+    """
+    if months_ahead is None:
+        months_ahead = settings.NOTIFICATION_PARTITIONS_AHEAD
+    now = datetime.now(timezone.utc)
+    month = _month_start(start or now)
+    last = _add_months(_month_start(now), months_ahead)
+
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF notifications DEFAULT"))
+
+    existing = _list_partitions(conn)
+    created = 0
+    while month <= last:
+        if month not in existing:
+            _create_partition(conn, month)
+            created += 1
+        month = _add_months(month, 1)
+
+    if created:
+        logger.info(f"Created {created} notification partitions")
+    return created
+
+
+def _create_partition(conn, month: datetime):
+    """
+    Create the partition of one month. Rows of that month that landed in
+    the default partition are moved into it first; Postgres refuses to
+    create a partition whose rows are still in the default.
+    """
+    name = _partition_name(month)
+    bounds = f"FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    in_range = f"created_at >= '{month.isoformat()}' AND created_at < '{_add_months(month, 1).isoformat()}'"
+
+    stray = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")).scalar()
+    if not stray:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF notifications FOR VALUES {bounds}"))
+        return
+
+    columns = ", ".join(column.name for column in Notification.__table__.columns)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE notifications INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING {columns}) "
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE notifications ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.warning(f"Moved {moved} notifications from {DEFAULT_PARTITION} into {name}")
+
+
+def partition_existing_notifications(conn):
+    """
+    One-off migration of a plain notifications table into the partitioned
+    layout. Runs before create_all; does nothing once the table is partitioned.
+    """
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('notifications')")
+    ).scalar()
+    if relkind != "r":
+        return
+
+    logger.info("Migrating notifications to a partitioned table...")
+    conn.execute(text("ALTER TABLE notifications RENAME TO notifications_unpartitioned"))
+    # Free index names so the partitioned table can reuse them
+    index_names = conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'notifications_unpartitioned'"
+    )).scalars().all()
+    for index_name in index_names:
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_unpartitioned"'))
+
+    conn.execute(text(
+        "UPDATE notifications_unpartitioned SET created_at = now() WHERE created_at IS NULL"
+    ))
+    Notification.__table__.create(bind=conn, checkfirst=True)
+
+    oldest = conn.execute(text("SELECT min(created_at) FROM notifications_unpartitioned")).scalar()
+    ensure_notification_partitions(conn, start=oldest)
+
+    columns = ", ".join(column.name for column in Notification.__table__.columns)
+    moved = conn.execute(text(
+        f"INSERT INTO notifications ({columns}) SELECT {columns} FROM notifications_unpartitioned"
+    )).rowcount
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('notifications', 'id'), "
+        "COALESCE((SELECT max(id) FROM notifications), 0) + 1, false)"
+    ))
+    conn.execute(text("DROP TABLE notifications_unpartitioned"))
+    logger.info(f"Moved {moved} notifications into monthly partitions")
+
+
+def apply_notification_retention(conn, months: int = None, mode: str = None) -> dict:
+    """
+    Remove read notifications in partitions older than `months` months.
+    A partition with no unread rows left is dropped, or detached and kept
+    as a standalone table when mode is "archive".
+    """
+    if months is None:
+        months = settings.NOTIFICATION_RETENTION_MONTHS
+    if mode is None:
+        mode = settings.NOTIFICATION_RETENTION_MODE
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc)), -months)
+
+    stats = {"deleted_rows": 0, "dropped": [], "archived": []}
+    for month, name in sorted(_list_partitions(conn).items()):
+        if _add_months(month, 1) > cutoff:
+            continue
+
+        has_unread = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name} WHERE NOT is_read)")).scalar()
+        if has_unread:
+            stats["deleted_rows"] += conn.execute(text(f"DELETE FROM {name} WHERE is_read")).rowcount
+        elif mode == "archive":
+            conn.execute(text(f"ALTER TABLE notifications DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {name.replace('notifications_p', 'notifications_archive_')}"))
+            stats["archived"].append(name)
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+            stats["dropped"].append(name)
+
+    logger.info(f"Notification retention ({months} months, {mode}): {stats}")
+    return stats
+
+
+def _lock(conn):
+    """Serialize partition DDL with schema upgrades and other workers (until commit)"""
+    from app.core.schema import SCHEMA_LOCK_KEY
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def ensure_upcoming_partitions():
+    """Startup: create the default and upcoming partitions, even when the schema is current"""
+    from app.core.database import engine
+
+    with engine.begin() as conn:
+        if not _is_partitioned(conn):
+            return 0
+        _lock(conn)
+        return ensure_notification_partitions(conn)
+
+
+def maintain_notification_partitions():
+    """Scheduler job: create upcoming partitions and apply retention"""
+    from app.core.database import engine
+
+    with engine.begin() as conn:
+        if not _is_partitioned(conn):
+            return None
+        _lock(conn)
+        ensure_notification_partitions(conn)
+        return apply_notification_retention(conn)
@@ -0,0 +1,121 @@
+"""
+Email outbox delivery.
+
+Emails are queued as email_outbox rows inside the transaction that makes the
+change, so an email is never sent for a rolled-back change and never lost
+for a committed one. Each row is rendered and sent after commit:
+- right away by a background task (deliver_outbox_email)
+- otherwise by the scheduler, which retries pending rows
+  (deliver_pending_emails) up to OUTBOX_MAX_ATTEMPTS times
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.emails.mailer import EMAIL_RENDERERS, send_email
+from app.models.email_outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(
+    db: Session,
+    template: str,
+    to_email: str,
+    params: dict,
+    cc_emails: list = None,
+    request_id: int = None,
+) -> EmailOutbox:
+    """Add an outbox row to the session; it is committed by the caller"""
+    if template not in EMAIL_RENDERERS:
+        raise ValueError(f"Unknown email template: {template}")
+
+    email = EmailOutbox(
+        template=template,
+        params=params,
+        to_email=to_email,
+        cc_emails=cc_emails,
+        request_id=request_id,
+    )
+    db.add(email)
+    return email
+
+
+def _claim(db: Session, outbox_id: Optional[int] = None, after_id: int = 0) -> Optional[EmailOutbox]:
+    """
+    Lock one pending row (FOR UPDATE SKIP LOCKED), so a row is never sent by
+    the background task and the scheduler at the same time.
+    """
+    query = db.query(EmailOutbox).filter(
+        EmailOutbox.status == "pending",
+        EmailOutbox.attempts < settings.OUTBOX_MAX_ATTEMPTS,
+        EmailOutbox.id > after_id,
+    )
+    if outbox_id is not None:
+        query = query.filter(EmailOutbox.id == outbox_id)
+    return query.order_by(EmailOutbox.id).with_for_update(skip_locked=True).first()
+
+
+def _deliver(db: Session, email: EmailOutbox) -> bool:
+    """Render and send a claimed row, then record the outcome"""
+    email.attempts += 1
+    try:
+        subject, html_body = EMAIL_RENDERERS[email.template](**email.params)
+        sent = send_email(email.to_email, subject, html_body, email.cc_emails)
+        error = None if sent else "SMTP send failed"
+    except Exception as e:
+        sent = False
+        error = f"{type(e).__name__}: {e}"
+
+    if sent:
+        email.status = "sent"
+        email.sent_at = datetime.now(timezone.utc)
+        email.last_error = None
+    else:
+        email.last_error = error
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            email.status = "failed"
+            logger.error(f"Giving up on outbox email {email.id} to {email.to_email}: {error}")
+    db.commit()
+    return sent
+
+
+def deliver_outbox_email(outbox_id: int) -> bool:
+    """Background task: send one queued email right after its transaction committed"""
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        email = _claim(db, outbox_id)
+        if email is None:
+            # Already sent, or being sent by the scheduler
+            db.rollback()
+            return False
+        return _deliver(db, email)
+    finally:
+        db.close()
+
+
+def deliver_pending_emails(limit: int = 100) -> dict:
+    """Scheduler job: send (or retry) pending outbox emails"""
+    from app.core.database import SessionLocal
+
+    stats = {"sent": 0, "failed": 0}
+    last_id = 0
+    db = SessionLocal()
+    try:
+        # Walk forward by id so a failing row is retried once per run, not in a loop
+        for _ in range(limit):
+            email = _claim(db, after_id=last_id)
+            if email is None:
+                db.rollback()
+                break
+            last_id = email.id
+            stats["sent" if _deliver(db, email) else "failed"] += 1
+    finally:
+        db.close()
+
+    if stats["sent"] or stats["failed"]:
+        logger.info(f"Outbox delivery: {stats}")
+    return stats
@@ -0,0 +1,167 @@
+"""
+Token bucket rate limiting.
+
+Two backends share the same interface:
+- InMemoryRateLimiter: per-process, bounded, used by default and in tests
+- PostgresRateLimiter: UNLOGGED table shared by all workers, one atomic
+  upsert per bucket
+
+acquire_all takes one token from each of several buckets, or from none of
+them when any bucket is empty, so a request rejected by one limit does not
+spend the others.
+"""
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.models.rate_limit_bucket import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryRateLimiter:
+    """
+    Per-process token buckets. At most max_keys buckets are kept; the least
+    recently used bucket is dropped first (which only ever makes a key less
+    restricted, never more).
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: float, refill_per_second: float) -> tuple[bool, float]:
+        """
+        Take one token from the bucket.
+        Returns (allowed, retry_after_seconds).
+        """
+        allowed, retry_after, _ = self.acquire_all([(key, capacity, refill_per_second)])
+        return allowed, retry_after
+
+    def acquire_all(self, buckets: list[tuple[str, float, float]]) -> tuple[bool, float, Optional[int]]:
+        """
+        Take one token from every (key, capacity, refill_per_second) bucket,
+        or none when one of them is empty.
+        Returns (allowed, retry_after_seconds, index of the first empty bucket).
+        """
+        now = time.monotonic()
+        with self._lock:
+            refilled = []
+            for key, capacity, refill_per_second in buckets:
+                tokens, last = self._buckets.get(key, (capacity, now))
+                refilled.append(min(capacity, tokens + (now - last) * refill_per_second))
+
+            rejected = next((index for index, tokens in enumerate(refilled) if tokens < 1), None)
+            for (key, _, _), tokens in zip(buckets, refilled):
+                self._buckets.pop(key, None)
+                self._buckets[key] = (tokens if rejected is not None else tokens - 1, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        if rejected is None:
+            return True, 0.0, None
+        return False, (1 - refilled[rejected]) / buckets[rejected][2], rejected
+
+    def sweep(self, max_idle_seconds: float = 86400) -> int:
+        cutoff = time.monotonic() - max_idle_seconds
+        removed = 0
+        with self._lock:
+            while self._buckets:
+                key, (_, last) = next(iter(self._buckets.items()))
+                if last > cutoff:
+                    break
+                del self._buckets[key]
+                removed += 1
+        return removed
+
+
+class PostgresRateLimiter:
+    """
+    Token buckets shared between workers. Refill and consume happen in a
+    single INSERT ... ON CONFLICT DO UPDATE ... WHERE, so concurrent calls
+    never over-spend a bucket. acquire_all spends its buckets in one
+    transaction (in key order, so concurrent calls cannot deadlock) and
+    rolls back when one of them is empty.
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+
+    def acquire(self, key: str, capacity: float, refill_per_second: float) -> tuple[bool, float]:
+        allowed, retry_after, _ = self.acquire_all([(key, capacity, refill_per_second)])
+        return allowed, retry_after
+
+    def acquire_all(self, buckets: list[tuple[str, float, float]]) -> tuple[bool, float, Optional[int]]:
+        with self.bind.connect() as conn:
+            transaction = conn.begin()
+            for index in sorted(range(len(buckets)), key=lambda i: buckets[i][0]):
+                key, capacity, refill_per_second = buckets[index]
+                elapsed = func.extract("epoch", func.now() - RateLimitBucket.updated_at)
+                refilled = func.least(capacity, RateLimitBucket.tokens + elapsed * refill_per_second)
+
+                statement = insert(RateLimitBucket).values(
+                    key=key,
+                    tokens=capacity - 1,
+                    updated_at=func.now(),
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=[RateLimitBucket.key],
+                    set_={"tokens": refilled - 1, "updated_at": func.now()},
+                    where=refilled >= 1,
+                ).returning(RateLimitBucket.tokens)
+
+                if conn.execute(statement).first() is not None:
+                    continue
+
+                # Rejected: compute when a token is back, and give back what was taken
+                tokens = conn.execute(
+                    select(refilled).where(RateLimitBucket.key == key)
+                ).scalar() or 0.0
+                transaction.rollback()
+                return False, (1 - tokens) / refill_per_second, index
+
+            transaction.commit()
+        return True, 0.0, None
+
+    def sweep(self, max_idle_seconds: float = 86400) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_idle_seconds)
+        with self.bind.begin() as conn:
+            result = conn.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < cutoff))
+        return result.rowcount
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    """Return the configured rate limiter (created on first use)"""
+    global _limiter
+    if _limiter is None:
+        backend = settings.RATE_LIMIT_BACKEND.lower()
+        if backend == "postgres":
+            from app.core.database import engine
+            _limiter = PostgresRateLimiter(engine)
+        else:
+            _limiter = InMemoryRateLimiter()
+        logger.info(f"Using {type(_limiter).__name__} for rate limiting")
+    return _limiter
+
+
+def retry_after_header(retry_after: float) -> str:
+    """Retry-After value in whole seconds (at least 1)"""
+    return str(max(1, math.ceil(retry_after)))
+
+
+def sweep_rate_limit_buckets():
+    """Scheduler job: drop buckets idle for more than a day (they are full again)"""
+    removed = get_rate_limiter().sweep()
+    if removed:
+        logger.info(f"Swept {removed} idle rate limit buckets")
+    return removed
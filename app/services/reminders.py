@@ -1,153 +1,296 @@
 """
-Cron/scheduled tasks for sending reminder emails
+Cron/scheduled tasks for sending reminder emails.
+
+A run streams the due requests in batches, renders them in the scheduler
+thread and hands them to REMINDER_WORKERS threads; actual SMTP concurrency and the per-server send
+rate are bounded by the mail dispatcher (reminders use the bulk lane, so
+they never hold up login codes or decision emails).
+
+A request is due once it has been in its status for the first
+REMINDER_TIERS threshold, then again every N days of the tier it is in.
+Each sent reminder stamps last_reminded_at / reminder_count on the request
+(both reset on a status change) as soon as it is known, so a run that is
+restarted after a crash does not resend what already went out. Every
+outcome is also written to the reminder_deliveries ledger.
 """
-from datetime import datetime, timedelta
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.models.pricing_request import PricingRequest
+from app.models.reminder_delivery import ReminderDelivery
 from app.models.enums import RequestStatus
 from app.emails.mailer import send_email
-import logging
+from app.emails.transport import LANE_BULK
 
 logger = logging.getLogger(__name__)
 
+# Ledger rows are only kept for troubleshooting recent runs
+LEDGER_RETENTION_DAYS = 7
+
+# The jobs run once a day; a reminder sent a few seconds later yesterday is still a day old
+REMINDER_GRACE = timedelta(hours=1)
 
-def send_pl_reminder_emails(db: Session):
+
+def reminder_tiers() -> list[tuple[int, int]]:
     """
-    Send reminder emails to PL responsible for requests pending >2 days
+    Parse REMINDER_TIERS ("2:2,7:1") into [(2, 2), (7, 1)]: from day 2 in a
+    status remind every 2 days, from day 7 every day
     """
-    two_days_ago = datetime.utcnow() - timedelta(days=2)
+    tiers = []
+    for tier in settings.REMINDER_TIERS.split(","):
+        after_days, every_days = tier.split(":")
+        tiers.append((int(after_days), max(1, int(every_days))))
+    return sorted(tiers)
+
+
+def due_condition(now: datetime):
+    """WHERE clause for requests whose tier says a reminder is due"""
+    tiers = reminder_tiers()
+    conditions = []
+    for index, (after_days, every_days) in enumerate(tiers):
+        in_tier = [PricingRequest.status_entered_at <= now - timedelta(days=after_days)]
+        if index + 1 < len(tiers):
+            in_tier.append(PricingRequest.status_entered_at > now - timedelta(days=tiers[index + 1][0]))
+        conditions.append(and_(*in_tier, or_(
+            PricingRequest.last_reminded_at.is_(None),
+            PricingRequest.last_reminded_at <= now - timedelta(days=every_days) + REMINDER_GRACE,
+        )))
+    # The leading range lets the partial (status, status_entered_at) index do the filtering
+    return and_(PricingRequest.status_entered_at <= now - timedelta(days=tiers[0][0]), or_(*conditions))
+
+
+def render_pl_reminder(request, now: datetime) -> tuple[str, str]:
+    """Build (subject, html_body) of the reminder to the PL Responsible (request: row or model)"""
+    days_pending = (now - request.status_entered_at).days
+    subject = f"⏰ Reminder – Pending approval ({request.costing_number})"
     
-    # Get all requests that are still under review and older than 2 days
-    old_requests = db.query(PricingRequest).filter(
-        PricingRequest.status == RequestStatus.UNDER_REVIEW_PL.value,
-        PricingRequest.created_at < two_days_ago
-    ).all()
+    html_body = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 0;">
+        <table style="max-width: 600px; margin: 0 auto; background-color: white;">
+          <tr>
+            <td style="padding: 20px; text-align: center; background-color: #f59e0b;">
+              <h1 style="margin: 0; color: white; font-size: 24px;">⏰ Reminder</h1>
+            </td>
+          </tr>
+          
+          <tr>
+            <td style="padding: 40px 20px;">
+              <h2 style="color: #0f2a44; margin-top: 0;">Action Required</h2>
+              <p style="color: #666; font-size: 14px; line-height: 1.6;">
+                This is a friendly reminder that the following pricing deviation request
+                has been pending your approval for {days_pending} days.
+              </p>
+              
+              <div style="background-color: #fff3cd; border-left: 4px solid #f59e0b; padding: 20px; margin: 20px 0; border-radius: 6px;">
+                <p style="margin: 6px 0;"><strong>Project:</strong> {request.project_name}</p>
+                <p style="margin: 6px 0;"><strong>Customer:</strong> {request.customer}</p>
+                <p style="margin: 6px 0;"><strong>Costing #:</strong> {request.costing_number}</p>
+                <p style="margin: 6px 0;"><strong>Submitted:</strong> {request.created_at.strftime('%Y-%m-%d %H:%M')}</p>
+                <p style="margin: 6px 0;"><strong>Days Pending:</strong> {days_pending} days</p>
+              </div>
+              
+              <p style="text-align: center; margin: 24px 0;">
+                <a href="http://localhost:5173/pl"
+                   style="background: #f59e0b; color: white; text-decoration: none; padding: 12px 24px; border-radius: 6px; font-weight: bold; display: inline-block; font-size: 16px;">
+                  Review Now
+                </a>
+              </p>
+              
+              <p style="color: #999; font-size: 12px;">
+                Please review and make a decision on this request as soon as possible.
+              </p>
+            </td>
+          </tr>
+          
+          <tr>
+            <td style="background-color: #f1f3f6; padding: 12px; font-size: 11px; color: #777; text-align: center;">
+              This is an automated reminder message. Please do not reply to this email.
+            </td>
+          </tr>
+        </table>
+      </body>
+    </html>
+    """
+
+    return subject, html_body
+
+
+def render_vp_reminder(request, now: datetime) -> tuple[str, str]:
+    """Build (subject, html_body) of the reminder to the VP (request: row or model)"""
+    days_pending = (now - request.status_entered_at).days
+    subject = f"🚨 Urgent – Escalated request pending ({request.costing_number})"
     
-    for request in old_requests:
-        try:
-            subject = f"⏰ Reminder – Pending approval ({request.costing_number})"
-            
-            html_body = f"""
-            <html>
-              <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 0;">
-                <table style="max-width: 600px; margin: 0 auto; background-color: white;">
-                  <tr>
-                    <td style="padding: 20px; text-align: center; background-color: #f59e0b;">
-                      <h1 style="margin: 0; color: white; font-size: 24px;">⏰ Reminder</h1>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="padding: 40px 20px;">
-                      <h2 style="color: #0f2a44; margin-top: 0;">Action Required</h2>
-                      <p style="color: #666; font-size: 14px; line-height: 1.6;">
-                        This is a friendly reminder that the following pricing deviation request
-                        has been pending your approval for more than 2 days.
-                      </p>
-                      
-                      <div style="background-color: #fff3cd; border-left: 4px solid #f59e0b; padding: 20px; margin: 20px 0; border-radius: 6px;">
-                        <p style="margin: 6px 0;"><strong>Project:</strong> {request.project_name}</p>
-                        <p style="margin: 6px 0;"><strong>Customer:</strong> {request.customer}</p>
-                        <p style="margin: 6px 0;"><strong>Costing #:</strong> {request.costing_number}</p>
-                        <p style="margin: 6px 0;"><strong>Submitted:</strong> {request.created_at.strftime('%Y-%m-%d %H:%M')}</p>
-                        <p style="margin: 6px 0;"><strong>Days Pending:</strong> {(datetime.utcnow() - request.created_at).days} days</p>
-                      </div>
-                      
-                      <p style="text-align: center; margin: 24px 0;">
-                        <a href="http://localhost:5173/pl"
-                           style="background: #f59e0b; color: white; text-decoration: none; padding: 12px 24px; border-radius: 6px; font-weight: bold; display: inline-block; font-size: 16px;">
-                          Review Now
-                        </a>
-                      </p>
-                      
-                      <p style="color: #999; font-size: 12px;">
-                        Please review and make a decision on this request as soon as possible.
-                      </p>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="background-color: #f1f3f6; padding: 12px; font-size: 11px; color: #777; text-align: center;">
-                      This is an automated reminder message. Please do not reply to this email.
-                    </td>
-                  </tr>
-                </table>
-              </body>
-            </html>
-            """
-            
-            send_email(request.product_line_responsible_email, subject, html_body)
-            logger.info(f"Sent PL reminder for request {request.id}")
-        except Exception as e:
-            logger.error(f"Failed to send PL reminder for request {request.id}: {str(e)}")
-
-
-def send_vp_reminder_emails(db: Session):
+    html_body = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 0;">
+        <table style="max-width: 600px; margin: 0 auto; background-color: white;">
+          <tr>
+            <td style="padding: 20px; text-align: center; background-color: #dc3545;">
+              <h1 style="margin: 0; color: white; font-size: 24px;">🚨 Urgent Reminder</h1>
+            </td>
+          </tr>
+          
+          <tr>
+            <td style="padding: 40px 20px;">
+              <h2 style="color: #0f2a44; margin-top: 0;">Escalated Request Awaiting Decision</h2>
+              <p style="color: #666; font-size: 14px; line-height: 1.6;">
+                An escalated pricing deviation request has been pending your final decision
+                for {days_pending} days. Please review and decide urgently.
+              </p>
+              
+              <div style="background-color: #f8d7da; border-left: 4px solid #dc3545; padding: 20px; margin: 20px 0; border-radius: 6px;">
+                <p style="margin: 6px 0;"><strong>Project:</strong> {request.project_name}</p>
+                <p style="margin: 6px 0;"><strong>Customer:</strong> {request.customer}</p>
+                <p style="margin: 6px 0;"><strong>Costing #:</strong> {request.costing_number}</p>
+                <p style="margin: 6px 0;"><strong>Escalated:</strong> {request.status_entered_at.strftime('%Y-%m-%d %H:%M')}</p>
+                <p style="margin: 6px 0;"><strong>Days Pending:</strong> {days_pending} days</p>
+              </div>
+              
+              <p style="text-align: center; margin: 24px 0;">
+                <a href="http://localhost:5173/vp"
+                   style="background: #dc3545; color: white; text-decoration: none; padding: 12px 24px; border-radius: 6px; font-weight: bold; display: inline-block; font-size: 16px;">
+                  Make Decision Now
+                </a>
+              </p>
+              
+              <p style="color: #999; font-size: 12px;">
+                Your timely decision is critical for the customer and internal processes.
+              </p>
+            </td>
+          </tr>
+          
+          <tr>
+            <td style="background-color: #f1f3f6; padding: 12px; font-size: 11px; color: #777; text-align: center;">
+              This is an automated urgent reminder. Please do not reply to this email.
+            </td>
+          </tr>
+        </table>
+      </body>
+    </html>
     """
-    Send reminder emails to VP for requests escalated >2 days
+
+    return subject, html_body
+
+
+# kind -> (status that is reminded, recipient column, renderer)
+REMINDERS = {
+    "pl": (RequestStatus.UNDER_REVIEW_PL.value, PricingRequest.product_line_responsible_email, render_pl_reminder),
+    "vp": (RequestStatus.ESCALATED_TO_VP.value, PricingRequest.vp_email, render_vp_reminder),
+}
+
+
+def _record(db: Session, kind: str, request_id: int, run_date, sent: bool, error: str = None):
+    """Write one outcome (and the request's reminder bookkeeping) and commit it right away"""
+    values = {
+        "kind": kind,
+        "request_id": request_id,
+        "run_date": run_date,
+        "status": "sent" if sent else "failed",
+        "last_error": error,
+    }
+    stmt = insert(ReminderDelivery).values(**values, attempts=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["kind", "request_id", "run_date"],
+        set_={**values, "attempts": ReminderDelivery.attempts + 1, "updated_at": stmt.excluded.updated_at},
+    ))
+    if sent:
+        # Core update: bookkeeping is not an edit, so neither version nor updated_at (ETags) change.
+        # Skipped if the request changed status meanwhile, which already reset the counters.
+        db.execute(
+            update(PricingRequest)
+            .where(PricingRequest.id == request_id, PricingRequest.status == REMINDERS[kind][0])
+            .values(
+                last_reminded_at=func.now(),
+                reminder_count=PricingRequest.reminder_count + 1,
+                updated_at=PricingRequest.updated_at,
+            )
+        )
+    db.commit()
+
+
+def send_reminders(db: Session, kind: str) -> dict:
+    """Send the due reminders of one kind ("pl" or "vp") and return run stats"""
+    status, recipient_column, render = REMINDERS[kind]
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    run_date = now.date()
+
+    # Only the columns the templates need, streamed from a server-side cursor in
+    # REMINDER_BATCH_SIZE batches, so memory stays flat however large the backlog.
+    # The cursor gets its own connection: _record commits on `db` after every send.
+    due = (
+        select(
+            PricingRequest.id,
+            PricingRequest.project_name,
+            PricingRequest.customer,
+            PricingRequest.costing_number,
+            PricingRequest.created_at,
+            PricingRequest.status_entered_at,
+            recipient_column.label("to_email"),
+        )
+        .where(PricingRequest.status == status, due_condition(now), recipient_column.isnot(None))
+        .order_by(PricingRequest.status_entered_at)
+    )
+
+    stats = {"due": 0, "sent": 0, "failed": 0}
+    batch_size = max(1, settings.REMINDER_BATCH_SIZE)
+    with ThreadPoolExecutor(max_workers=max(1, settings.REMINDER_WORKERS), thread_name_prefix=f"{kind}-reminders") as pool, \
+            db.get_bind().connect() as reader:
+        result = reader.execution_options(yield_per=batch_size).execute(due)
+        for batch in result.partitions():
+            stats["due"] += len(batch)
+            futures = {}
+            for request in batch:
+                subject, html_body = render(request, now)
+                futures[pool.submit(send_email, request.to_email, subject, html_body, lane=LANE_BULK)] = request.id
+
+            # Finish the batch before fetching the next one, so at most one batch is held in memory
+            for future in as_completed(futures):
+                request_id = futures[future]
+                try:
+                    sent = future.result()
+                    error = None if sent else "SMTP send failed"
+                except Exception as e:
+                    sent, error = False, f"{type(e).__name__}: {e}"
+                try:
+                    _record(db, kind, request_id, run_date, sent, error)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Could not record {kind} reminder for request {request_id}: {e}")
+                stats["sent" if sent else "failed"] += 1
+
+    db.execute(delete(ReminderDelivery).where(
+        ReminderDelivery.run_date < run_date - timedelta(days=LEDGER_RETENTION_DAYS)
+    ))
+    db.commit()
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["per_second"] = round((stats["sent"] + stats["failed"]) / seconds, 2) if seconds else 0
+    metrics.observe("reminder_job_seconds", seconds, kind=kind)
+    metrics.increment("reminders_sent", stats["sent"], kind=kind)
+    metrics.increment("reminders_failed", stats["failed"], kind=kind)
+    logger.info(f"{kind.upper()} reminders: {stats}")
+    return stats
+
+
+def send_pl_reminder_emails(db: Session) -> dict:
     """
-    two_days_ago = datetime.utcnow() - timedelta(days=2)
-    
-    # Get all requests that are escalated and older than 2 days
-    old_requests = db.query(PricingRequest).filter(
-        PricingRequest.status == RequestStatus.ESCALATED_TO_VP.value,
-        PricingRequest.created_at < two_days_ago
-    ).all()
-    
-    for request in old_requests:
-        try:
-            subject = f"🚨 Urgent – Escalated request pending ({request.costing_number})"
-            
-            html_body = f"""
-            <html>
-              <body style="font-family: Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 0;">
-                <table style="max-width: 600px; margin: 0 auto; background-color: white;">
-                  <tr>
-                    <td style="padding: 20px; text-align: center; background-color: #dc3545;">
-                      <h1 style="margin: 0; color: white; font-size: 24px;">🚨 Urgent Reminder</h1>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="padding: 40px 20px;">
-                      <h2 style="color: #0f2a44; margin-top: 0;">Escalated Request Awaiting Decision</h2>
-                      <p style="color: #666; font-size: 14px; line-height: 1.6;">
-                        An escalated pricing deviation request has been pending your final decision
-                        for more than 2 days. Please review and decide urgently.
-                      </p>
-                      
-                      <div style="background-color: #f8d7da; border-left: 4px solid #dc3545; padding: 20px; margin: 20px 0; border-radius: 6px;">
-                        <p style="margin: 6px 0;"><strong>Project:</strong> {request.project_name}</p>
-                        <p style="margin: 6px 0;"><strong>Customer:</strong> {request.customer}</p>
-                        <p style="margin: 6px 0;"><strong>Costing #:</strong> {request.costing_number}</p>
-                        <p style="margin: 6px 0;"><strong>Escalated:</strong> {request.created_at.strftime('%Y-%m-%d %H:%M')}</p>
-                        <p style="margin: 6px 0;"><strong>Days Pending:</strong> {(datetime.utcnow() - request.created_at).days} days</p>
-                      </div>
-                      
-                      <p style="text-align: center; margin: 24px 0;">
-                        <a href="http://localhost:5173/vp"
-                           style="background: #dc3545; color: white; text-decoration: none; padding: 12px 24px; border-radius: 6px; font-weight: bold; display: inline-block; font-size: 16px;">
-                          Make Decision Now
-                        </a>
-                      </p>
-                      
-                      <p style="color: #999; font-size: 12px;">
-                        Your timely decision is critical for the customer and internal processes.
-                      </p>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="background-color: #f1f3f6; padding: 12px; font-size: 11px; color: #777; text-align: center;">
-                      This is an automated urgent reminder. Please do not reply to this email.
-                    </td>
-                  </tr>
-                </table>
-              </body>
-            </html>
-            """
-            
-            send_email(request.vp_email, subject, html_body)
-            logger.info(f"Sent VP reminder for request {request.id}")
-        except Exception as e:
-            logger.error(f"Failed to send VP reminder for request {request.id}: {str(e)}")
+    Send reminder emails to PL responsible for requests pending review (see REMINDER_TIERS)
+    """
+    return send_reminders(db, "pl")
+
+
+def send_vp_reminder_emails(db: Session) -> dict:
+    """
+    Send reminder emails to VP for escalated requests (see REMINDER_TIERS)
+    """
+    return send_reminders(db, "vp")
@@ -0,0 +1,197 @@
+"""
+In-process cache of serialized pricing request details.
+
+Entries are keyed by request id and validated against the row's updated_at,
+which readers fetch with a primary-key-only query anyway (for the ETag): a
+hit skips loading the full row, problem text included. Any write bumps
+updated_at, so a stale entry is never served even before it is evicted.
+
+Write paths also call invalidate_request, which evicts locally and sends a
+Postgres NOTIFY in the writer's transaction (delivered on commit only), so
+the other workers drop their copy as well (start_invalidation_listener,
+which LISTENs on its own connection, outside the application pool).
+
+Entries are copied in and out, so a caller changing its dict never affects
+what other requests read.
+"""
+import copy
+import select
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.pricing_request import PricingRequest
+from app.schemas.pricing_request import PricingRequestDetailResponse
+from app.utils.etag import row_version
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "request_cache"
+
+
+class RequestDetailCache:
+    """Bounded LRU with a TTL: request id -> (updated_at, detail dict, stored at)"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, request_id: int, updated_at) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(request_id)
+            if entry is None:
+                metrics.increment("request_cache", result="miss")
+                return None
+            cached_updated_at, detail, stored_at = entry
+            if cached_updated_at != updated_at or time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[request_id]
+                metrics.increment("request_cache", result="stale")
+                metrics.increment("request_cache_evictions", reason="stale")
+                return None
+            self._entries.move_to_end(request_id)
+        metrics.increment("request_cache", result="hit")
+        return copy.deepcopy(detail)
+
+    def put(self, request_id: int, updated_at, detail: dict):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[request_id] = (updated_at, copy.deepcopy(detail), time.monotonic())
+            self._entries.move_to_end(request_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                metrics.increment("request_cache_evictions", reason="capacity")
+
+    def evict(self, request_id: int):
+        with self._lock:
+            if self._entries.pop(request_id, None) is not None:
+                metrics.increment("request_cache_evictions", reason="invalidated")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+request_cache = RequestDetailCache(settings.REQUEST_CACHE_SIZE, settings.REQUEST_CACHE_TTL_SECONDS)
+
+
+def get_request_detail(db: Session, request_id: int, updated_at=None) -> Optional[dict]:
+    """
+    Serialized PricingRequestDetailResponse of a request, from the cache when
+    it is current. Pass updated_at when the caller already fetched it.
+    Returns None when the request does not exist.
+    """
+    if updated_at is None:
+        version = row_version(db, PricingRequest, request_id)
+        if not version:
+            return None
+        updated_at = version.updated_at
+
+    detail = request_cache.get(request_id, updated_at)
+    if detail is not None:
+        return detail
+
+    request = db.query(PricingRequest).filter(PricingRequest.id == request_id).first()
+    if request is None:
+        return None
+    detail = PricingRequestDetailResponse.model_validate(request).model_dump()
+    request_cache.put(request_id, request.updated_at, detail)
+    return detail
+
+
+def invalidate_request(db: Session, request_id: int):
+    """
+    Evict a request here and, once the caller's transaction commits, in the
+    other workers. Call it before the commit of the write.
+    """
+    request_cache.evict(request_id)
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": INVALIDATION_CHANNEL, "payload": str(request_id)},
+    )
+
+
+def _connect():
+    """A psycopg2 connection to the primary with the engine's settings, outside its pool"""
+    import psycopg2
+    from app.core.database import engine
+
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    return psycopg2.connect(*cargs, **{**cparams, "connect_timeout": 10, "keepalives": 1, "keepalives_idle": 30})
+
+
+class _InvalidationListener:
+    """
+    LISTENs on INVALIDATION_CHANNEL in a daemon thread and evicts notified ids.
+    The connection is opened directly with psycopg2 so it never takes a slot
+    of the application pool.
+    """
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="request-cache-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            dbapi_connection = None
+            try:
+                dbapi_connection = _connect()
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                # Notifications sent while no listener was connected are lost
+                request_cache.clear()
+
+                while not self._stop.is_set():
+                    if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notify = dbapi_connection.notifies.pop(0)
+                        try:
+                            request_cache.evict(int(notify.payload))
+                        except ValueError:
+                            request_cache.clear()
+            except Exception as e:
+                logger.warning(f"Request cache listener error, reconnecting: {type(e).__name__} - {e}")
+                self._stop.wait(5)
+            finally:
+                if dbapi_connection is not None:
+                    try:
+                        dbapi_connection.close()
+                    except Exception:
+                        pass
+
+
+_listener = _InvalidationListener()
+
+
+def start_invalidation_listener():
+    if settings.REQUEST_CACHE_SIZE > 0:
+        _listener.start()
+
+
+def stop_invalidation_listener():
+    _listener.stop()
@@ -0,0 +1,211 @@
+"""
+Storage for one-time login verification codes.
+
+Two backends share the same interface:
+- PostgresVerificationStore: UNLOGGED table shared by all workers, the
+  default
+- InMemoryVerificationStore: per-process, bounded, for a single worker and
+  tests (VERIFICATION_STORE_BACKEND=memory); refused with WEB_CONCURRENCY > 1
+
+Every verification attempt goes through register_attempt, which counts it
+and returns the entry in one atomic step, so parallel guesses cannot get
+past the attempt cap.
+"""
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.models.verification_code import VerificationCode
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class InMemoryVerificationStore:
+    """
+    Per-process store.
+
+    Codes share one TTL, so insertion order is also expiry order: the
+    OrderedDict keeps the soonest-expiring entry first, which makes the
+    sweep pop only expired entries (O(1) per removed code). The number of
+    entries is bounded by max_entries, evicting the oldest codes first.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, email: str, code: str, role: str, expires_at: datetime):
+        with self._lock:
+            self._entries.pop(email, None)
+            self._entries[email] = {
+                "code": code,
+                "role": role,
+                "expires_at": _as_aware(expires_at),
+                "attempts": 0,
+            }
+            self._sweep_locked()
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.warning(f"Verification store full, evicted code for {evicted}")
+
+    def get(self, email: str) -> Optional[dict]:
+        """Return the stored entry, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= _utcnow():
+                del self._entries[email]
+                return None
+            return dict(entry)
+
+    def register_attempt(self, email: str) -> Optional[dict]:
+        """Count one attempt and return the entry with the new count, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= _utcnow():
+                del self._entries[email]
+                return None
+            entry["attempts"] += 1
+            return dict(entry)
+
+    def delete(self, email: str):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def sweep(self) -> int:
+        """Remove expired entries, returns the number removed"""
+        with self._lock:
+            return self._sweep_locked()
+
+    def _sweep_locked(self) -> int:
+        now = _utcnow()
+        removed = 0
+        while self._entries:
+            email, entry = next(iter(self._entries.items()))
+            if entry["expires_at"] > now:
+                break
+            del self._entries[email]
+            removed += 1
+        return removed
+
+
+class PostgresVerificationStore:
+    """
+    Store shared between workers, backed by the UNLOGGED verification_codes
+    table. Expired rows are ignored on read and removed by the sweeper using
+    the expires_at index.
+    """
+
+    def __init__(self, bind, max_entries: int = 10000):
+        self.bind = bind
+        self.max_entries = max_entries
+
+    def save(self, email: str, code: str, role: str, expires_at: datetime):
+        statement = insert(VerificationCode).values(
+            email=email,
+            code=code,
+            role=role,
+            attempts=0,
+            expires_at=expires_at,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[VerificationCode.email],
+            set_={
+                "code": statement.excluded.code,
+                "role": statement.excluded.role,
+                "attempts": 0,
+                "expires_at": statement.excluded.expires_at,
+            },
+        )
+        with self.bind.begin() as conn:
+            conn.execute(statement)
+
+    def get(self, email: str) -> Optional[dict]:
+        with self.bind.connect() as conn:
+            row = conn.execute(
+                select(
+                    VerificationCode.code,
+                    VerificationCode.role,
+                    VerificationCode.expires_at,
+                    VerificationCode.attempts,
+                ).where(
+                    VerificationCode.email == email,
+                    VerificationCode.expires_at > _utcnow(),
+                )
+            ).first()
+        return dict(row._mapping) if row else None
+
+    def register_attempt(self, email: str) -> Optional[dict]:
+        with self.bind.begin() as conn:
+            row = conn.execute(
+                update(VerificationCode)
+                .where(
+                    VerificationCode.email == email,
+                    VerificationCode.expires_at > _utcnow(),
+                )
+                .values(attempts=VerificationCode.attempts + 1)
+                .returning(
+                    VerificationCode.code,
+                    VerificationCode.role,
+                    VerificationCode.expires_at,
+                    VerificationCode.attempts,
+                )
+            ).first()
+        return dict(row._mapping) if row else None
+
+    def delete(self, email: str):
+        with self.bind.begin() as conn:
+            conn.execute(delete(VerificationCode).where(VerificationCode.email == email))
+
+    def sweep(self) -> int:
+        with self.bind.begin() as conn:
+            result = conn.execute(
+                delete(VerificationCode).where(VerificationCode.expires_at <= _utcnow())
+            )
+        return result.rowcount
+
+
+_store = None
+
+
+def get_verification_store():
+    """Return the configured verification store (created on first use)"""
+    global _store
+    if _store is None:
+        backend = settings.VERIFICATION_STORE_BACKEND.lower()
+        if backend == "postgres":
+            from app.core.database import engine
+            _store = PostgresVerificationStore(engine, max_entries=settings.VERIFICATION_STORE_MAX_ENTRIES)
+        else:
+            if settings.WEB_CONCURRENCY > 1:
+                # A code issued by one worker could not be verified by another
+                raise RuntimeError(
+                    "VERIFICATION_STORE_BACKEND=memory cannot be used with WEB_CONCURRENCY > 1; use postgres"
+                )
+            _store = InMemoryVerificationStore(max_entries=settings.VERIFICATION_STORE_MAX_ENTRIES)
+        logger.info(f"Using {type(_store).__name__} for verification codes")
+    return _store
+
+
+def sweep_verification_codes():
+    """Scheduler job: remove expired verification codes"""
+    removed = get_verification_store().sweep()
+    if removed:
+        logger.info(f"Swept {removed} expired verification codes")
+    return removed
@@ -0,0 +1,23 @@
+"""
+Client address of the caller behind the App Service front end
+"""
+from starlette.requests import Request
+from app.core.config import settings
+
+
+def get_client_ip(http_request: Request) -> str:
+    """
+    Client IP as seen by the outermost trusted proxy. Each proxy appends
+    the address it received the request from to X-Forwarded-For, so only
+    the last FORWARDED_TRUSTED_HOPS entries can be trusted; anything to
+    their left was sent by the client and is ignored.
+    """
+    forwarded = http_request.headers.get("x-forwarded-for")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()] if forwarded else []
+    if hops and settings.FORWARDED_TRUSTED_HOPS > 0:
+        ip = hops[-min(settings.FORWARDED_TRUSTED_HOPS, len(hops))]
+        # Azure appends the client port to IPv4 addresses (1.2.3.4:5678)
+        if ip.count(":") == 1:
+            ip = ip.split(":")[0]
+        return ip
+    return http_request.client.host if http_request.client else "unknown"
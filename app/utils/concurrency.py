@@ -0,0 +1,51 @@
+"""
+Helpers for concurrent decisions: fail fast with 409 instead of waiting
+"""
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from app.models.pricing_request import PricingRequest
+
+# SQLSTATE raised by SELECT ... FOR UPDATE NOWAIT when the row is locked
+LOCK_NOT_AVAILABLE = "55P03"
+
+CONFLICT_DETAIL = "Request is being updated by someone else. Please reload and retry."
+
+
+def is_lock_not_available(error: OperationalError) -> bool:
+    return getattr(error.orig, "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def lock_pricing_request(db: Session, request_id: int):
+    """
+    Load a pricing request with SELECT ... FOR UPDATE NOWAIT.
+    Raises 409 immediately when another transaction holds the row.
+    """
+    try:
+        return db.query(PricingRequest).filter(
+            PricingRequest.id == request_id
+        ).with_for_update(nowait=True).first()
+    except OperationalError as e:
+        db.rollback()
+        if is_lock_not_available(e):
+            raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+        raise
+
+
+def commit_or_conflict(db: Session):
+    """Commit, turning a failed version check into 409"""
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+
+
+def flush_or_conflict(db: Session):
+    """Flush (e.g. to get the ids of new rows before commit), turning a failed version check into 409"""
+    try:
+        db.flush()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
@@ -0,0 +1,48 @@
+"""
+Helpers for strong ETags and conditional GET (If-None-Match -> 304)
+"""
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given version parts"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the If-None-Match header of the request matches the ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the current ETag"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def row_version(db: Session, model, row_id: int):
+    """
+    Fetch only updated_at for a row.
+    Returns None when the row does not exist.
+    """
+    return db.query(model.updated_at).filter(model.id == row_id).first()
+
+
+def list_version(db: Session, model, *filters):
+    """
+    Fetch (count, max updated_at) for the rows matching the filters
+    in one aggregate query.
+    """
+    return db.query(func.count(model.id), func.max(model.updated_at)).filter(*filters).one()
@@ -3,16 +3,25 @@ import os
 from pathlib import Path
 from typing import List
 
-try:
-    from openpyxl import load_workbook
-except ImportError:
-    load_workbook = None
 
-try:
-    import odf.opendocument
-    import odf.table
-except ImportError:
-    odf = None
+# openpyxl and odfpy are optional and slow to import: load them on first use
+
+
+def _load_workbook():
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        return None
+    return load_workbook
+
+
+def _odf():
+    try:
+        import odf.opendocument
+        import odf.table
+    except ImportError:
+        return None
+    return odf
 
 
 def load_customers_from_ods() -> List[str]:
@@ -28,7 +37,7 @@ def load_customers_from_ods() -> List[str]:
         return []
     
     try:
-        if odf is not None:
+        if _odf() is not None:
             return _load_from_ods(str(ods_file))
         else:
             print("Warning: openpyxl or odfpy not installed, returning empty customer list")
@@ -40,6 +49,7 @@ def load_customers_from_ods() -> List[str]:
 
 def _load_from_ods(file_path: str) -> List[str]:
     """Load customers from ODS file"""
+    odf = _odf()
     try:
         doc = odf.opendocument.load(file_path)
         tables = doc.spreadsheet.getElementsByType(odf.table.Table)
@@ -72,6 +82,7 @@ def load_customers_from_xlsx() -> List[str]:
     if not xlsx_file.exists():
         return []
     
+    load_workbook = _load_workbook()
     try:
         if load_workbook is not None:
             wb = load_workbook(xlsx_file)
@@ -1,14 +1,25 @@
 """
 Utility functions for creating and managing notifications
 """
+from sqlalchemy import func, insert, literal, select
 from sqlalchemy.orm import Session
 from app.models.notification import Notification, NotificationType
 
+REQUEST_SUBMITTED_TITLE = "🆕 New Deviation Request Submitted"
+
 
 def _normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
 
+def _request_submitted_message(requester_name: str, costing_number: str) -> str:
+    return f"{requester_name} submitted request {costing_number} requiring your review."
+
+
+def _request_action_prefix(recipient_role: str) -> str:
+    return "/pl/" if recipient_role == "PL" else "/pricing-requests/"
+
+
 def create_notification(
     db: Session,
     recipient_email: str,
@@ -19,10 +30,13 @@ def create_notification(
     message: str,
     triggered_by_email: str,
     triggered_by_name: str,
-    action_url: str = None
+    action_url: str = None,
+    commit: bool = True
 ):
     """
-    Create a notification in the database
+    Create a notification in the database.
+    With commit=False the notification is only added to the session, so it
+    is written in the caller's transaction.
     """
     normalized_recipient = _normalize_email(recipient_email)
     normalized_triggered = _normalize_email(triggered_by_email)
@@ -46,6 +60,10 @@ def create_notification(
         action_url=action_url
     )
     
+    if not commit:
+        db.add(notification)
+        return notification
+
     try:
         db.add(notification)
         db.commit()
@@ -57,9 +75,8 @@ def create_notification(
     return notification
 
 
-def create_request_submitted_notification(
-    db: Session,
-    request_id: int,
+def request_submitted_notification_from(
+    request_id,
     recipient_email: str,
     recipient_role: str,
     requester_name: str,
@@ -67,19 +84,33 @@ def create_request_submitted_notification(
     costing_number: str,
 ):
     """
-    Create notification when a commercial user submits a new request.
+    INSERT ... SELECT of the notification for a new request, where
+    request_id is a SQL expression (e.g. the id returned by a CTE), so the
+    notification is written by the same statement as the request.
+    Returns None when no notification is needed.
     """
-    return create_notification(
-        db=db,
-        recipient_email=recipient_email,
-        recipient_role=recipient_role,
-        request_id=request_id,
-        notification_type=NotificationType.REQUEST_SUBMITTED,
-        title="🆕 New Deviation Request Submitted",
-        message=f"{requester_name} submitted request {costing_number} requiring your review.",
-        triggered_by_email=requester_email,
-        triggered_by_name=requester_name,
-        action_url=f"/pl/{request_id}" if recipient_role == "PL" else f"/pricing-requests/{request_id}",
+    normalized_recipient = _normalize_email(recipient_email)
+    normalized_triggered = _normalize_email(requester_email)
+    if not normalized_recipient or normalized_recipient == normalized_triggered:
+        return None
+
+    return insert(Notification).from_select(
+        [
+            "recipient_email", "recipient_role", "request_id", "type", "title",
+            "message", "triggered_by_email", "triggered_by_name", "action_url", "is_read",
+        ],
+        select(
+            literal(normalized_recipient),
+            literal(recipient_role),
+            request_id,
+            literal(NotificationType.REQUEST_SUBMITTED, Notification.type.type),
+            literal(REQUEST_SUBMITTED_TITLE),
+            literal(_request_submitted_message(requester_name, costing_number)),
+            literal(normalized_triggered),
+            literal(requester_name),
+            func.concat(_request_action_prefix(recipient_role), request_id),
+            literal(False),
+        ),
     )
 
 
@@ -91,7 +122,8 @@ def create_pl_decision_notification(
     pl_name: str,
     pl_email: str,
     action: str,  # APPROVE, REJECT, ESCALATE
-    suggested_price: float = None
+    suggested_price: float = None,
+    commit: bool = True
 ):
     """
     Create notification when PL makes a decision
@@ -128,7 +160,8 @@ def create_pl_decision_notification(
         message=message_map[action],
         triggered_by_email=pl_email,
         triggered_by_name=pl_name,
-        action_url=f"/pricing-requests/{request_id}"
+        action_url=f"/pricing-requests/{request_id}",
+        commit=commit
     )
 
 
@@ -140,7 +173,8 @@ def create_vp_decision_notification(
     vp_name: str,
     vp_email: str,
     action: str,  # APPROVE, REJECT
-    final_price: float = None
+    final_price: float = None,
+    commit: bool = True
 ):
     """
     Create notification when VP makes a final decision
@@ -174,7 +208,8 @@ def create_vp_decision_notification(
         message=message_map[action],
         triggered_by_email=vp_email,
         triggered_by_name=vp_name,
-        action_url=f"/pricing-requests/{request_id}"
+        action_url=f"/pricing-requests/{request_id}",
+        commit=commit
     )
 
 
@@ -185,7 +220,8 @@ def create_comment_notification(
     recipient_role: str,
     commenter_email: str,
     commenter_name: str,
-    comment_preview: str
+    comment_preview: str,
+    commit: bool = True
 ):
     """
     Create notification when someone comments on a request
@@ -203,5 +239,6 @@ def create_comment_notification(
         message=f"{commenter_name} commented: {preview}",
         triggered_by_email=commenter_email,
         triggered_by_name=commenter_name,
-        action_url=f"/pricing-requests/{request_id}"
+        action_url=f"/pricing-requests/{request_id}",
+        commit=commit
     )
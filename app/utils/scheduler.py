@@ -1,22 +1,64 @@
 """
-Scheduler setup for background tasks
+Scheduler setup for background tasks.
+
+Jobs are kept in the database (SCHEDULER_JOBSTORE=database), so a run that
+falls due while the app restarts is caught up once it is back, as long as
+that is within SCHEDULER_MISFIRE_GRACE_SECONDS; several missed runs of a
+job are coalesced into one. Every run goes through run_job
+(app/services/job_runs.py), which serializes it across workers and records
+it in job_runs.
+
+LOCAL_JOBS clean stores that live in each process (the in-memory
+verification codes, rate limit buckets and cache), so they run in every
+worker from an in-memory job store, outside run_job and its lock.
 """
+from collections import namedtuple
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import logging
+from sqlalchemy import text
+from app.core.config import settings
 from app.core.database import SessionLocal
+from app.services.job_runs import run_job, sweep_job_runs
 from app.services.reminders import send_pl_reminder_emails, send_vp_reminder_emails
+from app.services.verification_codes import sweep_verification_codes
+from app.services.rate_limiter import sweep_rate_limit_buckets
+from app.services.notification_partitions import maintain_notification_partitions
+from app.services.idempotency import sweep_idempotency_keys
+from app.services.outbox import deliver_pending_emails
+from app.services.cache import sweep_cache
 
 logger = logging.getLogger(__name__)
 
-scheduler = BackgroundScheduler()
+
+def _build_scheduler() -> BackgroundScheduler:
+    jobstores = {"local": MemoryJobStore()}
+    if settings.SCHEDULER_JOBSTORE.lower() == "database":
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        from app.core.database import engine
+
+        jobstores["default"] = SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")
+
+    return BackgroundScheduler(
+        jobstores=jobstores,
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
+        },
+    )
+
+
+scheduler = _build_scheduler()
 
 
 def send_pl_reminders():
     """Job to send PL reminder emails"""
     db = SessionLocal()
     try:
-        send_pl_reminder_emails(db)
+        return send_pl_reminder_emails(db)
     finally:
         db.close()
 
@@ -25,33 +67,114 @@ def send_vp_reminders():
     """Job to send VP reminder emails"""
     db = SessionLocal()
     try:
-        send_vp_reminder_emails(db)
+        return send_vp_reminder_emails(db)
     finally:
         db.close()
 
 
+Job = namedtuple("Job", ["func", "trigger", "name"])
+
+JOBS = {
+    # Run daily at 9 AM
+    "pl_reminders": Job(send_pl_reminders, CronTrigger(hour=9, minute=0), "Send PL reminder emails"),
+    # Run daily at 10 AM
+    "vp_reminders": Job(send_vp_reminders, CronTrigger(hour=10, minute=0), "Send VP reminder emails"),
+    # Send or retry pending outbox emails every minute
+    "outbox_delivery": Job(deliver_pending_emails, IntervalTrigger(minutes=1), "Deliver pending outbox emails"),
+    # Delete expired idempotency keys hourly
+    "idempotency_key_sweep": Job(
+        sweep_idempotency_keys, IntervalTrigger(hours=1), "Sweep expired idempotency keys"
+    ),
+    # Create upcoming notification partitions and apply retention daily at 2 AM
+    "notification_partitions": Job(
+        maintain_notification_partitions, CronTrigger(hour=2, minute=0), "Maintain notification partitions"
+    ),
+    # Trim the job run history daily at 3 AM
+    "job_run_sweep": Job(sweep_job_runs, CronTrigger(hour=3, minute=0), "Sweep old job runs"),
+}
+
+
+# Run in every worker (per-process stores; harmless repeats with the shared backends)
+LOCAL_JOBS = {
+    # Remove expired verification codes every 5 minutes
+    "verification_code_sweep": Job(
+        sweep_verification_codes, IntervalTrigger(minutes=5), "Sweep expired verification codes"
+    ),
+    # Drop idle rate limit buckets hourly
+    "rate_limit_sweep": Job(sweep_rate_limit_buckets, IntervalTrigger(hours=1), "Sweep idle rate limit buckets"),
+    # Drop expired in-process cache entries hourly
+    "cache_sweep": Job(sweep_cache, IntervalTrigger(hours=1), "Sweep expired cache entries"),
+}
+
+
+def run_scheduled_job(job_id: str):
+    """What the job store schedules: a reference to this function plus the job id"""
+    return run_job(job_id, JOBS[job_id].func)
+
+
+def trigger_job(job_id: str) -> int:
+    """Run a job now, outside its schedule (blocks until it is done); returns the job_runs id"""
+    return run_job(job_id, JOBS[job_id].func, trigger="manual")
+
+
+def _sync_jobs():
+    """
+    Add new jobs and update changed triggers, but leave existing jobs alone:
+    re-adding them (replace_existing) would move a missed run to the next
+    slot instead of catching it up.
+    """
+    for job_id, job in JOBS.items():
+        existing = scheduler.get_job(job_id, jobstore="default")
+        if existing is None:
+            scheduler.add_job(
+                run_scheduled_job, job.trigger, args=[job_id], id=job_id, name=job.name, jobstore="default"
+            )
+        elif str(existing.trigger) != str(job.trigger):
+            scheduler.reschedule_job(job_id, jobstore="default", trigger=job.trigger)
+        if existing is not None and (existing.func is not run_scheduled_job or tuple(existing.args) != (job_id,)):
+            scheduler.modify_job(job_id, jobstore="default", func=run_scheduled_job, args=[job_id], name=job.name)
+
+    for existing in scheduler.get_jobs(jobstore="default"):
+        if existing.id not in JOBS:
+            scheduler.remove_job(existing.id, jobstore="default")
+
+
+def _sync_jobs_locked():
+    """
+    _sync_jobs under the schema advisory lock when the job store is shared:
+    workers starting together would otherwise all see a job missing and
+    race to add it.
+    """
+    if settings.SCHEDULER_JOBSTORE.lower() != "database":
+        _sync_jobs()
+        return
+
+    from app.core.database import engine
+    from app.core.schema import SCHEMA_LOCK_KEY
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        conn.commit()
+        try:
+            _sync_jobs()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            conn.commit()
+
+
 def start_scheduler():
     """Start background scheduler for reminder emails"""
     if not scheduler.running:
-        # Run daily at 9 AM
-        scheduler.add_job(
-            send_pl_reminders,
-            CronTrigger(hour=9, minute=0),
-            id='pl_reminders',
-            name='Send PL reminder emails',
-            replace_existing=True
-        )
-        
-        # Run daily at 10 AM
-        scheduler.add_job(
-            send_vp_reminders,
-            CronTrigger(hour=10, minute=0),
-            id='vp_reminders',
-            name='Send VP reminder emails',
-            replace_existing=True
-        )
-        
-        scheduler.start()
+        # Paused until the job list is in sync, so nothing fires with stale definitions
+        scheduler.start(paused=True)
+        try:
+            _sync_jobs_locked()
+        finally:
+            for job_id, job in LOCAL_JOBS.items():
+                scheduler.add_job(
+                    job.func, job.trigger, id=job_id, name=job.name, jobstore="local", replace_existing=True
+                )
+            scheduler.resume()
         logger.info("Background scheduler started")
 
 
@@ -0,0 +1,46 @@
+"""
+Helpers to write request_status_events in the transaction of the change
+"""
+from typing import Optional
+from sqlalchemy import insert, literal, select
+from sqlalchemy.orm import Session
+from app.models.pricing_request import PricingRequest
+from app.models.request_status_event import RequestStatusEvent
+
+
+def add_status_event(
+    db: Session,
+    request: PricingRequest,
+    from_status: Optional[str],
+    actor_email: Optional[str] = None,
+    actor_name: Optional[str] = None,
+    comments: Optional[str] = None,
+) -> RequestStatusEvent:
+    """Add the event for a status change just applied to `request`; committed by the caller"""
+    event = RequestStatusEvent(
+        request_id=request.id,
+        from_status=from_status,
+        to_status=request.status,
+        actor_email=actor_email,
+        actor_name=actor_name,
+        comments=comments,
+    )
+    db.add(event)
+    return event
+
+
+def submission_event_from(request_id, to_status, actor_email: str, actor_name: str):
+    """
+    INSERT ... SELECT form for the submission, where request_id and to_status
+    are SQL expressions (e.g. columns of the CTE that inserted the request)
+    """
+    return insert(RequestStatusEvent).from_select(
+        ["request_id", "from_status", "to_status", "actor_email", "actor_name"],
+        select(
+            request_id,
+            literal(None, RequestStatusEvent.from_status.type),
+            to_status,
+            literal(actor_email),
+            literal(actor_name),
+        ),
+    )
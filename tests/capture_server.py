@@ -0,0 +1,154 @@
+"""
+Local SMTP capture server for exercising the mailer offline.
+
+Accepts every message and keeps it in memory instead of delivering it.
+Latency and failures can be injected to see how the dispatcher behaves
+against a slow or flaky server.
+
+The tests get one through the smtp_server fixture (tests/conftest.py). It
+can also run standalone, with SMTP_HOST/SMTP_PORT pointed at it:
+
+    python tests/capture_server.py --port 8025 --latency 0.2 --fail-rate 0.1
+
+Requires aiosmtpd (pip install -r requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from typing import Optional
+
+# Reply for injected failures: transient, so the client should retry
+INJECTED_FAILURE = "451 4.3.0 Injected failure, try again later"
+
+
+@dataclass
+class CapturedMessage:
+    sender: str
+    recipients: list
+    subject: str
+    size: int
+    received_at: float
+    session_id: int
+
+
+@dataclass
+class CaptureHandler:
+    """aiosmtpd handler: optional delay and failure rate on DATA"""
+
+    latency: float = 0.0
+    fail_rate: float = 0.0
+    seed: Optional[int] = None
+    messages: list = field(default_factory=list)
+    failures: int = 0
+    connections: int = 0
+    echo: bool = False
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # Once per connection (twice with STARTTLS, which the capture server does not offer)
+        with self._lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        with self._lock:
+            if self.fail_rate and self._random.random() < self.fail_rate:
+                self.failures += 1
+                return INJECTED_FAILURE
+
+            content = envelope.original_content or envelope.content or b""
+            captured = CapturedMessage(
+                sender=envelope.mail_from,
+                recipients=list(envelope.rcpt_tos),
+                subject=message_from_bytes(content).get("Subject", ""),
+                size=len(content),
+                received_at=time.perf_counter(),
+                session_id=id(session),
+            )
+            self.messages.append(captured)
+
+        if self.echo:
+            print(f"{captured.sender} -> {', '.join(captured.recipients)}: {captured.subject} ({captured.size} bytes)")
+        return "250 OK"
+
+
+class CaptureServer:
+    """Runs a CaptureHandler on a background thread (context manager)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025, latency: float = 0.0,
+                 fail_rate: float = 0.0, seed: Optional[int] = None, echo: bool = False):
+        from aiosmtpd.controller import Controller
+
+        self.host = host
+        self.port = port
+        self.handler = CaptureHandler(latency=latency, fail_rate=fail_rate, seed=seed, echo=echo)
+        self._controller = Controller(self.handler, hostname=host, port=port)
+
+    @property
+    def messages(self) -> list:
+        return self.handler.messages
+
+    def start(self):
+        self._controller.start()
+        return self
+
+    def stop(self):
+        self._controller.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        with self.handler._lock:
+            self.handler.messages.clear()
+            self.handler.failures = 0
+            self.handler.connections = 0
+
+    def stats(self) -> dict:
+        messages = self.handler.messages
+        return {
+            "messages": len(messages),
+            "injected_failures": self.handler.failures,
+            "connections": self.handler.connections,
+            "messages_per_connection": round(len(messages) / self.handler.connections, 2)
+            if self.handler.connections else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP capture server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every DATA command")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of messages answered with 451")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--quiet", action="store_true", help="do not print captured messages")
+    args = parser.parse_args()
+
+    server = CaptureServer(args.host, args.port, args.latency, args.fail_rate, args.seed, echo=not args.quiet)
+    with server:
+        print(f"Capturing mail on {args.host}:{args.port} (latency {args.latency}s, fail rate {args.fail_rate})")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    print(server.stats())
+
+
+if __name__ == "__main__":
+    main()
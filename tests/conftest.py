@@ -0,0 +1,126 @@
+"""
+Shared fixtures.
+
+Mail tests run against a local capture server (tests/capture_server.py,
+needs aiosmtpd).
+
+Database tests use the PostgreSQL database configured by the DB_*
+variables, like the app, and are skipped when it cannot be reached. Point
+them at a throwaway database: they create rows and leave them behind.
+"""
+import socket
+import uuid
+import pytest
+from app.core.config import settings
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def make_smtp_server(monkeypatch):
+    """Start capture servers (CaptureServer kwargs) and point the mail settings at the last one"""
+    pytest.importorskip("aiosmtpd")
+    from capture_server import CaptureServer
+
+    servers = []
+
+    def make(**kwargs):
+        server = CaptureServer(port=_free_port(), **kwargs).start()
+        servers.append(server)
+        monkeypatch.setattr(settings, "SMTP_HOST", server.host)
+        monkeypatch.setattr(settings, "SMTP_PORT", server.port)
+        monkeypatch.setattr(settings, "SMTP_FROM", "tests@avocarbon.com")
+        monkeypatch.setattr(settings, "SMTP_USER", None)
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", None)
+        monkeypatch.setattr(settings, "SMTP_RETRY_BACKOFF_SECONDS", 0.01)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def smtp_server(make_smtp_server):
+    return make_smtp_server()
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    """A fresh, unthrottled mail dispatcher used by the mailer for the test"""
+    from app.emails import transport
+
+    monkeypatch.setattr(settings, "MAIL_TRANSPORT", "async")
+    dispatcher = transport.MailDispatcher(max_concurrency=4, per_second=0, reserved_interactive=1)
+    monkeypatch.setattr(transport, "_dispatcher", dispatcher)
+    yield dispatcher
+    dispatcher.stop()
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """The app's engine, with the schema in place; skips the test without a database"""
+    try:
+        from sqlalchemy import text
+        from app.core.database import engine
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        pytest.skip(f"PostgreSQL from DB_* is not reachable: {type(e).__name__}")
+
+    from app.core.schema import ensure_schema
+
+    ensure_schema(engine)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def client(db_engine):
+    """TestClient of the app (startup included), mailing to a capture server"""
+    pytest.importorskip("aiosmtpd")
+    from fastapi.testclient import TestClient
+    from capture_server import CaptureServer
+    from app.main import app
+
+    smtp = {name: getattr(settings, name) for name in ("SMTP_HOST", "SMTP_PORT", "SMTP_FROM", "SMTP_USER", "SMTP_PASSWORD")}
+    with CaptureServer(port=_free_port()) as server:
+        settings.SMTP_HOST, settings.SMTP_PORT = server.host, server.port
+        settings.SMTP_FROM, settings.SMTP_USER, settings.SMTP_PASSWORD = "tests@avocarbon.com", None, None
+        try:
+            with TestClient(app) as test_client:
+                yield test_client
+        finally:
+            for name, value in smtp.items():
+                setattr(settings, name, value)
+
+
+@pytest.fixture
+def create_request(client):
+    """Submit a pricing request through the API; returns its id"""
+    def create(pl_email: str = "pl@avocarbon.com", vp_email: str = "vp@avocarbon.com", **fields) -> int:
+        payload = {
+            "costing_number": f"TEST-{uuid.uuid4().hex[:12]}",
+            "project_name": "Brush holder",
+            "customer": "Valeo",
+            "product_line": "brushes",
+            "plant": "Amiens",
+            "yearly_sales": 1000,
+            "initial_price": 10,
+            "target_price": 8,
+            "problem_to_solve": "Cheaper brushes",
+            "requester_email": "sales@avocarbon.com",
+            "requester_name": "Sales",
+            "product_line_responsible_email": pl_email,
+            "vp_email": vp_email,
+            **fields,
+        }
+        response = client.post("/pricing-requests/", json=payload)
+        assert response.status_code == 200, response.text
+        return response.json()["request_id"]
+
+    return create
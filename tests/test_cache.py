@@ -0,0 +1,99 @@
+"""
+Shared cache backends (RedisCache runs on fakeredis)
+"""
+import threading
+import pytest
+from app.services.cache import MemoryCache, RedisCache
+
+
+@pytest.fixture
+def redis_cache():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCache(fakeredis.FakeRedis(), prefix="test:", lock_timeout=1.0)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return MemoryCache(max_entries=100)
+    return request.getfixturevalue("redis_cache")
+
+
+def test_get_or_set_loads_once(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.get_or_set("users:pl", loader, ttl=60) == {"value": 1}
+    assert cache.get_or_set("users:pl", loader, ttl=60) == {"value": 1}
+    assert len(calls) == 1
+
+
+def test_invalidate_tag_drops_tagged_entries(cache):
+    cache.set("users:pl", ["a"], ttl=60, tags=["users"])
+    cache.set("customers", ["b"], ttl=60, tags=["customers"])
+
+    cache.invalidate_tag("users")
+
+    assert cache.get("users:pl") is None
+    assert cache.get("customers") == ["b"]
+
+
+def test_reads_return_copies(cache):
+    cache.set("users:pl", {"names": ["a"]}, ttl=60)
+    cache.get("users:pl")["names"].append("mutated")
+    assert cache.get("users:pl") == {"names": ["a"]}
+
+
+def test_invalidation_during_load_is_not_stored_as_fresh(cache):
+    def loader():
+        # The source changes and the tag is invalidated while the old value is being loaded
+        cache.invalidate_tag("users")
+        return ["stale"]
+
+    assert cache.get_or_set("users:pl", loader, ttl=60, tags=["users"]) == ["stale"]
+    assert cache.get("users:pl") is None
+    assert cache.get_or_set("users:pl", lambda: ["fresh"], ttl=60, tags=["users"]) == ["fresh"]
+
+
+def test_expired_load_lock_taken_by_another_worker_is_kept(redis_cache):
+    lock_key = redis_cache._key("lock:users:pl")
+
+    def loader():
+        # Our lock expired during a slow load and another worker took it
+        redis_cache.client.set(lock_key, "other-worker")
+        return ["value"]
+
+    redis_cache.get_or_set("users:pl", loader, ttl=60)
+
+    assert redis_cache.client.get(lock_key) == b"other-worker"
+
+
+def test_own_load_lock_is_released(redis_cache):
+    redis_cache.get_or_set("users:pl", lambda: ["value"], ttl=60)
+    assert not redis_cache.client.exists(redis_cache._key("lock:users:pl"))
+
+
+def test_workers_wait_for_the_loading_worker(redis_cache):
+    other_worker = RedisCache(redis_cache.client, prefix="test:", lock_timeout=1.0)
+    loading = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append("first")
+        loading.set()
+        release.wait(1)
+        return ["loaded"]
+
+    first = threading.Thread(target=lambda: redis_cache.get_or_set("users:pl", slow_loader, ttl=60))
+    first.start()
+    loading.wait(1)
+    release.set()
+    value = other_worker.get_or_set("users:pl", lambda: calls.append("second") or ["other"], ttl=60)
+    first.join()
+
+    assert value == ["loaded"]
+    assert calls == ["first"]
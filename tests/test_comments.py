@@ -0,0 +1,48 @@
+"""
+Comment thread writes: cached request details and missing requests
+"""
+from app.routers import comments
+from app.services.request_cache import request_cache
+
+PL = "pl@avocarbon.com"
+
+
+def _cached(request_id: int) -> bool:
+    return request_id in request_cache._entries
+
+
+def test_thread_writes_evict_the_cached_detail(client, create_request):
+    request_id = create_request(pl_email=PL)
+
+    client.get(f"/pricing-requests/{request_id}")
+    assert _cached(request_id)
+    response = client.post(f"/api/comments/request/{request_id}", params={"author_email": PL}, json={"content": "Hello"})
+    assert response.status_code == 200
+    assert not _cached(request_id)
+    comment_id = response.json()["id"]
+
+    for action, archived in (("archive", True), ("unarchive", False)):
+        client.get(f"/pricing-requests/{request_id}")
+        assert _cached(request_id)
+        response = client.patch(f"/api/comments/{comment_id}/{action}", params={"author_email": PL})
+        assert response.status_code == 200
+        assert response.json()["is_archived"] is archived
+        assert not _cached(request_id)
+
+
+def test_comment_on_missing_request_is_404(client):
+    response = client.post("/api/comments/request/0", params={"author_email": PL}, json={"content": "Hello"})
+    assert response.status_code == 404
+
+
+def test_archive_when_request_is_gone_is_404(client, create_request, monkeypatch):
+    request_id = create_request(pl_email=PL)
+    comment_id = client.post(
+        f"/api/comments/request/{request_id}", params={"author_email": PL}, json={"content": "Hello"}
+    ).json()["id"]
+    monkeypatch.setattr(comments, "get_request_detail", lambda db, request_id, updated_at=None: None)
+
+    for action in ("archive", "unarchive"):
+        response = client.patch(f"/api/comments/{comment_id}/{action}", params={"author_email": PL})
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Request not found"
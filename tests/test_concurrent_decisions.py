@@ -0,0 +1,114 @@
+"""
+Parallel PL and VP decisions on the same request: exactly one wins, every
+other call fails fast with 409 (row locked, version moved on) or 400
+(already decided), never 500
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.models.enums import RequestStatus
+
+PARALLEL = 12
+
+
+def _fire(client, calls: list) -> Counter:
+    """POST (path, body, bulk) calls at once; returns the status codes"""
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        path, body, bulk = call
+        barrier.wait()
+        response = client.post(path, json=body)
+        # A bulk call answers 200 with the outcome of its single item
+        if bulk and response.status_code == 200:
+            return response.json()["results"][0]["status_code"]
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        return Counter(pool.map(run, calls))
+
+
+def _pl_calls(request_id: int, actions: tuple) -> list:
+    calls = []
+    for i in range(PARALLEL):
+        decision = {"action": actions[i % len(actions)], "comments": f"decision {i}", "suggested_price": 8.5}
+        if i % 4 == 3:
+            calls.append(("/pl-decisions/bulk", {"decisions": [dict(decision, request_id=request_id)]}, True))
+        else:
+            calls.append((f"/pl-decisions/{request_id}", decision, False))
+    return calls
+
+
+def _state(db_engine, request_id: int, from_status: str):
+    """(status, version, status events leaving from_status)"""
+    from sqlalchemy import text
+
+    with db_engine.connect() as conn:
+        status, version = conn.execute(
+            text("SELECT status, version FROM pricing_requests WHERE id = :id"), {"id": request_id}
+        ).one()
+        events = conn.execute(
+            text("SELECT count(*) FROM request_status_events WHERE request_id = :id AND from_status = :status"),
+            {"id": request_id, "status": from_status},
+        ).scalar()
+    return status, version, events
+
+
+def _assert_one_winner(codes: Counter):
+    assert codes[200] == 1, codes
+    assert set(codes) <= {200, 400, 409}, codes
+
+
+@pytest.mark.parametrize("actions", [
+    ("APPROVE", "REJECT", "ESCALATE"),
+    ("APPROVE",),
+])
+def test_parallel_pl_decisions_have_one_winner(client, db_engine, create_request, actions):
+    request_id = create_request()
+    _, version_before, _ = _state(db_engine, request_id, RequestStatus.UNDER_REVIEW_PL.value)
+
+    codes = _fire(client, _pl_calls(request_id, actions))
+
+    _assert_one_winner(codes)
+    status, version, events = _state(db_engine, request_id, RequestStatus.UNDER_REVIEW_PL.value)
+    assert status != RequestStatus.UNDER_REVIEW_PL.value
+    assert version == version_before + 1
+    assert events == 1
+
+
+def test_parallel_vp_decisions_have_one_winner(client, db_engine, create_request):
+    request_id = create_request()
+    response = client.post(f"/pl-decisions/{request_id}", json={"action": "ESCALATE", "comments": "Needs VP"})
+    assert response.status_code == 200
+    _, version_before, _ = _state(db_engine, request_id, RequestStatus.ESCALATED_TO_VP.value)
+
+    calls = [
+        (f"/vp-decisions/{request_id}", {"action": ("APPROVE", "REJECT")[i % 2], "comments": f"vp {i}"}, False)
+        for i in range(PARALLEL)
+    ]
+    codes = _fire(client, calls)
+
+    _assert_one_winner(codes)
+    status, version, events = _state(db_engine, request_id, RequestStatus.ESCALATED_TO_VP.value)
+    assert status in (RequestStatus.APPROVED_BY_VP.value, RequestStatus.REJECTED_BY_VP.value)
+    assert version == version_before + 1
+    assert events == 1
+
+
+def test_bulk_reports_rows_locked_by_a_concurrent_decision(client, db_engine, create_request):
+    request_ids = [create_request() for _ in range(3)]
+    calls = [
+        ("/pl-decisions/bulk", {"decisions": [
+            {"request_id": request_id, "action": "APPROVE", "comments": f"bulk {i}"} for request_id in request_ids
+        ]}, False)
+        for i in range(4)
+    ]
+
+    codes = _fire(client, calls)
+
+    assert codes == Counter({200: 4})
+    for request_id in request_ids:
+        status, _, events = _state(db_engine, request_id, RequestStatus.UNDER_REVIEW_PL.value)
+        assert status == RequestStatus.APPROVED_BY_PL.value
+        assert events == 1
@@ -0,0 +1,42 @@
+"""
+Job runs left "running" by a worker that stopped
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from app.core.config import settings
+from app.models.job_run import JobRun
+from app.services.job_runs import abandon_stale_runs
+
+
+def test_runs_past_the_max_runtime_are_abandoned(db_engine):
+    now = datetime.now(timezone.utc)
+    started = {
+        "stale": now - timedelta(seconds=settings.JOB_RUN_MAX_SECONDS + 60),
+        "active": now - timedelta(seconds=5),
+    }
+    with db_engine.begin() as conn:
+        ids = {
+            name: conn.execute(
+                insert(JobRun)
+                .values(job_id=f"test-{name}", trigger="manual", status="running", started_at=at)
+                .returning(JobRun.id)
+            ).scalar()
+            for name, at in started.items()
+        }
+
+    try:
+        assert abandon_stale_runs() >= 1
+        with db_engine.connect() as conn:
+            rows = {
+                row.id: row
+                for row in conn.execute(select(JobRun).where(JobRun.id.in_(ids.values())))
+            }
+        assert rows[ids["stale"]].status == "abandoned"
+        assert rows[ids["stale"]].finished_at is not None
+        assert rows[ids["active"]].status == "running"
+        assert rows[ids["active"]].finished_at is None
+    finally:
+        with db_engine.begin() as conn:
+            conn.execute(delete(JobRun).where(JobRun.id.in_(ids.values())))
@@ -0,0 +1,163 @@
+"""
+Mail delivery through the dispatcher to a local capture server
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.core.config import settings
+from app.emails import mailer
+from app.emails.transport import DispatcherStopped, LANE_BULK, build_message
+
+
+def _send_every_type(i: int) -> dict:
+    """Send one mail of every type; returns type -> success"""
+    subject, html_body = mailer.render_pricing_request_email(
+        project_name="Brush holder", customer="Valeo", initial_price=10.0, target_price=8.5,
+        request_id=i, costing_number=f"TEST-{i}",
+    )
+    return {
+        "pricing_request": mailer.send_pricing_request_email(
+            to_email=f"pl{i}@avocarbon.com", project_name="Brush holder", customer="Valeo",
+            initial_price=10.0, target_price=8.5, request_id=i, costing_number=f"TEST-{i}",
+        ),
+        "pl_decision": mailer.send_pl_decision_to_commercial(
+            to_email=f"sales{i}@avocarbon.com", project_name="Brush holder", decision="APPROVED_BY_PL",
+            comments="Agreed", suggested_price=8.5, costing_number=f"TEST-{i}",
+        ),
+        "escalation": mailer.send_escalation_to_vp(
+            to_email=f"vp{i}@avocarbon.com", project_name="Brush holder", target_price=8.5,
+            comments="Needs VP approval", initial_price=10.0, pl_name="PL", costing_number=f"TEST-{i}",
+        ),
+        "vp_decision": mailer.send_vp_decision_to_commercial(
+            to_email=f"sales{i}@avocarbon.com", project_name="Brush holder", decision="APPROVED_BY_VP",
+            comments="Approved", final_price=8.5, costing_number=f"TEST-{i}",
+        ),
+        "reminder": mailer.send_email(f"pl{i}@avocarbon.com", f"Reminder: {subject}", html_body, lane=LANE_BULK),
+        "verification": asyncio.run(mailer.send_verification_email(f"user{i}@avocarbon.com", f"{i:06d}")),
+    }
+
+
+def _message(i: int):
+    msg, recipients = build_message(f"user{i}@avocarbon.com", f"Message {i}", "<p>hi</p>")
+    return msg, recipients
+
+
+def test_every_mail_type_is_delivered(smtp_server, dispatcher):
+    sent = _send_every_type(1)
+
+    assert all(sent.values()), sent
+    assert len(smtp_server.messages) == len(sent)
+    recipients = {recipient for message in smtp_server.messages for recipient in message.recipients}
+    assert recipients == {"pl1@avocarbon.com", "sales1@avocarbon.com", "vp1@avocarbon.com", "user1@avocarbon.com"}
+    assert all(message.sender == "tests@avocarbon.com" for message in smtp_server.messages)
+
+
+def test_transient_failures_are_retried(make_smtp_server, dispatcher, monkeypatch):
+    server = make_smtp_server(fail_rate=0.3, seed=7)
+    monkeypatch.setattr(settings, "SMTP_SEND_RETRIES", 8)
+
+    results = [mailer.send_email(f"user{i}@avocarbon.com", f"Message {i}", "<p>hi</p>") for i in range(20)]
+
+    assert all(results)
+    assert len(server.messages) == 20
+    assert server.stats()["injected_failures"] > 0
+
+
+def test_gives_up_after_the_retries(make_smtp_server, dispatcher, monkeypatch):
+    server = make_smtp_server(fail_rate=1.0)
+    monkeypatch.setattr(settings, "SMTP_SEND_RETRIES", 2)
+
+    assert mailer.send_email("user@avocarbon.com", "Never delivered", "<p>hi</p>") is False
+    assert server.stats()["injected_failures"] == 3
+    assert server.messages == []
+
+
+def test_senders_work_in_parallel(make_smtp_server, dispatcher):
+    server = make_smtp_server(latency=0.2)
+    messages = 12
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=messages) as pool:
+        results = list(pool.map(
+            lambda i: mailer.send_email(f"user{i}@avocarbon.com", f"Message {i}", "<p>hi</p>"), range(messages)
+        ))
+    elapsed = time.perf_counter() - started
+
+    assert all(results)
+    assert len(server.messages) == messages
+    # One sender at a time would take messages * latency
+    assert elapsed < messages * 0.2 / 2
+
+
+async def test_async_callers_do_not_block_the_loop(make_smtp_server, dispatcher):
+    server = make_smtp_server(latency=0.2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        assert await mailer.send_email_async("user@avocarbon.com", "Async", "<p>hi</p>")
+    finally:
+        task.cancel()
+
+    assert len(server.messages) == 1
+    assert ticks >= 10
+
+
+async def test_first_async_send_starts_the_dispatcher_off_the_loop(smtp_server, dispatcher, monkeypatch):
+    run = dispatcher._run
+
+    def slow_run():
+        time.sleep(0.3)
+        run()
+
+    monkeypatch.setattr(dispatcher, "_run", slow_run)
+    assert not dispatcher.running
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        assert await mailer.send_email_async("user@avocarbon.com", "First", "<p>hi</p>")
+    finally:
+        task.cancel()
+
+    assert dispatcher.running
+    assert len(smtp_server.messages) == 1
+    assert ticks >= 10
+
+
+def test_stop_fails_queued_mail(make_smtp_server, dispatcher):
+    make_smtp_server(latency=0.5)
+    futures = [dispatcher.submit(*_message(i)) for i in range(10)]
+    time.sleep(0.1)
+    dispatcher.stop()
+
+    outcomes = []
+    for future in futures:
+        try:
+            future.result(timeout=5)
+            outcomes.append("sent")
+        except DispatcherStopped:
+            outcomes.append("stopped")
+    assert "stopped" in outcomes
+
+    # A later submit starts a fresh loop
+    assert dispatcher.submit(*_message(99)).result(timeout=5) is None
+
+
+@pytest.mark.parametrize("lane", ["interactive", "notification", "bulk"])
+def test_every_lane_delivers(smtp_server, dispatcher, lane):
+    dispatcher.submit(*_message(1), lane=lane).result(timeout=5)
+    assert len(smtp_server.messages) == 1
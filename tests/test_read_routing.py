@@ -0,0 +1,111 @@
+"""
+Read routing against two local databases: the DB_* database is the
+primary, and a second database on the same server (created on first run)
+stands in for the replica. Nothing replicates between them, so a read
+served by the "replica" does not see the test's writes.
+"""
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from starlette.requests import Request
+from app.core import database
+from app.core.config import settings
+from app.core.read_routing import ReplicaRouter, caller_key, replica_router
+from app.services.cache import RedisCache
+
+
+@pytest.fixture(scope="session")
+def replica_engine(db_engine):
+    from app.core.schema import ensure_schema
+
+    name = f"{db_engine.url.database}_replica_test"
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": name}).scalar()
+        if not exists:
+            try:
+                conn.execute(text(f'CREATE DATABASE "{name}"'))
+            except Exception as e:
+                pytest.skip(f"Cannot create the stand-in replica database: {type(e).__name__}")
+
+    engine = create_engine(db_engine.url.set(database=name))
+    ensure_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def shared_cache():
+    """One Redis-protocol cache shared by the "workers" of a test"""
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCache(fakeredis.FakeRedis(), prefix="test:")
+
+
+@pytest.fixture
+def window(monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 1.0)
+    return 1.0
+
+
+def _request(method: str, ip: str = "10.0.0.1") -> Request:
+    return Request({"type": "http", "method": method, "path": "/", "headers": [], "client": (ip, 50000)})
+
+
+def _database_of(engine) -> str:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT current_database()")).scalar()
+
+
+def test_reads_go_to_the_replica_by_default(replica_engine, shared_cache):
+    assert ReplicaRouter(shared_cache).choose(_request("GET"), replica_engine) == ("replica", None)
+
+
+def test_no_replica_means_primary(shared_cache):
+    assert ReplicaRouter(shared_cache).choose(_request("GET"), None) == ("primary", None)
+
+
+def test_write_window_is_shared_between_workers(replica_engine, shared_cache, window):
+    worker_a, worker_b = ReplicaRouter(shared_cache), ReplicaRouter(shared_cache)
+
+    worker_a.mark_write(caller_key(_request("POST", "10.0.0.1")))
+
+    assert worker_b.choose(_request("GET", "10.0.0.1"), replica_engine) == ("primary", "read_your_writes")
+    assert worker_a.choose(_request("GET", "10.0.0.1"), replica_engine) == ("primary", "read_your_writes")
+    # Other callers are not affected
+    assert worker_b.choose(_request("GET", "10.0.0.2"), replica_engine) == ("replica", None)
+
+    time.sleep(window + 0.2)
+    assert worker_b.choose(_request("GET", "10.0.0.1"), replica_engine) == ("replica", None)
+
+
+def test_lagging_replica_falls_back_to_the_primary(replica_engine, shared_cache, monkeypatch):
+    monkeypatch.setattr(settings, "READ_REPLICA_MAX_LAG_SECONDS", -1)
+    assert ReplicaRouter(shared_cache).choose(_request("GET"), replica_engine) == ("primary", "replica_lag")
+
+
+def test_unreachable_replica_falls_back_to_the_primary(shared_cache):
+    unreachable = create_engine("postgresql://nobody@127.0.0.1:1/none", connect_args={"connect_timeout": 1})
+    assert ReplicaRouter(shared_cache).choose(_request("GET"), unreachable) == ("primary", "replica_lag")
+
+
+def test_read_right_after_a_write_sees_it(client, create_request, db_engine, replica_engine, shared_cache,
+                                          window, monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+
+    assert _database_of(replica_engine) != _database_of(db_engine)
+    monkeypatch.setattr(database, "read_engine", replica_engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=replica_engine))
+    monkeypatch.setattr(replica_router, "_cache", shared_cache)
+    pl_email = f"pl-{time.time_ns()}@avocarbon.com"
+
+    request_id = create_request(pl_email=pl_email)
+
+    # Served by the primary: the caller sees their own write
+    inbox = client.get("/pl-decisions/inbox", params={"pl_email": pl_email})
+    assert [item["id"] for item in inbox.json()] == [request_id]
+    # On another worker too
+    other_worker = ReplicaRouter(shared_cache)
+    assert other_worker.choose(_request("GET", "testclient"), replica_engine) == ("primary", "read_your_writes")
+
+    # Once the window has passed the read goes to the replica, which never got the row
+    time.sleep(window + 0.2)
+    assert client.get("/pl-decisions/inbox", params={"pl_email": pl_email}).json() == []
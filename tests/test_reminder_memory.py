@@ -0,0 +1,90 @@
+"""
+Memory benchmark of the reminder run: seeds REMINDER_BENCHMARK_ROWS
+(default 100k) due requests, runs send_reminders with sending and
+recording stubbed out, and checks that peak Python memory stays bounded
+by the batch size instead of growing with the backlog.
+
+    python -m pytest -m benchmark tests/test_reminder_memory.py -s
+
+Marked as a benchmark (seeding takes a while), so the default run skips it.
+Needs the DB_* database (see conftest); the seeded rows are removed
+afterwards.
+"""
+import os
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import select, text
+from app.core.config import settings
+from app.models.pricing_request import PricingRequest
+from app.services import reminders
+
+pytestmark = pytest.mark.benchmark
+
+ROWS = int(os.getenv("REMINDER_BENCHMARK_ROWS", 100_000))
+
+# Streaming keeps one batch (500 narrow rows) plus the rendered mails of
+# that batch; loading the backlog at once needs tens of MB per 100k rows
+STREAMED_PEAK_LIMIT = 16 * 1024 * 1024
+
+
+@pytest.fixture
+def due_backlog(db_engine):
+    """ROWS pricing requests under PL review for 10 days, never reminded"""
+    prefix = f"MEM-{uuid.uuid4().hex[:8]}-"
+    with db_engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO pricing_requests (
+                costing_number, project_name, customer, product_line, plant, yearly_sales,
+                initial_price, target_price, problem_to_solve, requester_email, requester_name,
+                product_line_responsible_email, status, status_entered_at
+            )
+            SELECT :prefix || g, 'Brush holder ' || g, 'Valeo', 'brushes', 'Amiens', 1000,
+                   10, 8, repeat('Cheaper brushes for the next series. ', 50),
+                   'sales@avocarbon.com', 'Sales', 'pl' || (g % 100) || '@avocarbon.com',
+                   'UNDER_REVIEW_PL', now() - interval '10 days'
+            FROM generate_series(1, :rows) AS g
+        """), {"prefix": prefix, "rows": ROWS})
+    yield prefix
+    with db_engine.begin() as conn:
+        conn.execute(text("DELETE FROM pricing_requests WHERE costing_number LIKE :pattern"), {"pattern": prefix + "%"})
+
+
+def _peak(run) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_reminder_run_memory_stays_bounded(db_engine, due_backlog, monkeypatch):
+    from app.core.database import SessionLocal
+
+    sent = []
+    monkeypatch.setattr(reminders, "send_email", lambda *args, **kwargs: True)
+    monkeypatch.setattr(reminders, "_record", lambda db, kind, request_id, *args, **kwargs: sent.append(request_id))
+    monkeypatch.setattr(settings, "REMINDER_BATCH_SIZE", 500)
+
+    db = SessionLocal()
+    try:
+        stats = {}
+        streamed = _peak(lambda: stats.update(reminders.send_reminders(db, "pl")))
+
+        # The same query loaded in one go, for comparison
+        due = select(
+            PricingRequest.id, PricingRequest.project_name, PricingRequest.customer,
+            PricingRequest.costing_number, PricingRequest.created_at, PricingRequest.status_entered_at,
+        ).where(PricingRequest.status == "UNDER_REVIEW_PL", reminders.due_condition(datetime.now(timezone.utc)))
+        loaded = _peak(lambda: db.execute(due).all())
+    finally:
+        db.close()
+
+    print(f"\n{stats['due']} due reminders: streamed peak {streamed / 2**20:.1f} MB, "
+          f"loaded at once {loaded / 2**20:.1f} MB")
+    assert stats["due"] >= ROWS
+    assert len(sent) == stats["due"]
+    assert streamed < STREAMED_PEAK_LIMIT
+    assert streamed * 4 < loaded
@@ -0,0 +1,41 @@
+"""
+Search paging: has_more from one extra row, totals only on request
+"""
+import uuid
+
+from app.routers import search
+
+
+def test_pages_report_has_more_without_a_total(client, create_request):
+    word = f"zq{uuid.uuid4().hex[:10]}"
+    for _ in range(3):
+        create_request(project_name=f"Holder {word}")
+
+    first = client.get("/search", params={"q": word, "kind": "request", "page_size": 2}).json()
+    assert len(first["results"]) == 2
+    assert first["has_more"] is True
+    assert first["total"] is None
+
+    last = client.get("/search", params={"q": word, "kind": "request", "page_size": 2, "page": 2}).json()
+    assert len(last["results"]) == 1
+    assert last["has_more"] is False
+
+    past = client.get("/search", params={"q": word, "kind": "request", "page_size": 2, "page": 3}).json()
+    assert past["results"] == []
+    assert past["has_more"] is False
+
+
+def test_total_is_counted_on_request_and_capped(client, create_request, monkeypatch):
+    word = f"zq{uuid.uuid4().hex[:10]}"
+    for _ in range(3):
+        create_request(project_name=f"Holder {word}")
+
+    body = client.get("/search", params={"q": word, "include_total": True}).json()
+    assert body["total"] == 3
+    assert body["total_capped"] is False
+
+    monkeypatch.setattr(search, "TOTAL_COUNT_LIMIT", 2)
+    body = client.get("/search", params={"q": word, "include_total": True}).json()
+    assert body["total"] == 2
+    assert body["total_capped"] is True
+    assert len(body["results"]) == 3